@@ -0,0 +1,225 @@
+"""Time each stage of the build (parsing, compiling, each layer, diffing,
+writing) against synthetic regulations of increasing size. Results are
+stored as JSON, keyed by commit, so they can be compared across commits;
+for each stage, we also estimate how its run time grows with the size of
+the regulation, to catch superlinear regressions.
+
+    python -m benchmarks.run --sizes 10,20,40
+    python -m benchmarks.run --compare benchmarks/results/abc123.json
+"""
+import json
+import math
+from optparse import OptionParser
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from benchmarks import synthetic
+from regparser import api_writer
+from regparser.diff import treediff
+from regparser.layer import registry
+from regparser.notice.build import process_notice
+from regparser.notice.compiler import compile_regulation
+from regparser.tree.struct import walk
+from regparser.tree.xml_parser import reg_text
+import settings
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'results')
+#   Stages whose time grows faster than size^SUPERLINEAR are flagged
+SUPERLINEAR = 1.3
+
+
+def best_of(repeat, fn):
+    """Run the function `repeat` times, returning the fastest wall time and
+    the last result"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.time()
+        result = fn()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def run_size(sections, repeat=3, versions=3, **reg_args):
+    """Timings (stage -> seconds) for a single size of regulation"""
+    timings = {}
+    xml = synthetic.regulation_xml(sections=sections, **reg_args)
+    timings['parse'], tree = best_of(repeat,
+                                     lambda: reg_text.build_tree(xml))
+
+    notices, trees = [], [tree]
+    notice_time, compile_time = 0, 0
+    for version in range(1, versions + 1):
+        notice_xml = synthetic.notice_xml(
+            sections=sections, amendments=max(1, sections / 10),
+            seed=version).encode('utf-8')
+        partial = synthetic.partial_notice(version=version)
+        elapsed, notice = best_of(
+            repeat, lambda: process_notice(partial, notice_xml))
+        notice_time += elapsed
+        notices.append(notice)
+        elapsed, new_tree = best_of(
+            repeat, lambda: compile_regulation(trees[-1], notice['changes']))
+        compile_time += elapsed
+        trees.append(new_tree)
+    timings['notice'] = notice_time
+    timings['compile'] = compile_time
+
+    last_tree, doc_number = trees[-1], notices[-1]['document_number']
+    layers = {}
+    for spec in registry.LAYERS:
+        layer_class = spec.load()
+        timings['layer.' + spec.ident], layers[spec.ident] = best_of(
+            repeat, lambda: layer_class(last_tree, 12, doc_number, notices,
+                                        ['15', '1693']).build())
+
+    def diff():
+        comparer = treediff.Compare(trees[0], trees[-1])
+        comparer.compare()
+        return comparer.changes
+    timings['diff'], _ = best_of(repeat, diff)
+
+    output_dir, original_output = tempfile.mkdtemp(), settings.OUTPUT_DIR
+    settings.OUTPUT_DIR = output_dir + os.sep
+    try:
+        def write():
+            writer = api_writer.Client()
+            writer.regulation('1000', doc_number).write(last_tree)
+            for ident in sorted(layers):
+                writer.layer(ident, '1000', doc_number).write(layers[ident])
+        timings['write'], _ = best_of(repeat, write)
+    finally:
+        settings.OUTPUT_DIR = original_output
+        shutil.rmtree(output_dir)
+
+    nodes = []
+    walk(last_tree, nodes.append)
+    return len(nodes), timings
+
+
+def growth(sizes, times):
+    """Least-squares slope of log(time) against log(size); i.e. `k` where
+    time ~ size^k"""
+    points = [(math.log(size), math.log(max(t, 1e-6)))
+              for size, t in zip(sizes, times)]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+    if not denominator:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / denominator
+
+
+def run(sizes, repeat=3, versions=3, **reg_args):
+    """Time every stage at every size. Sizes are measured in nodes"""
+    node_counts, by_size = [], []
+    for sections in sizes:
+        node_count, timings = run_size(sections, repeat, versions,
+                                       **reg_args)
+        node_counts.append(node_count)
+        by_size.append(timings)
+
+    stages = {}
+    for stage in by_size[0]:
+        times = [timings[stage] for timings in by_size]
+        stages[stage] = {'times': times,
+                         'growth': growth(node_counts, times)}
+    return {'sections': sizes, 'nodes': node_counts, 'stages': stages}
+
+
+def current_commit():
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', '--short', 'HEAD'],
+                                   stdout=subprocess.PIPE)
+        commit = process.communicate()[0].strip()
+    except OSError:
+        commit = ''
+    return commit or 'unknown'
+
+
+def compare(results, baseline):
+    """Lines describing how each stage changed relative to the baseline"""
+    lines = []
+    for stage in sorted(results['stages']):
+        if stage not in baseline['stages']:
+            continue
+        new = results['stages'][stage]['times'][-1]
+        old = baseline['stages'][stage]['times'][-1]
+        lines.append("%-30s %8.4fs -> %8.4fs (x%.2f)"
+                     % (stage, old, new, new / max(old, 1e-6)))
+    return lines
+
+
+def summarize(results):
+    lines = []
+    for stage in sorted(results['stages']):
+        stage_results = results['stages'][stage]
+        exponent = stage_results['growth']
+        flag = ''
+        if exponent is not None and exponent > SUPERLINEAR:
+            flag = '  SUPERLINEAR'
+        lines.append("%-30s %s  growth: %s%s" % (
+            stage, ' '.join('%8.4fs' % t for t in stage_results['times']),
+            'n/a' if exponent is None else '%.2f' % exponent, flag))
+    return lines
+
+
+def parse_options():
+    parser = OptionParser(usage="python -m benchmarks.run [options]")
+    parser.add_option(
+        "-s", "--sizes", default="10,20,40",
+        help="comma-separated numbers of sections to benchmark with")
+    parser.add_option("-r", "--repeat", type="int", default=3,
+                      help="take the best of this many runs of each stage")
+    parser.add_option("-v", "--versions", type="int", default=3,
+                      help="number of notices to parse and compile")
+    parser.add_option("-d", "--depth", type="int", default=3,
+                      help="depth of each section's paragraphs")
+    parser.add_option("--definitions", type="int", default=10,
+                      help="number of defined terms")
+    parser.add_option("--citations", type="float", default=0.2,
+                      help="probability of each paragraph citing another")
+    parser.add_option("--appendices", type="int", default=1)
+    parser.add_option("-o", "--output", metavar="FILE",
+                      help="where to store results; defaults to "
+                           + "benchmarks/results/<commit>.json")
+    parser.add_option("-c", "--compare", metavar="FILE",
+                      help="results (e.g. from another commit) to compare "
+                           + "against")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    options, _ = parse_options()
+    #   We're measuring the parser, not the cache
+    settings.BUILD_CACHE_DIR = ''
+
+    commit = current_commit()
+    results = run([int(s) for s in options.sizes.split(',')],
+                  options.repeat, options.versions, depth=options.depth,
+                  definitions=options.definitions,
+                  citation_density=options.citations,
+                  appendices=options.appendices)
+    results['commit'] = commit
+    results['date'] = time.strftime('%Y-%m-%d %H:%M:%S')
+
+    output = options.output or os.path.join(RESULTS_DIR, commit + '.json')
+    if not os.path.exists(os.path.dirname(os.path.abspath(output))):
+        os.makedirs(os.path.dirname(os.path.abspath(output)))
+    with open(output, 'w') as f:
+        json.dump(results, f, sort_keys=True, indent=4,
+                  separators=(', ', ': '))
+
+    print "\n".join(summarize(results))
+    print "Results written to " + output
+    if options.compare:
+        with open(options.compare) as f:
+            print "\n".join(compare(results, json.load(f)))
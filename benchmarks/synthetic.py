@@ -0,0 +1,183 @@
+# vim: set encoding=utf-8
+"""Generators for synthetic regulations (in the eCFR's XML format) and
+notices which amend them (in the Federal Register's). The output is
+deterministic for a given set of parameters, so that timings are comparable
+across commits."""
+import random
+
+from regparser.tree.paragraph import p_levels
+
+
+WORDS = ('consumer', 'account', 'institution', 'transfer', 'payment',
+         'notice', 'period', 'disclosure', 'statement', 'business', 'day',
+         'error', 'request', 'service', 'provider', 'information', 'amount',
+         'balance', 'charge', 'fee', 'written', 'electronic', 'required')
+
+
+def _sentence(rand, length=12):
+    words = [rand.choice(WORDS) for _ in range(length)]
+    return ' '.join(words).capitalize() + '.'
+
+
+def _terms(definitions):
+    """Distinct, multi-word terms; e.g. 'widget 3'"""
+    return ['widget %d' % idx for idx in range(definitions)]
+
+
+def _markers(depth, children):
+    """All paragraph marker paths (e.g. ('a', '1')) of a section, in
+    document order"""
+    paths = []
+
+    def descend(path):
+        if len(path) < depth:
+            for marker in p_levels[len(path)][:children]:
+                paths.append(path + (marker,))
+                descend(path + (marker,))
+    descend(())
+    return paths
+
+
+def _paragraph_text(rand, part, section, sections, path, terms,
+                    citation_density):
+    text = _sentence(rand)
+    if terms and rand.random() < 0.5:
+        text += ' The %s is %s.' % (rand.choice(terms), rand.choice(WORDS))
+    if rand.random() < citation_density:
+        text += ' See paragraph (%s) of this section.' % p_levels[0][0]
+    if rand.random() < citation_density:
+        other = rand.randint(1, sections)
+        text += u' See § %s.%d(a).' % (part, other)
+    return text
+
+
+def section_xml(rand, part, section, sections, depth=3, children=2,
+                terms=(), citation_density=0.2):
+    subject = rand.choice(WORDS).capitalize() + ' requirements.'
+    ps = []
+    for path in _markers(depth, children):
+        marker = '(%s)' % path[-1]
+        text = _paragraph_text(rand, part, section, sections, path, terms,
+                               citation_density)
+        ps.append(u'<P>%s %s</P>' % (marker, text))
+    return u"""
+        <SECTION>
+            <SECTNO>§ %s.%d</SECTNO>
+            <SUBJECT>%s</SUBJECT>
+            %s
+        </SECTION>""" % (part, section, subject, '\n'.join(ps))
+
+
+def definitions_xml(part, terms):
+    ps = [u'<P>(%s) “%s” means %s.</P>' % (
+          p_levels[0][idx % len(p_levels[0])], term, ' '.join(WORDS[:5]))
+          for idx, term in enumerate(terms)]
+    return u"""
+        <SECTION>
+            <SECTNO>§ %s.1</SECTNO>
+            <SUBJECT>Definitions.</SUBJECT>
+            <P>For purposes of this part, the following definitions
+            apply:</P>
+            %s
+        </SECTION>""" % (part, '\n'.join(ps))
+
+
+def appendix_xml(rand, part, letter):
+    ps = '\n'.join('<P>%s</P>' % _sentence(rand) for _ in range(5))
+    return u"""
+        <APPENDIX>
+            <EAR>Pt. %s, App. %s</EAR>
+            <HD SOURCE="HED">Appendix %s to Part %s—Model Forms</HD>
+            <HD SOURCE="HD1">%s-1—Model Form</HD>
+            %s
+        </APPENDIX>""" % (part, letter, letter, part, letter, ps)
+
+
+def interpretations_xml(rand, part, sections):
+    chunks = []
+    for section in range(2, sections + 1):
+        chunks.append(u'<HD SOURCE="HD2">Section %s.%d</HD>'
+                      % (part, section))
+        chunks.append(u'<P>1. %s</P>' % _sentence(rand))
+        chunks.append(u'<P>i. %s</P>' % _sentence(rand))
+        chunks.append(u'<HD SOURCE="HD2">%d(a) %s</HD>'
+                      % (section, rand.choice(WORDS).capitalize()))
+        chunks.append(u'<P>1. %s</P>' % _sentence(rand))
+    return u"""
+        <APPENDIX>
+            <EAR>Pt. %s, Supp. I</EAR>
+            <HD SOURCE="HED">Supplement I to Part %s—Official
+                Interpretations</HD>
+            %s
+        </APPENDIX>""" % (part, part, '\n'.join(chunks))
+
+
+def regulation_xml(part='1000', sections=20, depth=3, children=2,
+                   definitions=10, citation_density=0.2, appendices=1,
+                   interpretations=True, seed=0):
+    """A whole regulation: a definitions section followed by `sections`
+    more, each with paragraphs nested `depth` deep (`children` per level),
+    then appendices and (optionally) a supplement of interpretations"""
+    rand = random.Random(seed)
+    terms = _terms(definitions)
+    body = [definitions_xml(part, terms)]
+    for section in range(2, sections + 2):
+        body.append(section_xml(rand, part, section, sections + 1, depth,
+                                children, terms, citation_density))
+    for idx in range(appendices):
+        body.append(appendix_xml(rand, part, chr(ord('A') + idx)))
+    if interpretations:
+        body.append(interpretations_xml(rand, part, sections + 1))
+    return u"""
+    <CFRGRANULE>
+        <PART>
+            <EAR>Pt. %s</EAR>
+            <HD SOURCE="HED">PART %s—SYNTHETIC REGULATION</HD>
+            %s
+        </PART>
+    </CFRGRANULE>""" % (part, part, '\n'.join(body))
+
+
+def notice_xml(part='1000', title=12, sections=20, amendments=5, seed=0):
+    """A final rule which revises paragraph (a) of `amendments` of the
+    regulation's sections"""
+    rand = random.Random(seed)
+    section_nums = rand.sample(range(2, sections + 2),
+                               min(amendments, sections))
+    regtexts = []
+    for idx, section in enumerate(sorted(section_nums)):
+        regtexts.append(u"""
+            <REGTEXT PART="%s" TITLE="%d">
+                <AMDPAR>%d. In § %s.%d, revise paragraph (a) to read as
+                follows:</AMDPAR>
+                <SECTION>
+                    <SECTNO>§ %s.%d</SECTNO>
+                    <SUBJECT>Revised.</SUBJECT>
+                    <P>(a) %s</P>
+                    <STARS/>
+                </SECTION>
+            </REGTEXT>""" % (part, title, idx + 1, part, section, part,
+                             section, _sentence(rand)))
+    return u"""
+    <RULE>
+        <PREAMB>
+            <AGENCY>Synthetic Agency</AGENCY>
+            <SUBJECT>Synthetic Regulation</SUBJECT>
+        </PREAMB>
+        <SUPLINF>
+            <HD SOURCE="HED">SUPPLEMENTARY INFORMATION:</HD>
+            <P>%s</P>
+        </SUPLINF>
+        %s
+    </RULE>""" % (_sentence(rand), '\n'.join(regtexts))
+
+
+def partial_notice(part='1000', title=12, version=1):
+    """The fields we'd otherwise get from the Federal Register's API"""
+    return {'cfr_title': title, 'cfr_part': part,
+            'document_number': '2000-%05d' % version,
+            'publication_date': '2000-01-%02d' % version,
+            'effective_on': '2000-02-%02d' % version,
+            'fr_volume': 65,
+            'meta': {'dates': None, 'start_page': version * 100,
+                     'end_page': version * 100 + 10, 'type': 'Rule'}}
@@ -0,0 +1,114 @@
+import logging
+from multiprocessing import Pool
+from optparse import OptionParser
+import traceback
+
+from build_from import build
+from regparser import federalregister
+import settings
+
+
+logger = logging.getLogger('build_batch')
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+
+def parse_options():
+    parser = OptionParser(usage="python build_batch.py parts.txt")
+    parser.add_option(
+        "-w", "--workers", type="int", default=settings.BATCH_WORKERS,
+        help="number of parts built concurrently")
+    parser.add_option(
+        "-n", "--no-diffs", action="store_true", default=False,
+        help="only build the provided version of each part; skip later "
+             + "versions and diffs")
+    parser.add_option(
+        "-r", "--resume", action="store_true", default=False,
+        help="continue failed builds from their last checkpoints")
+    return parser.parse_args()
+
+
+def read_parts(path):
+    """Each (non-blank, non-comment) line describes one part: title part
+    regulation.xml notice_doc_# act_title act_section"""
+    parts = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                fields = line.split()
+                if len(fields) != 6:
+                    raise ValueError("Expected six fields: " + line)
+                title, part, reg_path, doc_number = fields[:4]
+                parts.append((int(title), part, reg_path, doc_number,
+                              fields[4:6]))
+    return parts
+
+
+#   Layer results are keyed by content, so they're shared by every part built
+#   within the same worker process
+_layer_caches = {}
+
+
+def _build_part(job):
+    """Build a single part within a worker process. Failures (including a
+    regulation which isn't the listed part) are reported rather than raised,
+    so that they don't halt the other parts"""
+    (title, part, reg_path, doc_number, act_info), generate_diffs, resume = job
+    try:
+        #   A worker can't start processes of its own, so layers, etc. are
+        #   built serially within each part
+        if build(reg_path, title, doc_number, act_info, generate_diffs,
+                 workers=1, resume=resume, layer_caches=_layer_caches,
+                 cfr_part=part):
+            return title, part, None
+        return title, part, "Could not find notice_doc_#, " + doc_number
+    except Exception:
+        return title, part, traceback.format_exc()
+
+
+def build_batch(parts, workers=1, generate_diffs=True, resume=False):
+    """Build several parts, up to `workers` at a time. As many notices
+    modify multiple parts, notice searches and XML are fetched once, up
+    front, and shared by every part's build. Returns the (title, part,
+    error) of each failed part. The fetched notices are discarded once the
+    batch is complete"""
+    try:
+        num_notices = federalregister.prefetch(
+            [(title, part) for title, part, _, _, _ in parts],
+            only_final=True, workers=workers)
+        logger.info("Fetched %d notices for %d parts", num_notices,
+                    len(parts))
+
+        jobs = [(part, generate_diffs, resume) for part in parts]
+        #   Forked after the prefetch, so each worker inherits the fetched
+        #   notices
+        pool = Pool(max(1, min(workers, len(jobs))))
+        failures = []
+        try:
+            for title, part, error in pool.imap_unordered(_build_part, jobs):
+                if error:
+                    logger.error("%d CFR %s failed:\n%s", title, part, error)
+                    failures.append((title, part, error))
+                else:
+                    logger.info("%d CFR %s complete", title, part)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        federalregister.clear_prefetched()
+    return failures
+
+
+if __name__ == "__main__":
+    options, args = parse_options()
+    if len(args) != 1:
+        print("Usage: python build_batch.py parts.txt")
+        print("  where each line of parts.txt contains: title part "
+              + "regulation.xml notice_doc_# act_title act_section")
+        exit()
+
+    failures = build_batch(read_parts(args[0]), options.workers,
+                           not options.no_diffs, options.resume)
+    if failures:
+        exit(1)
@@ -1,6 +1,7 @@
 import codecs
 import logging
-import sys
+import os
+from optparse import OptionParser
 
 try:
     import requests_cache
@@ -10,8 +11,14 @@ except ImportError:
     # HTTP requests rather than looking it up from the cache
     pass
 
-from regparser.diff import treediff
+from regparser import instrumentation
+from regparser.build_cache import BuildCache, input_key
+from regparser.diff.engine import diff_versions
 from regparser.builder import Builder, LayerCacheAggregator
+from regparser.checkpoint import Checkpoint
+from regparser.layer import registry
+from regparser.memory import MemoryReport
+import settings
 
 
 logger = logging.getLogger('build_from')
@@ -19,59 +26,206 @@ logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 6:
-        print("Usage: python build_from.py regulation.xml title "
-              + "notice_doc_# act_title act_section (Generate diffs? "
-              + "True/False)")
-        print("  e.g. python build_from.py rege.txt 12 2011-31725 15 1693 "
-              + "False")
-        exit()
+def parse_options():
+    parser = OptionParser(
+        usage="python build_from.py regulation.xml title notice_doc_# "
+              + "act_title act_section (Generate diffs? True/False)")
+    parser.add_option(
+        "-w", "--workers", type="int", default=settings.LAYER_WORKERS,
+        help="number of processes used to build each version's layers "
+             + "and the diffs between versions")
+    parser.add_option(
+        "-p", "--pipeline", action="store_true", default=False,
+        help="compile the next version while the current version's layers "
+             + "are being built")
+    parser.add_option(
+        "-t", "--timing", metavar="FILE",
+        help="write the time spent in each stage of the build to FILE, "
+             + "as JSON")
+    parser.add_option(
+        "--profile", metavar="DIR",
+        help="profile each stage of the build (with cProfile), writing the "
+             + "results to DIR")
+    parser.add_option(
+        "-m", "--memory", metavar="FILE",
+        help="write the memory used after each version (peak RSS, node "
+             + "count, approximate bytes held by trees, layer caches and "
+             + "notices, top allocation sites) to FILE, as JSON")
+    parser.add_option(
+        "-r", "--resume", action="store_true", default=False,
+        help="continue a failed build from its last checkpoint (see "
+             + "CHECKPOINT_DIR)")
+    parser.add_option(
+        "-s", "--stream", action="store_true", default=False,
+        help="write each layer as it's built rather than holding it in "
+             + "memory (ignored with multiple workers or the build cache)")
+    parser.add_option(
+        "-l", "--layers", metavar="LAYERS",
+        help="build only these (comma-separated) layers, and whatever they "
+             + "depend on, for each version; notices, regulation trees and "
+             + "diffs aren't written")
+    parser.add_option(
+        "--skip-layers", metavar="LAYERS",
+        help="build every layer except these (comma-separated); as with "
+             + "--layers, only layers are written")
+    return parser.parse_args()
 
-    with codecs.open(sys.argv[1], 'r', 'utf-8') as f:
-        reg = f.read()
 
-    doc_number = sys.argv[3]
+def build(reg_path, cfr_title, doc_number, act_info, generate_diffs=True,
+          workers=settings.LAYER_WORKERS, pipeline=False, resume=False,
+          memory_report=None, layer_caches=None, stream=False, layers=None,
+          cfr_part=None):
+    """Build and write the regulation, its layers, notices, and (if
+    requested) all subsequent versions and the diffs between them. If a
+    MemoryReport is provided, memory use is recorded after each version.
+    Layer caches (see LayerCacheAggregator) may be shared between builds.
+    Layers are streamed if requested (see Builder.gen_and_write_layers).
+    If only some layers are requested (see registry.select), only those
+    layers are written for each version. If the CFR part is provided, it
+    must match the regulation's (a ValueError is raised otherwise). Returns
+    False if the build couldn't begin"""
+    with codecs.open(reg_path, 'r', 'utf-8') as f:
+        reg = f.read()
 
     #   First, the regulation tree
-    reg_tree = Builder.reg_tree(reg)
+    build_cache = BuildCache()
+    with instrumentation.timed('tree.parse'):
+        if build_cache.enabled():
+            tree_key = input_key(reg)
+            reg_tree = build_cache.fetch_or_build(
+                'tree', tree_key, lambda: Builder.reg_tree(reg))
+        else:
+            tree_key = None
+            reg_tree = Builder.reg_tree(reg)
+    if cfr_part is not None and cfr_part != reg_tree.label_id():
+        raise ValueError("%s is part %s, not %s"
+                         % (reg_path, reg_tree.label_id(), cfr_part))
 
-    builder = Builder(cfr_title=int(sys.argv[2]),
+    builder = Builder(cfr_title=cfr_title,
                       cfr_part=reg_tree.label_id(),
                       doc_number=doc_number)
 
     #  Didn't include the provided version
     if not any(n['document_number'] == doc_number for n in builder.notices):
         print "Could not find notice_doc_#, %s" % doc_number
-        exit()
+        return False
+
+    #   Everything but the layers is unaffected by layer settings
+    layers_only = layers is not None
+    checkpoint = Checkpoint(reg_tree.label_id(), doc_number)
+    if checkpoint.enabled():
+        #   The source, notices, settings and parser the checkpoint is for,
+        #   as well as which outputs were being written: a checkpoint for
+        #   only some layers mustn't stand in for a full build
+        selected = None
+        if layers_only:
+            selected = [spec.ident for spec in layers]
+        checkpoint.inputs_key = input_key(reg, builder.notices, act_info,
+                                          selected)
+    if resume and not checkpoint.load():
+        logger.info("No checkpoint found; starting from the beginning")
+
+    if not layers_only and not checkpoint.is_written(('notices',)):
+        builder.write_notices()
+        checkpoint.mark_written(('notices',))
 
-    builder.write_notices()
-
-    #   Always do at least the first reg
-    logger.info("Version %s", doc_number)
-    builder.write_regulation(reg_tree)
-    layer_cache = LayerCacheAggregator()
-    builder.gen_and_write_layers(reg_tree, sys.argv[4:6], layer_cache)
-    layer_cache.replace_using(reg_tree)
-    if len(sys.argv) < 7 or sys.argv[6].lower() == 'true':
-        all_versions = {doc_number: reg_tree}
-        for last_notice, old, new_tree, notices in builder.revision_generator(
-                reg_tree):
+    all_versions, version_keys = {}, {}
+    if checkpoint.versions:
+        logger.info("Resuming after version %s", checkpoint.versions[-1])
+        for version in checkpoint.versions:
+            all_versions[version] = checkpoint.tree(version)
+        version_keys.update(checkpoint.keys)
+        last_tree = all_versions[checkpoint.versions[-1]]
+        tree_key = version_keys[checkpoint.versions[-1]]
+        layer_cache = LayerCacheAggregator.from_checkpoint(
+            checkpoint.cache_deltas(), layer_caches)
+    else:
+        #   Always do at least the first reg
+        logger.info("Version %s", doc_number)
+        if not layers_only:
+            builder.write_regulation(reg_tree)
+        layer_cache = LayerCacheAggregator(layer_caches)
+        builder.gen_and_write_layers(reg_tree, act_info, layer_cache,
+                                     workers=workers, tree_key=tree_key,
+                                     stream=stream, layers=layers)
+        all_versions[doc_number], version_keys[doc_number] = reg_tree, tree_key
+        last_tree = reg_tree
+        checkpoint.save_version(doc_number, reg_tree, layer_cache, tree_key)
+        if memory_report:
+            memory_report.record(doc_number, all_versions, layer_cache,
+                                 builder.notices)
+
+    if generate_diffs:
+        if pipeline:
+            revisions = builder.pipelined_revisions(
+                last_tree, tree_key, checkpoint.versions)
+        else:
+            revisions = builder.revision_generator(
+                last_tree, tree_key, checkpoint.versions)
+        for last_notice, old, new_tree, notices in revisions:
             version = last_notice['document_number']
             logger.info("Version %s", version)
             all_versions[version] = new_tree
+            if tree_key is not None:
+                tree_key = builder.tree_key(tree_key, last_notice)
+                version_keys[version] = tree_key
             builder.doc_number = version
-            builder.write_regulation(new_tree)
-            layer_cache.invalidate_by_notice(last_notice)
-            builder.gen_and_write_layers(new_tree, sys.argv[4:6],
-                                         layer_cache, notices)
-            layer_cache.replace_using(new_tree)
+            if not layers_only:
+                builder.write_regulation(new_tree)
+            builder.gen_and_write_layers(new_tree, act_info, layer_cache,
+                                         notices, workers=workers,
+                                         tree_key=tree_key, stream=stream,
+                                         layers=layers)
+            checkpoint.save_version(version, new_tree, layer_cache, tree_key)
+            if memory_report:
+                memory_report.record(version, all_versions, layer_cache,
+                                     builder.notices)
 
+    if generate_diffs and not layers_only:
         # now build diffs - include "empty" diffs comparing a version to itself
-        for lhs_version, lhs_tree in all_versions.iteritems():
-            for rhs_version, rhs_tree in all_versions.iteritems():
-                comparer = treediff.Compare(lhs_tree, rhs_tree)
-                comparer.compare()
-                builder.writer.diff(
-                    reg_tree.label_id(), lhs_version, rhs_version
-                ).write(comparer.changes)
+        if tree_key is None:
+            version_keys = None
+        for lhs_version, rhs_version, changes in diff_versions(
+                all_versions, workers, version_keys):
+            builder.writer.diff(
+                reg_tree.label_id(), lhs_version, rhs_version
+            ).write(changes)
+
+    checkpoint.clear()
+    return True
+
+
+if __name__ == "__main__":
+    options, args = parse_options()
+    if len(args) < 5:
+        print("Usage: python build_from.py regulation.xml title "
+              + "notice_doc_# act_title act_section (Generate diffs? "
+              + "True/False)")
+        print("  e.g. python build_from.py rege.txt 12 2011-31725 15 1693 "
+              + "False")
+        exit()
+
+    if options.timing or options.profile:
+        instrumentation.enable(profile=bool(options.profile))
+    layers = None
+    if options.layers or options.skip_layers:
+        try:
+            layers = registry.select(registry.parse_idents(options.layers),
+                                     registry.parse_idents(
+                                         options.skip_layers))
+        except ValueError, e:
+            print e
+            exit(1)
+    memory_report = None
+    if options.memory:
+        memory_report = MemoryReport()
+    build(args[0], int(args[1]), args[2], args[3:5],
+          len(args) < 6 or args[5].lower() == 'true', options.workers,
+          options.pipeline, options.resume, memory_report,
+          stream=options.stream, layers=layers)
+    if memory_report:
+        memory_report.write(options.memory)
+    if options.timing or options.profile:
+        report_path = options.timing or os.path.join(options.profile,
+                                                     'timing.json')
+        instrumentation.write_report(report_path, options.profile)
@@ -2,7 +2,9 @@ import os
 import os.path
 import requests
 import settings
+import time
 
+from regparser import instrumentation
 from regparser.tree.struct import NodeEncoder
 from regparser.notice.encoder import AmendmentEncoder
 
@@ -11,6 +13,11 @@ class AmendmentNodeEncoder(AmendmentEncoder, NodeEncoder):
     pass
 
 
+def _fs_encoder():
+    return AmendmentNodeEncoder(sort_keys=True, indent=4,
+                                separators=(', ', ': '))
+
+
 class FSWriteContent:
     """This writer places the contents in the file system """
 
@@ -19,6 +26,18 @@ class FSWriteContent:
 
     def write(self, python_obj):
         """Write the object as json to disk"""
+        with instrumentation.timed('write', self.path.split('/')[0]):
+            with self._open() as out:
+                #   Written as it's encoded, rather than as one big string
+                for chunk in _fs_encoder().iterencode(python_obj):
+                    out.write(chunk)
+
+    def stream(self):
+        """Write a JSON object (dictionary) to disk an entry at a time;
+        see ObjectStream"""
+        return ObjectStream(self._open(), self.path.split('/')[0])
+
+    def _open(self):
         path_parts = self.path.split('/')
         dir_path = settings.OUTPUT_DIR + os.path.join(*path_parts[:-1])
 
@@ -26,11 +45,64 @@ class FSWriteContent:
             os.makedirs(dir_path)
 
         full_path = settings.OUTPUT_DIR + os.path.join(*path_parts)
-        with open(full_path, 'w') as out:
-            text = AmendmentNodeEncoder(
-                sort_keys=True, indent=4,
-                separators=(', ', ': ')).encode(python_obj)
-            out.write(text)
+        return open(full_path, 'w')
+
+
+class ObjectStream(object):
+    """Writes a JSON object to a file one (key, value) entry at a time, so
+    that the whole object never needs to be held in memory. Entries must be
+    added in key order; the output is then identical to that of
+    FSWriteContent.write for the equivalent dictionary"""
+    INDENT = ' ' * 4
+
+    def __init__(self, out, kind=None):
+        self.out = out
+        self.kind = kind
+        self.encoder = _fs_encoder()
+        self.empty = True
+        self.wall, self.cpu = 0.0, 0.0
+
+    def add(self, key, value):
+        timing = instrumentation.enabled()
+        if timing:
+            start_wall, start_cpu = time.time(), time.clock()
+        if self.empty:
+            self.out.write('{\n' + self.INDENT)
+            self.empty = False
+        else:
+            self.out.write(', \n' + self.INDENT)
+        self.out.write(self.encoder.encode(key) + ': ')
+        #   Values are nested one level deeper than they would be alone.
+        #   Strings never contain (unescaped) newlines, so each newline is
+        #   followed by indentation
+        for chunk in self.encoder.iterencode(value):
+            self.out.write(chunk.replace('\n', '\n' + self.INDENT))
+        if timing:
+            self.wall += time.time() - start_wall
+            self.cpu += time.clock() - start_cpu
+
+    def close(self):
+        if self.empty:
+            self.out.write('{}')
+        else:
+            self.out.write('\n}')
+        self.out.close()
+        if instrumentation.enabled():
+            instrumentation.record('write', self.wall, self.cpu, self.kind)
+
+
+class CollectedStream(object):
+    """Stands in for an ObjectStream where the object can't be streamed;
+    entries are collected and the whole object is written on close"""
+    def __init__(self, writer):
+        self.writer = writer
+        self.python_obj = {}
+
+    def add(self, key, value):
+        self.python_obj[key] = value
+
+    def close(self):
+        self.writer.write(self.python_obj)
 
 
 class APIWriteContent:
@@ -40,10 +112,15 @@ class APIWriteContent:
 
     def write(self, python_obj):
         """Write the object (as json) to the API"""
-        requests.post(
-            settings.API_BASE + self.path,
-            data=AmendmentNodeEncoder().encode(python_obj),
-            headers={'content-type': 'application/json'})
+        with instrumentation.timed('write', self.path.split('/')[0]):
+            requests.post(
+                settings.API_BASE + self.path,
+                data=AmendmentNodeEncoder().encode(python_obj),
+                headers={'content-type': 'application/json'})
+
+    def stream(self):
+        """The API receives each object in a single request"""
+        return CollectedStream(self)
 
 
 class Client:
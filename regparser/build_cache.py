@@ -0,0 +1,116 @@
+"""Building every version of a regulation repeats a great deal of work from
+one run to the next. This module provides a persistent, on-disk cache for
+the expensive intermediate results (parsed trees, parsed notices, compiled
+versions, layers, diffs). Entries are keyed by a fingerprint of all of the
+inputs which produced them, including the parser's own source code, so
+stale entries are never reused; they simply stop being looked up."""
+import cPickle as pickle
+import hashlib
+import os
+import tempfile
+
+from regparser.notice.encoder import AmendmentEncoder
+from regparser.tree.struct import NodeEncoder
+import settings
+
+
+class _KeyEncoder(AmendmentEncoder, NodeEncoder):
+    pass
+
+
+#   Settings which affect where output goes (or how quickly it's built), but
+#   not what is built
+IGNORED_SETTINGS = ('API_BASE', 'BATCH_WORKERS', 'BUILD_CACHE_DIR',
+                    'CHECKPOINT_DIR', 'LAYER_CACHE_BYTES', 'LAYER_WORKERS',
+                    'OUTPUT_DIR', 'VERIFY_DEFINITIONS')
+
+_parser_version = []
+#   Sentinel for cache misses (as None may be a legitimate cached value)
+_missing = object()
+
+
+def parser_version():
+    """A fingerprint of the parser itself: its source code and settings.
+    Computed once per process"""
+    if not _parser_version:
+        digest = hashlib.sha1()
+        root = os.path.dirname(os.path.abspath(__file__))
+        for dir_path, _, file_names in sorted(os.walk(root)):
+            for file_name in sorted(file_names):
+                if file_name.endswith('.py'):
+                    digest.update(os.path.relpath(
+                        os.path.join(dir_path, file_name), root))
+                    with open(os.path.join(dir_path, file_name)) as f:
+                        digest.update(f.read())
+        for name in sorted(dir(settings)):
+            if name.isupper() and name not in IGNORED_SETTINGS:
+                digest.update(name + repr(getattr(settings, name)))
+        _parser_version.append(digest.hexdigest())
+    return _parser_version[0]
+
+
+def input_key(*inputs):
+    """Fingerprint a collection of inputs (strings, trees, notices,
+    changes, etc.)"""
+    digest = hashlib.sha1(parser_version())
+    for value in inputs:
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        if not isinstance(value, str):
+            value = _KeyEncoder(sort_keys=True).encode(value)
+        digest.update(str(len(value)) + ':')
+        digest.update(value)
+    return digest.hexdigest()
+
+
+class BuildCache(object):
+    """Pickles intermediate results to disk, in directories by kind (e.g.
+    'tree', 'layer'). If no directory is configured, nothing is cached."""
+    def __init__(self, path=None):
+        if path is None:
+            path = settings.BUILD_CACHE_DIR
+        self.path = path
+
+    def enabled(self):
+        return bool(self.path)
+
+    def _file_path(self, kind, key):
+        return os.path.join(self.path, kind, key)
+
+    def get(self, kind, key, default=None):
+        if not self.enabled():
+            return default
+        try:
+            with open(self._file_path(kind, key), 'rb') as f:
+                return pickle.load(f)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            return default
+
+    def contains(self, kind, key):
+        return self.enabled() and os.path.exists(self._file_path(kind, key))
+
+    def set(self, kind, key, value):
+        """Write the value. Writes to a temporary file first so that
+        concurrent builds never see a partially written entry"""
+        if not self.enabled():
+            return
+        dir_path = os.path.join(self.path, kind)
+        if not os.path.exists(dir_path):
+            try:
+                os.makedirs(dir_path)
+            except OSError:     # Created by another process
+                pass
+        handle, tmp_path = tempfile.mkstemp(dir=dir_path)
+        with os.fdopen(handle, 'wb') as f:
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, self._file_path(kind, key))
+
+    def fetch_or_build(self, kind, key, build_fn):
+        """Retrieve the value if present; otherwise, build and store it"""
+        value = self.get(kind, key, _missing)
+        if value is not _missing:
+            return value
+        value = build_fn()
+        self.set(kind, key, value)
+        return value
+
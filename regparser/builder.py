@@ -1,18 +1,72 @@
 import copy
+import multiprocessing
+import traceback
 
-from regparser import api_writer, content
+from regparser import api_writer, content, instrumentation
+from regparser.build_cache import BuildCache, input_key
 from regparser.federalregister import fetch_notices
 from regparser.history.notices import (
     applicable as applicable_notices, group_by_eff_date)
 from regparser.history.delays import modify_effective_dates
-from regparser.layer import (
-    external_citations, formatting, graphics, key_terms, internal_citations,
-    interpretations, meta, paragraph_markers, section_by_section,
-    table_of_contents, terms)
+from regparser.layer import registry
+from regparser.layer.layer import build_layers
+from regparser.memory import approximate_size
 from regparser.notice.compiler import compile_regulation
 from regparser.tree import struct
 from regparser.tree.build import build_whole_regtree
 from regparser.tree.xml_parser import reg_text
+import settings
+
+
+#   Arguments shared by every layer of a single version and each layer's
+#   LayerCache (by ident). Set once per worker process (see
+#   _init_layer_worker) so neither the tree nor the caches are re-sent with
+#   each layer
+_layer_args = None
+_layer_caches = None
+
+
+def _init_layer_worker(layer_args, layer_caches):
+    global _layer_args, _layer_caches
+    _layer_args = layer_args
+    _layer_caches = layer_caches
+    #   Only what's added (and counted) by this worker is sent back
+    for cache in layer_caches.itervalues():
+        cache.unsaved()
+        cache.hits, cache.misses, cache.evictions = 0, 0, 0
+
+
+def _build_layer(job):
+    """Build a single layer. This is the unit of work sent to the process
+    pool. The results added to the worker's copy of the layer's cache are
+    returned alongside the layer, to be merged into the original"""
+    ident, layer_class = job
+    cache = _layer_caches.get(ident)
+    layer = layer_class(*_layer_args).build(cache)
+    added = None
+    if cache is not None:
+        added = cache.unsaved()
+        if instrumentation.enabled():
+            cache.record_stats()
+    return ident, layer, added, instrumentation.collect()
+
+
+def _compile(version, old_tree, changes):
+    with instrumentation.timed('compile_regulation', version):
+        return compile_regulation(old_tree, changes)
+
+
+def _compile_revisions(builder, reg_tree, tree_key, completed, queue):
+    """Producer half of Builder.pipelined_revisions. Runs in its own process,
+    compiling each version and passing it along"""
+    try:
+        for notice, _, new_tree, notices in builder.revision_generator(
+                reg_tree, tree_key, completed):
+            queue.put(('version', (notice, new_tree, notices,
+                                   instrumentation.collect())))
+        queue.put(('done', None))
+    except Exception:
+        queue.put(('error', traceback.format_exc()))
 
 
 class Builder(object):
@@ -24,6 +78,7 @@ class Builder(object):
         self.cfr_part = cfr_part
         self.doc_number = doc_number
         self.writer = api_writer.Client()
+        self.build_cache = BuildCache()
 
         self.notices = fetch_notices(self.cfr_title, self.cfr_part,
                                      only_final=True)
@@ -41,50 +96,177 @@ class Builder(object):
     def write_regulation(self, reg_tree):
         self.writer.regulation(self.cfr_part, self.doc_number).write(reg_tree)
 
-    def gen_and_write_layers(self, reg_tree, act_info, cache, notices=None):
+    def gen_and_write_layers(self, reg_tree, act_info, cache, notices=None,
+                             workers=None, tree_key=None, stream=False,
+                             layers=None):
+        """Build and write each of the layers (by default, all of those in
+        the registry) for this version of the regulation. If more than one
+        worker is requested, the layers are built in a process pool, most
+        expensive first; they are still written in order. If the tree's key
+        is provided, layers (other than those which aren't persistent; see
+        registry.LayerSpec) are stored in/retrieved from the build cache.
+        Otherwise, when building serially, layers may be streamed: written
+        as they're built, rather than held in memory"""
         if notices is None:
             notices = applicable_notices(self.notices, self.doc_number)
-        for ident, layer_class in (
-                ('external-citations',
-                    external_citations.ExternalCitationParser),
-                ('meta', meta.Meta),
-                ('analyses', section_by_section.SectionBySection),
-                ('internal-citations',
-                    internal_citations.InternalCitationParser),
-                ('toc', table_of_contents.TableOfContentsLayer),
-                ('interpretations', interpretations.Interpretations),
-                ('terms', terms.Terms),
-                ('paragraph-markers', paragraph_markers.ParagraphMarkers),
-                ('keyterms', key_terms.KeyTerms),
-                ('formatting', formatting.Formatting),
-                ('graphics', graphics.Graphics)):
-            layer = layer_class(
-                reg_tree, self.cfr_title, self.doc_number, notices,
-                act_info).build(cache.cache_for(ident))
-            self.writer.layer(ident, self.cfr_part, self.doc_number).write(
-                layer)
-
-    def revision_generator(self, reg_tree):
+        if workers is None:
+            workers = settings.LAYER_WORKERS
+        if layers is None:
+            layers = registry.LAYERS
+        layer_args = (reg_tree, self.cfr_title, self.doc_number, notices,
+                      act_info)
+
+        layer_keys, cached = {}, {}
+        if tree_key is not None and self.build_cache.enabled():
+            notices_key = input_key(notices)
+            for spec in layers:
+                if not spec.persistent:
+                    continue
+                #   Layers which ignore the notices needn't be rebuilt when
+                #   they change
+                layer_keys[spec.ident] = input_key(
+                    tree_key, spec.ident, self.cfr_title, self.doc_number,
+                    notices_key if spec.notices else None, act_info)
+                layer = self.build_cache.get('layer', layer_keys[spec.ident])
+                if layer is not None:
+                    cached[spec.ident] = layer
+
+        specs = [spec for spec in layers if spec.ident not in cached]
+        jobs = [(spec.ident, spec.load(),
+                 cache.cache_for(spec.ident) if spec.cacheable else None)
+                for spec in specs]
+        stream = stream and workers <= 1 and not layer_keys
+
+        if workers > 1 and jobs:
+            #   Start the slowest layers first, so that they aren't left
+            #   running alone at the end
+            order = sorted(range(len(jobs)), key=lambda idx: -specs[idx].cost)
+            layer_caches = dict((ident, layer_cache)
+                                for ident, _, layer_cache in jobs
+                                if layer_cache is not None)
+            pool = multiprocessing.Pool(
+                min(workers, len(jobs)), initializer=_init_layer_worker,
+                initargs=(layer_args, layer_caches))
+            try:
+                results = [None] * len(jobs)
+                built = pool.map(
+                    _build_layer,
+                    [(jobs[idx][0], jobs[idx][1]) for idx in order],
+                    chunksize=1)
+                for idx, (ident, layer, added, stats) in zip(order, built):
+                    instrumentation.merge(stats)
+                    layer_cache = jobs[idx][2]
+                    if added:
+                        layer_cache.update(added)
+                    results[idx] = (ident, layer, layer_cache)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            #   All of the layers are built in the same traversals
+            instances = [layer_class(*layer_args)
+                         for _, layer_class, _ in jobs]
+            layer_caches = [layer_cache for _, _, layer_cache in jobs]
+            if stream:
+                streams = [self.writer.layer(ident, self.cfr_part,
+                                             self.doc_number).stream()
+                           for ident, _, _ in jobs]
+                build_layers(reg_tree, instances, layer_caches, streams)
+                for layer_stream in streams:
+                    layer_stream.close()
+                contents = [None] * len(jobs)
+            else:
+                contents = build_layers(reg_tree, instances, layer_caches)
+            results = [(ident, content, layer_cache)
+                       for (ident, _, layer_cache), content
+                       in zip(jobs, contents)]
+
+        results = iter(results)
+        for spec in layers:
+            ident = spec.ident
+            if ident in cached:
+                layer = cached[ident]
+            else:
+                _, layer, layer_cache = next(results)
+                if layer_cache is not None and instrumentation.enabled():
+                    layer_cache.record_stats()
+                if ident in layer_keys:
+                    self.build_cache.set('layer', layer_keys[ident], layer)
+            if not stream:
+                self.writer.layer(ident, self.cfr_part,
+                                  self.doc_number).write(layer)
+
+    def tree_key(self, previous_key, notice, merged_changes=None):
+        """Fingerprint of the inputs used to compile the version associated
+        with this notice. The notice's changes, merged with any patches, may
+        be provided if they've already been computed"""
+        version = notice['document_number']
+        if merged_changes is None:
+            merged_changes = self.merge_changes(version, notice['changes'])
+        return input_key(previous_key, version, merged_changes)
+
+    def revision_generator(self, reg_tree, tree_key=None, completed=()):
+        """Compile each subsequent version of the regulation. If the
+        initial tree's key is provided, compiled trees are stored
+        in/retrieved from the build cache. Versions listed in `completed`
+        are skipped; `reg_tree` should then be the last of them"""
         relevant_notices = []
         for date in sorted(self.eff_notices.keys()):
             relevant_notices.extend(
                 n for n in self.eff_notices[date]
-                if 'changes' in n and n['document_number'] != self.doc_number)
+                if 'changes' in n and n['document_number'] != self.doc_number
+                and n['document_number'] not in completed)
         for notice in relevant_notices:
             version = notice['document_number']
             old_tree = reg_tree
             merged_changes = self.merge_changes(version, notice['changes'])
-            reg_tree = compile_regulation(old_tree, merged_changes)
+            if tree_key is None:
+                reg_tree = _compile(version, old_tree, merged_changes)
+            else:
+                tree_key = self.tree_key(tree_key, notice, merged_changes)
+                reg_tree = self.build_cache.fetch_or_build(
+                    'tree', tree_key,
+                    lambda: _compile(version, old_tree, merged_changes))
             notices = applicable_notices(self.notices, version)
             yield notice, old_tree, reg_tree, notices
 
+    def pipelined_revisions(self, reg_tree, tree_key=None, completed=(),
+                            depth=2):
+        """Equivalent to revision_generator, but versions are compiled in a
+        separate process. That process runs ahead of the consumer (which is
+        generating and writing layers) by up to `depth` versions."""
+        queue = multiprocessing.Queue(depth)
+        producer = multiprocessing.Process(
+            target=_compile_revisions,
+            args=(self, reg_tree, tree_key, completed, queue))
+        producer.daemon = True
+        producer.start()
+        try:
+            old_tree = reg_tree
+            while True:
+                kind, payload = queue.get()
+                if kind == 'done':
+                    break
+                elif kind == 'error':
+                    raise RuntimeError("Compiling versions failed:\n"
+                                       + payload)
+                notice, new_tree, notices, stats = payload
+                instrumentation.merge(stats)
+                yield notice, old_tree, new_tree, notices
+                old_tree = new_tree
+        finally:
+            if producer.is_alive():
+                producer.terminate()
+            producer.join()
+
     def merge_changes(self, document_number, changes):
         patches = content.RegPatches().get(document_number)
         if patches:
             changes = copy.copy(changes)
             for key in patches:
                 if key in changes:
-                    changes[key].extend(patches[key])
+                    #   Don't modify the notice's list
+                    changes[key] = changes[key] + patches[key]
                 else:
                     changes[key] = patches[key]
         return changes
@@ -99,11 +281,19 @@ class Builder(object):
 
 class LayerCacheAggregator(object):
     """A lot of the reg tree remains the same between versions; we don't
-    want to recompute layers every time. This object keeps track of what
-    labels are seen/valid."""
-    def __init__(self):
+    want to recompute layers every time. This object holds a cache per
+    layer. Each is keyed by content (see LayerCache), so results carry over
+    between versions without tracking which labels have changed, and the
+    caches may be shared with other aggregators, e.g. those of the other
+    parts in a batch.
+
+    It also keeps track of what labels are seen/valid (see replace_using
+    and invalidate), for callers which ask whether a label is_known. The
+    layer caches don't consult these labels."""
+    def __init__(self, caches=None):
         self._known_labels = set()
-        self._caches = {}
+        #   layer name -> LayerCache
+        self._caches = {} if caches is None else caches
 
     def invalidate(self, labels):
         """Given a list of labels, clear out any known labels that would be
@@ -117,12 +307,14 @@ class LayerCacheAggregator(object):
             for label in labels:
                 if struct.Node.INTERP_MARK in label:
                     idx = label.find(struct.Node.INTERP_MARK) - 1
-                    stripped.append(label[:idx])
-                else:
-                    stripped.append(label)
+                    label = label[:idx]
+                stripped.append(label)
+            #   Labels within (e.g. 123-1-a for 123-1), but not siblings
+            #   which merely share a prefix (e.g. 123-10)
             self._known_labels = set(
                 known for known in self._known_labels
-                if not any(known.startswith(l) for l in stripped))
+                if not any(known == l or known.startswith(l + '-')
+                           for l in stripped))
 
     def invalidate_by_notice(self, notice):
         """Using the notice structure, invalidate based on the 'changes'
@@ -137,45 +329,163 @@ class LayerCacheAggregator(object):
     def replace_using(self, tree):
         """Clear out the known labels; replace them using the provided node
         tree."""
-        self._known_labels = set()
+        self._known_labels = set(node.label_id()
+                                 for node in struct.pre_order(tree))
+
+    def checkpoint_delta(self):
+        """The results cached since the last call, by layer name. A
+        checkpoint need only write these rather than every cached result"""
+        return dict((layer_name, layer_cache.unsaved())
+                    for layer_name, layer_cache in self._caches.iteritems())
 
-        def per_node(node):
-            self._known_labels.add(node.label_id())
-        struct.walk(tree, per_node)
+    @staticmethod
+    def from_checkpoint(deltas, caches=None):
+        """Recreate an aggregator from each of the checkpoint_deltas, in
+        order. Known labels aren't checkpointed"""
+        aggregator = LayerCacheAggregator(caches)
+        for delta in deltas:
+            for layer_name, cached in delta.iteritems():
+                aggregator.cache_for(layer_name).update(cached)
+        #   These have been saved already
+        aggregator.checkpoint_delta()
+        return aggregator
+
+    def caches(self):
+        """Each layer's LayerCache, by layer name"""
+        return dict(self._caches)
 
     def cache_for(self, layer_name):
-        """Get a LayerCache object for a given layer name. Not all layers
-        have caches, as caches are currently only used for layers that
-        depend on the node's text"""
-        if layer_name in ('external-citations', 'internal-citations',
-                          'interpretations', 'paragraph-markers', 'keyterms',
-                          'formatting', 'graphics'):
-            if not layer_name in self._caches:
-                self._caches[layer_name] = LayerCache(self)
-            return self._caches[layer_name]
-        else:
-            return EmptyCache()
+        """Get a LayerCache object for a given layer name. Each layer
+        declares what it reads (see Layer.cache_key), so all of them can be
+        cached"""
+        if not layer_name in self._caches:
+            budgets = settings.LAYER_CACHE_BYTES
+            self._caches[layer_name] = LayerCache(
+                layer_name, budgets.get(layer_name, budgets.get('ALL', 0)))
+        return self._caches[layer_name]
 
 
 class LayerCache(object):
-    """Keeps a cache of a single layer. Used in combination with a
-    LayerCacheAggregator to determine when something needs to be recomputed."""
-    def __init__(self, parent):
-        self.parent = parent
+    """Keeps a cache of a single layer, keyed by a digest of what the layer
+    reads from each node (see Layer.cache_key) rather than by label. Results
+    therefore carry over between versions, survive paragraphs being moved or
+    renumbered (for layers which don't depend on the label) and can be shared
+    between regulations.
+
+    If given a budget (in bytes), the least recently used results are
+    evicted once the (approximate) size of the cached results exceeds it.
+    Hits, misses and evictions are counted; see record_stats"""
+    def __init__(self, name=None, max_bytes=0):
+        self.name = name
+        self.max_bytes = max_bytes
         self._cache = {}
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        #   Keys added since the last call to unsaved
+        self._unsaved = set()
+        #   Only needed if bounded: the size of each entry and a circular,
+        #   doubly linked list of [previous, next, key] links, from least to
+        #   most recently used
+        self.size = 0
+        self._sizes = {}
+        self._links = {}
+        self._root = [None, None, None]
+        self._root[0] = self._root[1] = self._root
 
     def fetch_or_process(self, layer, node):
         """Retrieve the value of a layer if known. Otherwise, compute the
         value and cache the result"""
-        label = node.label_id()
-        if not self.parent.is_known(label):
-            self._cache[label] = layer.process(node)
-        return self._cache.get(label)
+        value = self.fetch_or_compute(
+            layer.cache_key(node), lambda: layer.process_cacheable(node))
+        return layer.complete(node, value)
 
+    def fetch_or_compute(self, key, compute):
+        """Retrieve the value stored under this key if known. Otherwise,
+        compute (with no arguments) the value and cache the result. Layers
+        may use this to cache other work, e.g. pre-processing, under keys
+        which won't collide with their cache_keys"""
+        if key in self._cache:
+            self.hits += 1
+            value = self._cache[key]
+            if self.max_bytes:
+                self._use(key)
+        else:
+            self.misses += 1
+            value = compute()
+            self._add(key, value)
+        return value
 
-class EmptyCache(object):
-    """Dummy cache used to represent layers that should not be cached. For
-    example, the toc layer depends on more than the text of its associated
-    node, so it should not be cached."""
-    def fetch_or_process(self, layer, node):
-        return layer.process(node)
+    def update(self, entries):
+        """Add several (key -> value) entries, e.g. from a checkpoint"""
+        for key, value in entries.iteritems():
+            self._add(key, value)
+
+    def unsaved(self):
+        """The entries added since this was last called (and which haven't
+        been evicted since), e.g. for a checkpoint to write"""
+        entries = dict((key, self._cache[key]) for key in self._unsaved
+                       if key in self._cache)
+        self._unsaved = set()
+        return entries
+
+    def _add(self, key, value):
+        self._cache[key] = value
+        self._unsaved.add(key)
+        if self.max_bytes:
+            size = len(key) + approximate_size(value)
+            self.size += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+            self._use(key)
+            while self.size > self.max_bytes:
+                self._evict()
+
+    def _use(self, key):
+        """Mark this key as the most recently used"""
+        link = self._links.get(key)
+        if link:
+            link[0][1], link[1][0] = link[1], link[0]
+        else:
+            link = self._links[key] = [None, None, key]
+        last = self._root[0]
+        link[0], link[1] = last, self._root
+        last[1] = self._root[0] = link
+
+    def _evict(self):
+        """Remove the least recently used entry"""
+        link = self._root[1]
+        link[0][1], link[1][0] = link[1], link[0]
+        key = link[2]
+        del self._links[key]
+        del self._cache[key]
+        self.size -= self._sizes.pop(key)
+        self.evictions += 1
+
+    def record_stats(self):
+        """Add the hits, misses and evictions counted so far to the
+        instrumentation, then start counting afresh"""
+        for counter in ('hits', 'misses', 'evictions'):
+            if getattr(self, counter):
+                instrumentation.increment('layer_cache.' + counter,
+                                          self.name, getattr(self, counter))
+                setattr(self, counter, 0)
+
+    def __getstate__(self):
+        """The linked list is recreated when unpickled (pickling it
+        directly would recurse through every link)"""
+        state = dict(self.__dict__)
+        del state['_links']
+        del state['_root']
+        state['_order'] = []
+        link = self._root[1]
+        while link is not self._root:
+            state['_order'].append(link[2])
+            link = link[1]
+        return state
+
+    def __setstate__(self, state):
+        order = state.pop('_order')
+        self.__dict__.update(state)
+        self._links = {}
+        self._root = [None, None, None]
+        self._root[0] = self._root[1] = self._root
+        for key in order:
+            self._use(key)
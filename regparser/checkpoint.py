@@ -0,0 +1,116 @@
+"""Building every version of a large regulation can take a long time; if
+something goes wrong late in the process (e.g. a malformed notice), we don't
+want to lose the earlier work. This module records a checkpoint after each
+version is written so that a subsequent run can pick up where the failed
+one left off."""
+import cPickle as pickle
+import logging
+import os
+import shutil
+import tempfile
+
+import settings
+
+
+class Checkpoint(object):
+    """Checkpoints for a single build (i.e. a regulation part, starting
+    from a particular notice). Consists of each compiled tree, in its own
+    file, the results each version added to the layer caches, also in their
+    own files, and a state file listing the completed versions, those files
+    and the outputs which have been written so far. Only the state file is
+    re-written with each version."""
+    STATE_FILE = 'state'
+
+    def __init__(self, cfr_part, doc_number, path=None, inputs_key=None):
+        """inputs_key fingerprints what the build was given (see
+        build_cache.input_key); a checkpoint is only resumed if the inputs
+        are unchanged"""
+        if path is None:
+            path = settings.CHECKPOINT_DIR
+        if path:
+            path = os.path.join(path, '%s-%s' % (cfr_part, doc_number))
+        self.path = path
+        self.inputs_key = inputs_key
+        self.versions = []
+        self.keys = {}
+        self.written = []
+        self.cache_files = []
+
+    def enabled(self):
+        return bool(self.path)
+
+    def _file_path(self, file_name):
+        return os.path.join(self.path, file_name)
+
+    def _dump(self, file_name, value):
+        """Write to a temporary file first so that a failure mid-write never
+        leaves a partial checkpoint"""
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        handle, tmp_path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(handle, 'wb') as f:
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, self._file_path(file_name))
+
+    def _load(self, file_name):
+        with open(self._file_path(file_name), 'rb') as f:
+            return pickle.load(f)
+
+    def load(self):
+        """Read the last recorded state. Returns False if there is no
+        checkpoint to resume from"""
+        if not self.enabled() or not os.path.exists(
+                self._file_path(self.STATE_FILE)):
+            return False
+        state = self._load(self.STATE_FILE)
+        if state.get('inputs_key') != self.inputs_key:
+            logging.warning("Discarding checkpoint in %s: it was built from "
+                            "different inputs", self.path)
+            self.clear()
+            return False
+        self.versions = state['versions']
+        self.keys = state['keys']
+        self.written = state['written']
+        self.cache_files = state['cache_files']
+        return True
+
+    def cache_deltas(self):
+        """The results added to the layer caches, version by version (see
+        LayerCacheAggregator.from_checkpoint)"""
+        for file_name in self.cache_files:
+            yield self._load(file_name)
+
+    def tree(self, version):
+        return self._load('tree-' + version)
+
+    def mark_written(self, output):
+        """Record that an output (e.g. ('notices',)) has been written. Only
+        persisted with the next version"""
+        if output not in self.written:
+            self.written.append(output)
+
+    def is_written(self, output):
+        return output in self.written
+
+    def save_version(self, version, tree, layer_cache, tree_key=None):
+        """Record that this version (and all of its outputs) is complete"""
+        self.mark_written(('regulation', version))
+        self.mark_written(('layers', version))
+        if not self.enabled():
+            return
+        self._dump('tree-' + version, tree)
+        cache_file = 'cache-%d' % len(self.cache_files)
+        self._dump(cache_file, layer_cache.checkpoint_delta())
+        self.cache_files.append(cache_file)
+        if version not in self.versions:
+            self.versions.append(version)
+        self.keys[version] = tree_key
+        self._dump(self.STATE_FILE, {
+            'inputs_key': self.inputs_key,
+            'versions': self.versions, 'keys': self.keys,
+            'written': self.written, 'cache_files': self.cache_files})
+
+    def clear(self):
+        """Remove the checkpoint; called once the build has completed"""
+        if self.enabled() and os.path.exists(self.path):
+            shutil.rmtree(self.path)
@@ -1,6 +1,10 @@
+#vim: set encoding=utf-8
 from itertools import chain
+import re
 
 from regparser.grammar import unified as grammar
+from regparser.grammar.utils import record_trigger, scan_positions
+from regparser.intervals import IntervalSet, properly_contained
 from regparser.tree.struct import Node
 
 
@@ -150,12 +154,50 @@ def match_to_label(match, initial_label, comment=False):
     return label
 
 
+#   Every citation grammar begins with one of these. Markers are caseless,
+#   so they are searched for in the upper-cased text (which is how
+#   pyparsing compares them). Each is a lookahead so that triggers which
+#   overlap are all found
+_TRIGGERS = re.compile(
+    u'(?=(?P<comment>COMMENT|OFFICIAL|SUPPLEMENT)|(?P<paragraph>PARAGRAPH)'
+    u'|(?P<section>§|SECTION)|(?P<appendix>APPENDI)'
+    u'|(?P<digits>[0-9]+[ \t\n\r]*[(.]))')
+#   Appendix labels (e.g. "A-5") are case sensitive
+_APPENDIX_SECTION_TRIGGER = re.compile(r'(?=[A-Z]+[0-9]*\b[ \t\n\r]*-)')
+
+
+def citation_triggers(text):
+    """Map each kind of trigger to the (ascending) positions in the text
+    where it occurs. A single pass over the text finds the positions at
+    which any citation might start"""
+    triggers = {'comment': [], 'paragraph': [], 'section': [],
+                'appendix': [], 'digits': [], 'appendix_section': []}
+    for match in _TRIGGERS.finditer(text.upper()):
+        triggers[match.lastgroup].append(match.start())
+    triggers['appendix_section'] = [
+        match.start() for match in _APPENDIX_SECTION_TRIGGER.finditer(text)]
+    return triggers
+
+
 def internal_citations(text, initial_label=None, require_marker=False):
     """List of all internal citations in the text. require_marker helps by
     requiring text be prepended by 'comment'/'paragraphs'/etc."""
     if not initial_label:
         initial_label = Label()
     citations = []
+    #   Positions are relative to the text as scanString would see it
+    text = text.expandtabs()
+    triggers = citation_triggers(text)
+    found = any(triggers.values())
+    record_trigger('citations', found)
+    if not found:
+        return []
+
+    def scan(grammar, *kinds):
+        """Only try the grammar where one of its triggers occurs"""
+        positions = sorted(chain.from_iterable(triggers[kind]
+                                               for kind in kinds))
+        return scan_positions(grammar, text, positions)
 
     def multiple_citations(matches, comment):
         """i.e. head :: tail"""
@@ -182,30 +224,32 @@ def internal_citations(text, initial_label=None, require_marker=False):
                                            comment=comment),
                 full_start=full_start))
 
-    single_citations(grammar.marker_comment.scanString(text), True)
+    single_citations(scan(grammar.marker_comment, 'comment'), True)
 
-    multiple_citations(grammar.multiple_non_comments.scanString(text), False)
-    multiple_citations(grammar.multiple_appendix_section.scanString(text),
-                       False)
-    multiple_citations(grammar.multiple_comments.scanString(text), True)
-    multiple_citations(grammar.multiple_appendices.scanString(text), False)
-    multiple_citations(grammar.multiple_period_sections.scanString(text),
+    multiple_citations(scan(grammar.multiple_non_comments,
+                            'paragraph', 'section'), False)
+    multiple_citations(scan(grammar.multiple_appendix_section,
+                            'appendix_section'), False)
+    multiple_citations(scan(grammar.multiple_comments, 'comment'), True)
+    multiple_citations(scan(grammar.multiple_appendices, 'appendix'), False)
+    multiple_citations(scan(grammar.multiple_period_sections, 'section'),
                        False)
 
-    single_citations(grammar.marker_appendix.scanString(text), False)
-    single_citations(grammar.appendix_with_section.scanString(text), False)
-    single_citations(grammar.marker_paragraph.scanString(text), False)
-    single_citations(grammar.mps_paragraph.scanString(text), False)
-    single_citations(grammar.m_section_paragraph.scanString(text), False)
+    single_citations(scan(grammar.marker_appendix, 'appendix'), False)
+    single_citations(scan(grammar.appendix_with_section, 'appendix_section'),
+                     False)
+    single_citations(scan(grammar.marker_paragraph, 'paragraph'), False)
+    single_citations(scan(grammar.mps_paragraph, 'section'), False)
+    single_citations(scan(grammar.m_section_paragraph, 'paragraph'), False)
     if not require_marker:
-        single_citations(grammar.section_paragraph.scanString(text), False)
-        single_citations(grammar.part_section_paragraph.scanString(text),
+        single_citations(scan(grammar.section_paragraph, 'digits'), False)
+        single_citations(scan(grammar.part_section_paragraph, 'digits'),
                          False)
         multiple_citations(
-            grammar.multiple_section_paragraphs.scanString(text), False)
+            scan(grammar.multiple_section_paragraphs, 'digits'), False)
 
     # Some appendix citations are... complex
-    for match, start, end in grammar.appendix_with_part.scanString(text):
+    for match, start, end in scan(grammar.appendix_with_part, 'appendix'):
         full_start = start
         if match.marker is not '':
             start = match.marker.pos[1]
@@ -217,18 +261,15 @@ def internal_citations(text, initial_label=None, require_marker=False):
                 **label), full_start=full_start))
 
     # Remove any sub-citations
-    final_citations = []
-    for cit in citations:
-        if not any(cit in other for other in citations):
-            final_citations.append(cit)
-
-    return final_citations
+    contained = properly_contained((cit.full_start, cit.full_end)
+                                   for cit in citations)
+    return [cit for cit in citations
+            if (cit.full_start, cit.full_end) not in contained]
 
 
 def remove_citation_overlaps(text, possible_markers):
     """Given a list of markers, remove any that overlap with citations"""
+    citations = IntervalSet((cit.start, cit.end)
+                            for cit in internal_citations(text))
     return [(m, start, end) for m, start, end in possible_markers
-            if not any((e.start <= start and e.end >= start)
-                       or (e.start <= end and e.end >= end)
-                       or (start <= e.start and end >= e.end)
-                       for e in internal_citations(text))]
+            if not citations.overlaps(start, end)]
@@ -0,0 +1,88 @@
+"""Diffs are generated between every pair of versions of a regulation. This
+module generates all of them while avoiding redundant work: a version
+compared to itself has no changes, the changes from B to A are derived
+while computing those from A to B, and the remaining pairs can be spread
+across a process pool. If each version's key is known, results are also
+kept in the build cache."""
+import multiprocessing
+
+from regparser import instrumentation
+from regparser.build_cache import BuildCache, input_key
+from regparser.diff import treediff
+
+
+#   version -> tree; set once per worker process (see _init_worker) so that
+#   the trees aren't re-sent with every pair
+_versions = None
+
+
+def _init_worker(versions):
+    global _versions
+    _versions = versions
+
+
+def _compare_pair(pair):
+    """Compare a single pair of versions, in both directions"""
+    lhs_version, rhs_version = pair
+    with instrumentation.timed('diff', lhs_version + ':' + rhs_version):
+        comparer = treediff.SymmetricCompare(_versions[lhs_version],
+                                             _versions[rhs_version])
+        comparer.compare()
+    return (lhs_version, rhs_version, comparer.changes,
+            comparer.reverse_changes, instrumentation.collect())
+
+
+def version_pairs(versions):
+    """Each unordered pair of distinct versions, exactly once"""
+    version_ids = sorted(versions.keys())
+    for idx, lhs_version in enumerate(version_ids):
+        for rhs_version in version_ids[idx + 1:]:
+            yield lhs_version, rhs_version
+
+
+def diff_versions(versions, workers=1, keys=None):
+    """Given a dictionary of version -> tree, generate a triplet of
+    (lhs_version, rhs_version, changes) for every ordered pair of versions,
+    including each version compared to itself. `keys`, if present, maps
+    each version to the build cache key of its tree"""
+    for version in sorted(versions.keys()):
+        yield version, version, {}
+
+    build_cache = BuildCache()
+    pairs, pair_keys = [], {}
+    for lhs, rhs in version_pairs(versions):
+        if keys and build_cache.enabled():
+            pair_keys[(lhs, rhs)] = input_key(keys[lhs], keys[rhs])
+            cached = build_cache.get('diff', pair_keys[(lhs, rhs)])
+            if cached is not None:
+                forward, backward = cached
+                yield lhs, rhs, forward
+                yield rhs, lhs, backward
+                continue
+        pairs.append((lhs, rhs))
+
+    if workers > 1 and pairs:
+        pool = multiprocessing.Pool(min(workers, len(pairs)),
+                                    initializer=_init_worker,
+                                    initargs=(versions,))
+        try:
+            results = pool.imap(_compare_pair, pairs)
+            for lhs, rhs, forward, backward, stats in results:
+                instrumentation.merge(stats)
+                if (lhs, rhs) in pair_keys:
+                    build_cache.set('diff', pair_keys[(lhs, rhs)],
+                                    (forward, backward))
+                yield lhs, rhs, forward
+                yield rhs, lhs, backward
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _init_worker(versions)
+        for lhs, rhs, forward, backward, stats in map(_compare_pair, pairs):
+            instrumentation.merge(stats)
+            if (lhs, rhs) in pair_keys:
+                build_cache.set('diff', pair_keys[(lhs, rhs)],
+                                (forward, backward))
+            yield lhs, rhs, forward
+            yield rhs, lhs, backward
@@ -90,6 +90,27 @@ def convert_opcode(op, new_text_list, old_text_list):
         return [del_op, add_op]
 
 
+def get_word_opcodes(old_word_list, new_word_list):
+    """ Get the (word-based) operation codes that convert the old list of
+    words into the new. Unchanged ranges are dropped. """
+
+    seqm = difflib.SequenceMatcher(
+        lambda x: x in " \t\n",
+        old_word_list,
+        new_word_list)
+    return [op for op in seqm.get_opcodes() if op[0] != EQUAL]
+
+
+def reverse_word_opcodes(opcodes):
+    """ Word-based operation codes which convert old into new can be flipped
+    to convert new into old. This saves us re-running the diff algorithm
+    when we need both directions. """
+
+    flipped = {INSERT: DELETE, DELETE: INSERT, REPLACE: REPLACE}
+    return [(flipped[code], j1, j2, i1, i2)
+            for code, i1, i2, j1, j2 in opcodes]
+
+
 def get_opcodes(old_text, new_text):
     """ Get the operation codes that convert old_text into
     new_text. """
@@ -97,17 +118,27 @@ def get_opcodes(old_text, new_text):
     old_word_list = deconstruct_text(old_text)
     new_word_list = deconstruct_text(new_text)
 
-    seqm = difflib.SequenceMatcher(
-        lambda x: x in " \t\n",
-        old_word_list,
-        new_word_list)
-
     opcodes = [
         convert_opcode(op, new_word_list, old_word_list)
-        for op in seqm.get_opcodes() if op[0] != EQUAL]
+        for op in get_word_opcodes(old_word_list, new_word_list)]
     return opcodes
 
 
+def get_symmetric_opcodes(old_text, new_text):
+    """ Get the operation codes that convert old_text into new_text as well
+    as those which convert new_text back into old_text. """
+
+    old_word_list = deconstruct_text(old_text)
+    new_word_list = deconstruct_text(new_text)
+
+    word_opcodes = get_word_opcodes(old_word_list, new_word_list)
+    forward = [convert_opcode(op, new_word_list, old_word_list)
+               for op in word_opcodes]
+    backward = [convert_opcode(op, old_word_list, new_word_list)
+                for op in reverse_word_opcodes(word_opcodes)]
+    return forward, backward
+
+
 def node_to_dict(node):
     """ Convert a node to a dictionary representation. We skip the
     children, turning them instead into a list of labels instead. """
@@ -116,7 +147,7 @@ def node_to_dict(node):
 
     node_dict = {}
     for k, v in node.__dict__.items():
-        if k not in ('children', 'source_xml'):
+        if k not in ('children', 'source_xml') + struct.Node.HASH_FIELDS:
             node_dict[k] = v
     return node_dict
 
@@ -137,25 +168,29 @@ class Compare(object):
 
         self.changes = {}
 
-    def add_title_opcodes(self, label, opcodes):
+    def add_title_opcodes(self, label, opcodes, changes=None):
         """ If the title of a node has changed, add those operation codes. """
 
+        if changes is None:
+            changes = self.changes
         if opcodes:
-            if label in self.changes:
-                self.changes[label]["title"] = opcodes
+            if label in changes:
+                changes[label]["title"] = opcodes
             else:
-                self.changes[label] = {
+                changes[label] = {
                     "op": Compare.MODIFIED,
                     "title": opcodes}
 
-    def add_text_opcodes(self, label, opcodes):
+    def add_text_opcodes(self, label, opcodes, changes=None):
         """ If the text has changed, add those operation codes. """
 
+        if changes is None:
+            changes = self.changes
         if opcodes:
-            if label in self.changes:
-                self.changes[label]["text"] = opcodes
+            if label in changes:
+                changes[label]["text"] = opcodes
             else:
-                self.changes[label] = {"op": Compare.MODIFIED, "text": opcodes}
+                changes[label] = {"op": Compare.MODIFIED, "text": opcodes}
 
     def deleted_and_modified(self, node):
         """ This method identifies nodes that were in the old tree that were
@@ -189,9 +224,65 @@ class Compare(object):
     def compare(self):
         """ Execute the actual comparison, generating the data structure
         that represents the diff. """
-        struct.walk(self.older, self.deleted_and_modified)
+        to_visit = [self.older]
+        while to_visit:
+            node = to_visit.pop()
+            newer_node = self.newer_tree_hash.get(node.label_id())
+            # Identical subtrees cannot contain deletions or modifications
+            if (newer_node is None
+                    or newer_node.subtree_hash() != node.subtree_hash()):
+                self.deleted_and_modified(node)
+                to_visit.extend(reversed(node.children))
         self.added()
 
     def as_json(self):
         """ Write out the changes. """
         return struct.NodeEncoder().encode(self.changes)
+
+
+class SymmetricCompare(Compare):
+    """ Compare two regulation trees, simultaneously generating the changes
+    from the older to the newer tree and those from the newer to the
+    older. The latter are derived from the former rather than recomputed.
+    """
+
+    def __init__(self, older, newer):
+        super(SymmetricCompare, self).__init__(older, newer)
+        self.reverse_changes = {}
+
+    def deleted_and_modified(self, node):
+        """ Deletions in one direction are additions in the other; text and
+        title modifications are computed once, then flipped. """
+
+        older_label = node.label_id()
+
+        if older_label not in self.newer_tree_hash:
+            self.changes[older_label] = {"op": Compare.DELETED}
+            self.reverse_changes[older_label] = {
+                "op": Compare.ADDED, "node": node_to_dict(node)}
+        else:
+            newer_node = self.newer_tree_hash[older_label]
+            forward, backward = get_symmetric_opcodes(node.text,
+                                                      newer_node.text)
+            self.add_text_opcodes(older_label, forward)
+            self.add_text_opcodes(older_label, backward, self.reverse_changes)
+
+            #   Title changes are only recorded if the "older" node has a
+            #   title, so each direction checks a different node
+            if node.title or newer_node.title:
+                forward, backward = get_symmetric_opcodes(
+                    node.title or '', newer_node.title or '')
+                if node.title:
+                    self.add_title_opcodes(older_label, forward)
+                if newer_node.title:
+                    self.add_title_opcodes(older_label, backward,
+                                           self.reverse_changes)
+
+    def added(self):
+        """ Nodes added to the newer tree were deleted going the other way
+        """
+
+        super(SymmetricCompare, self).added()
+        for label in self.newer_tree_hash:
+            if label not in self.older_tree_hash:
+                self.reverse_changes[label] = {"op": Compare.DELETED}
@@ -1,14 +1,25 @@
+from multiprocessing.pool import ThreadPool
+
 import requests
 
-from regparser.notice.build import build_notice
+from regparser.notice.build import (
+    build_notice, clear_prefetched_xml, prefetch_notice_xml,
+    share_notice_xml)
 
 FR_BASE = "https://www.federalregister.gov"
 API_BASE = FR_BASE + "/api/v1/"
 
 
+#   (cfr_title, cfr_part, only_final) -> search results, fetched ahead of
+#   time; see prefetch
+_prefetched_json = {}
+
+
 def fetch_notice_json(cfr_title, cfr_part, only_final=False):
     """Search through all articles associated with this part. Right now,
     limited to 1000; could use paging to fix this in the future."""
+    if (cfr_title, cfr_part, only_final) in _prefetched_json:
+        return _prefetched_json[(cfr_title, cfr_part, only_final)]
     params = {
         "conditions[cfr][title]": cfr_title,
         "conditions[cfr][part]": cfr_part,
@@ -34,3 +45,36 @@ def fetch_notices(cfr_title, cfr_part, only_final=False):
     for result in fetch_notice_json(cfr_title, cfr_part, only_final):
         notices.extend(build_notice(cfr_title, cfr_part, result))
     return notices
+
+
+def prefetch(cfr_parts, only_final=False, workers=1):
+    """Many notices modify multiple parts. When building several parts,
+    search for each part's notices and download each distinct notice's XML
+    once, up front. Notices which modify more than one of the parts are
+    also parsed (as far as is possible without knowing the part) once. Up
+    to `workers` notices are fetched/parsed concurrently. Returns the
+    number of distinct notices"""
+    #   url -> number of parts it modifies
+    urls = {}
+    for cfr_title, cfr_part in cfr_parts:
+        results = fetch_notice_json(cfr_title, cfr_part, only_final)
+        _prefetched_json[(cfr_title, cfr_part, only_final)] = results
+        for url in set(result['full_text_xml_url'] for result in results
+                       if result.get('full_text_xml_url')):
+            urls[url] = urls.get(url, 0) + 1
+    pool = ThreadPool(max(1, workers))
+    try:
+        pool.map(prefetch_notice_xml, sorted(urls))
+        pool.map(share_notice_xml,
+                 sorted(url for url, count in urls.items() if count > 1))
+    finally:
+        pool.close()
+        pool.join()
+    return len(urls)
+
+
+def clear_prefetched():
+    """Forget everything fetched by prefetch. Called once the build which
+    needed it has finished, so later builds fetch afresh"""
+    _prefetched_json.clear()
+    clear_prefetched_xml()
@@ -5,7 +5,8 @@ from pyparsing import CaselessLiteral, FollowedBy, OneOrMore, Optional
 from pyparsing import Suppress, Word, LineEnd
 
 from regparser.grammar import atomic, tokens, unified
-from regparser.grammar.utils import Marker, WordBoundaries
+from regparser.grammar.utils import CASELESS, Marker, with_trigger
+from regparser.grammar.utils import WordBoundaries
 from regparser.tree.paragraph import p_levels
 
 
@@ -336,7 +337,7 @@ multiple_paragraphs = (
 
 
 #   grammar which captures all of these possibilities
-token_patterns = (
+token_patterns = with_trigger((
     put_active | put_passive | post_active | post_passive
     | delete_active | delete_passive | move_active | move_passive
     | designate_active | reserve_active
@@ -365,9 +366,17 @@ token_patterns = (
 
     | paragraph_context
     | and_token
-)
-
-subpart_label = (atomic.part + Suppress('-')
-                 + atomic.subpart_marker + Suppress(':')
-                 + Word(string.ascii_uppercase, max=1)
-                 + LineEnd())
+    ),
+    #   Each of the above requires at least one of these: a verb, a marker,
+    #   a dash (for appendix sections), a paragraph or "and"
+    'amdpar', u'|'.join([
+        'revis', 'correct', 'add', 'remov', 'designat', 'reserv', 'part',
+        'appendix', 'comment', 'paragraph', 'under', 'heading',
+        'introductory', u'§', 'section', 'entries', '-', r'[0-9]\s*\(',
+        'and']),
+    CASELESS)
+
+subpart_label = with_trigger(
+    atomic.part + Suppress('-') + atomic.subpart_marker + Suppress(':')
+    + Word(string.ascii_uppercase, max=1) + LineEnd(),
+    'subpart_label', 'subpart', CASELESS)
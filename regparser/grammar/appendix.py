@@ -2,6 +2,8 @@ import string
 
 from pyparsing import FollowedBy, Literal, Word
 
+from regparser.grammar.utils import with_trigger
+
 
 def parenthesize(characters, name):
     return Literal("(") + Word(characters).setResultsName(name) + Literal(")")
@@ -30,3 +32,10 @@ paren_digit = parenthesize(string.digits, "paren_digit")
 period_upper = decimalize(string.ascii_uppercase, "period_upper")
 period_lower = decimalize(string.ascii_lowercase, "period_lower")
 period_digit = decimalize(string.digits, "period_digit")
+
+
+#   Each is either parenthesized or followed by a period
+marker = with_trigger(
+    paren_upper | paren_lower | paren_digit
+    | period_upper | period_digit | period_lower,
+    'appendix_marker', r'[(.]')
@@ -4,6 +4,7 @@ import string
 from pyparsing import Optional, Suppress, Word
 
 from regparser.grammar import utils
+from regparser.grammar.utils import CASELESS, with_trigger
 
 
 class EffectiveDate:
@@ -42,10 +43,12 @@ notice_citation = (
 delayed = utils.Marker("delayed").setParseAction(lambda: Delayed())
 
 
+def month_name(m):
+    return date(2000, m, 1).strftime('%B')
+
+
 def int2Month(m):
-    month = date(2000, m, 1)
-    month = month.strftime('%B')
-    token = utils.Marker(month)
+    token = utils.Marker(month_name(m))
     return token.setParseAction(lambda: m)
 
 
@@ -60,4 +63,8 @@ date_parser = (
 ).setParseAction(lambda m: date(int(m[2]), m[0], int(m[1])))
 
 
-tokenizer = (effective_date | notice_citation | delayed | date_parser)
+tokenizer = with_trigger(
+    effective_date | notice_citation | delayed | date_parser,
+    'delays', '|'.join(['effective', 'delayed', r'[0-9]\s*FR\s*[0-9]']
+                       + map(month_name, range(2, 13))),
+    CASELESS)
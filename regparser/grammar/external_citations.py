@@ -2,10 +2,14 @@
 import string
 from pyparsing import Word, Literal
 
+from regparser.grammar.utils import with_trigger
+
 """ Contruct a grammar that parses references/citations to the United States
 Code, the Code of Federal Regulations, Public Law and Statues at Large. """
 
-uscode_exp = Word(string.digits) + "U.S.C." + Word(string.digits)
+uscode_exp = with_trigger(
+    Word(string.digits) + "U.S.C." + Word(string.digits),
+    'uscode', r'U\.S\.C\.')
 
 cfr_exp_v1 = Word(string.digits) + "CFR" + "part" + Word(string.digits)
 
@@ -22,5 +26,7 @@ public_law_exp = Literal("Public") + Literal("Law") +\
 stat_at_large_exp = Word(string.digits) +\
     Literal("Stat.") + Word(string.digits)
 
-regtext_external_citation = uscode_exp.setResultsName('USC') |\
-    cfr_exp | the_act_exp | public_law_exp | stat_at_large_exp
+regtext_external_citation = with_trigger(
+    uscode_exp.setResultsName('USC') | cfr_exp | the_act_exp
+    | public_law_exp | stat_at_large_exp,
+    'external_citations', r'U\.S\.C\.|CFR|Act|Public|Stat\.')
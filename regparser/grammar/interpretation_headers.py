@@ -1,8 +1,10 @@
+#vim: set encoding=utf-8
 import string
 
 from pyparsing import LineEnd, LineStart, SkipTo
 
 from regparser.grammar import atomic, unified
+from regparser.grammar.utils import CASELESS, with_trigger
 
 
 section = (
@@ -33,4 +35,7 @@ appendix = (
 )
 
 
-parser = LineStart() + (section | marker_par | par | appendix)
+parser = with_trigger(
+    LineStart() + (section | marker_par | par | appendix),
+    'interpretation_headers', ur'§|section|paragraph|appendix|[0-9]\s*\(',
+    CASELESS)
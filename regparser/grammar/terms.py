@@ -1,18 +1,21 @@
 #vim: set encoding=utf-8
+import re
+
 from pyparsing import (
     LineStart, Literal, OneOrMore, Optional, Regex, SkipTo, srange, Suppress,
     Word, ZeroOrMore)
 
 from regparser.grammar import atomic, unified
-from regparser.grammar.utils import DocLiteral, keep_pos, Marker
+from regparser.grammar.utils import CASELESS, DocLiteral, keep_pos, Marker
+from regparser.grammar.utils import with_trigger
 
 
-smart_quotes = (
+smart_quotes = with_trigger(
     Suppress(DocLiteral(u'“', "left-smart-quote"))
     + SkipTo(
         DocLiteral(u'”', "right-smart-quote")
-    ).setParseAction(keep_pos).setResultsName("term")
-)
+    ).setParseAction(keep_pos).setResultsName("term"),
+    'smart_quotes', u'“')
 
 e_tag = (
     Suppress(Regex(r"<E[^>]*>"))
@@ -22,20 +25,21 @@ e_tag = (
     + Suppress(Literal("</E>"))
 )
 
-xml_term_parser = (
+xml_term_parser = with_trigger(
     LineStart()
     + Suppress(unified.any_depth_p)
     + e_tag.setResultsName("head")
     + ZeroOrMore(
         (atomic.conj_phrases + e_tag).setResultsName(
             "tail", listAllMatches=True))
-    + (Marker("mean") | Marker("means"))
-)
+    + (Marker("mean") | Marker("means")),
+    'xml_term', r'<E.*mean', CASELESS | re.DOTALL)
 
-scope_term_type_parser = (
+scope_term_type_parser = with_trigger(
     Marker("purposes") + Marker("of") + Optional(Marker("this"))
     + SkipTo(",").setResultsName("scope") + Literal(",")
     + Optional(Marker("the") + Marker("term"))
     + SkipTo(Marker("means")
              | (Marker("refers") + Marker("to"))
-             ).setParseAction(keep_pos).setResultsName("term"))
+             ).setParseAction(keep_pos).setResultsName("term"),
+    'scope_term_type', 'purposes', CASELESS)
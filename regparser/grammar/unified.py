@@ -4,7 +4,7 @@ from pyparsing import Empty, FollowedBy, LineEnd, Literal, OneOrMore, Optional
 from pyparsing import Suppress, SkipTo
 
 from regparser.grammar import atomic
-from regparser.grammar.utils import keep_pos, Marker
+from regparser.grammar.utils import keep_pos, Marker, with_trigger
 
 period_section = Suppress(".") + atomic.section
 part_section = atomic.part + period_section
@@ -21,7 +21,9 @@ depth4_p = atomic.upper_p + Optional(depth5_p)
 depth3_p = atomic.roman_p + Optional(depth4_p)
 depth2_p = atomic.digit_p + Optional(depth3_p)
 depth1_p = atomic.lower_p + ~FollowedBy(atomic.upper_p) + Optional(depth2_p)
-any_depth_p = depth1_p | depth2_p | depth3_p | depth4_p | depth5_p | depth6_p
+any_depth_p = with_trigger(
+    depth1_p | depth2_p | depth3_p | depth4_p | depth5_p | depth6_p,
+    'any_depth_p', r'\(')
 
 depth3_c = atomic.upper_c + Optional(atomic.em_digit_c)
 depth2_c = atomic.roman_c + Optional(depth3_c)
@@ -1,5 +1,9 @@
+import re
+
 from pyparsing import alphanums, CaselessLiteral, getTokensEndLoc, Literal
-from pyparsing import Suppress, WordEnd, WordStart
+from pyparsing import ParseException, Suppress, WordEnd, WordStart
+
+from regparser import instrumentation
 
 
 def keep_pos(source, location, tokens):
@@ -37,3 +41,64 @@ def Marker(txt):
 
 def SuffixMarker(txt):
     return Suppress(CaselessLiteral(txt) + WordEnd(alphanums))
+
+
+def scan_positions(grammar, text, positions):
+    """Equivalent to grammar.scanString(text), but only attempting a match
+    at each of the (ascending) positions rather than at every character.
+    Results are the same provided that every match of the grammar starts
+    at one of these positions and is not empty. As with scanString, tabs
+    should have been expanded"""
+    grammar.streamline()
+    loc = 0
+    for position in positions:
+        if position < loc:  # within the previous match
+            continue
+        try:
+            #   This is what scanString calls at each location
+            end, tokens = grammar._parse(text, position, callPreParse=False)
+        except ParseException:
+            continue
+        if end > position:
+            yield tokens, position, end
+            loc = end
+
+
+#   For triggers containing caseless markers. This is a little looser than
+#   pyparsing's comparison, which is fine: a trigger needn't be exact
+CASELESS = re.IGNORECASE | re.UNICODE
+
+
+def with_trigger(grammar, name, pattern, flags=0):
+    """Declare a regular expression which is found in any text the grammar
+    can match (e.g. the words it requires). Scanning text without it would
+    be pointless, so `scan` skips that text. Returns the grammar"""
+    grammar.trigger = re.compile(pattern, flags)
+    grammar.trigger_name = name
+    return grammar
+
+
+def record_trigger(name, found):
+    """Count whether a scan went ahead (its trigger was found) or was
+    skipped"""
+    if instrumentation.enabled():
+        instrumentation.increment(
+            'grammar.scanned' if found else 'grammar.skipped', name)
+
+
+def triggered(grammar, text):
+    """Could the grammar match somewhere in this text?"""
+    trigger = getattr(grammar, 'trigger', None)
+    if trigger is None:
+        return True
+    found = bool(trigger.search(text))
+    record_trigger(grammar.trigger_name, found)
+    return found
+
+
+def scan(grammar, text):
+    """Equivalent to grammar.scanString(text), but without walking through
+    text which lacks the grammar's trigger"""
+    if triggered(grammar, text):
+        return grammar.scanString(text)
+    return iter([])
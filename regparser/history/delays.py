@@ -3,6 +3,7 @@ from itertools import dropwhile, takewhile
 
 from regparser.grammar.delays import tokenizer as delay_tokenizer
 from regparser.grammar.delays import Delayed, EffectiveDate, Notice
+from regparser.grammar.utils import scan
 
 
 def modify_effective_dates(notices):
@@ -38,7 +39,7 @@ def altered_frs(sent):
     """Tokenize the provided sentence and check if it is a format that
     indicates that some notices have changed. This format is:
     ... "effective date" ... FRNotices ... "delayed" ... (UntilDate)"""
-    tokens = [token[0] for token, _, _ in delay_tokenizer.scanString(sent)]
+    tokens = [token[0] for token, _, _ in scan(delay_tokenizer, sent)]
     tokens = list(dropwhile(lambda t: not isinstance(t, EffectiveDate),
                   tokens))
     if not tokens:
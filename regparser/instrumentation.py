@@ -0,0 +1,175 @@
+"""When a build slows down, we need to know which stage (and which layer,
+notice, etc. within that stage) is responsible. This module records wall
+time, CPU time and call counts for named stages of the build and, if
+requested, profiles each stage with cProfile. Recording is off unless
+enabled, in which case the results can be written as a JSON report.
+
+Stages which run in other processes (e.g. layers built in a process pool)
+`collect` their results, send them back with the rest of their work, and
+the parent process `merge`s them."""
+from contextlib import contextmanager
+import cProfile
+import json
+import os
+import pstats
+import time
+
+
+_settings = {'enabled': False, 'profile': False}
+#   stage -> {'count', 'wall', 'cpu', 'items': {item -> {'count', ...}}}
+_stats = {}
+#   stage -> [raw cProfile stats]
+_profiles = {}
+#   Profilers of the stages currently running, innermost last
+_active = []
+#   Results belong to the process which recorded them; a forked child
+#   starts afresh
+_owner = [os.getpid()]
+
+
+def enable(profile=False):
+    _settings['enabled'] = True
+    _settings['profile'] = profile
+
+
+def disable():
+    _settings['enabled'] = False
+    _settings['profile'] = False
+
+
+def enabled():
+    return _settings['enabled']
+
+
+def reset():
+    _stats.clear()
+    _profiles.clear()
+    _owner[0] = os.getpid()
+
+
+def _check_owner():
+    if _owner[0] != os.getpid():
+        reset()
+        del _active[:]
+
+
+def _add(totals, count, wall, cpu):
+    totals['count'] = totals.get('count', 0) + count
+    totals['wall'] = totals.get('wall', 0.0) + wall
+    totals['cpu'] = totals.get('cpu', 0.0) + cpu
+
+
+def record(stage, wall, cpu, item=None, count=1):
+    """Add a measurement of a stage (and optionally, an item within that
+    stage, such as a particular layer or notice)"""
+    _check_owner()
+    totals = _stats.setdefault(stage, {'items': {}})
+    _add(totals, count, wall, cpu)
+    if item is not None:
+        _add(totals['items'].setdefault(item, {}), count, wall, cpu)
+
+
+def increment(counter, item=None, amount=1):
+    """Add to a counter (e.g. of cache hits), which is reported like any
+    other stage, albeit without any time"""
+    record(counter, 0.0, 0.0, item, amount)
+
+
+@contextmanager
+def timed(stage, item=None):
+    """Time (and possibly profile) the enclosed block. Profiles exclude
+    nested stages, which are profiled separately"""
+    if not _settings['enabled']:
+        yield
+        return
+
+    _check_owner()
+    profiler = None
+    if _settings['profile']:
+        if _active:
+            _active[-1].disable()
+        profiler = cProfile.Profile()
+        _active.append(profiler)
+        profiler.enable()
+    start_wall, start_cpu = time.time(), time.clock()
+    try:
+        yield
+    finally:
+        record(stage, time.time() - start_wall, time.clock() - start_cpu,
+               item)
+        if profiler:
+            profiler.disable()
+            _active.pop()
+            profiler.create_stats()
+            _profiles.setdefault(stage, []).append(profiler.stats)
+            if _active:
+                _active[-1].enable()
+
+
+def collect():
+    """Remove and return everything recorded so far (by this process), so
+    that it can be sent to the parent process"""
+    _check_owner()
+    if not _stats and not _profiles:
+        return None
+    results = (dict(_stats), dict(_profiles))
+    _stats.clear()
+    _profiles.clear()
+    return results
+
+
+def merge(results):
+    """Combine results collected in another process with our own"""
+    if not results:
+        return
+    stats, profiles = results
+    for stage, totals in stats.iteritems():
+        record(stage, totals['wall'], totals['cpu'], count=totals['count'])
+        for item, item_totals in totals['items'].iteritems():
+            _add(_stats[stage]['items'].setdefault(item, {}),
+                 item_totals['count'], item_totals['wall'],
+                 item_totals['cpu'])
+    for stage, stage_profiles in profiles.iteritems():
+        _profiles.setdefault(stage, []).extend(stage_profiles)
+
+
+class _RawStats(object):
+    """Adapts raw cProfile stats for consumption by pstats"""
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def report():
+    """A summary of all recorded stages, suitable for serializing"""
+    _check_owner()
+    stages = {}
+    for stage, totals in _stats.iteritems():
+        stages[stage] = dict(totals)
+        stages[stage]['items'] = dict(totals['items'])
+    return {'stages': stages}
+
+
+def write_report(path, profile_dir=None):
+    """Write the report as JSON. If profiles were recorded and a directory
+    is provided, each stage's profile is also written there, both in
+    pstats' binary format and as text"""
+    results = report()
+    if profile_dir:
+        if not os.path.exists(profile_dir):
+            os.makedirs(profile_dir)
+        for stage, stage_profiles in _profiles.iteritems():
+            stats = pstats.Stats(_RawStats(stage_profiles[0]))
+            for raw in stage_profiles[1:]:
+                stats.add(_RawStats(raw))
+            prof_path = os.path.join(profile_dir, stage + '.prof')
+            stats.dump_stats(prof_path)
+            with open(os.path.join(profile_dir, stage + '.txt'), 'w') as f:
+                stats.stream = f
+                stats.sort_stats('cumulative').print_stats(50)
+            results['stages'][stage]['profile'] = prof_path
+    with open(path, 'w') as f:
+        json.dump(results, f, sort_keys=True, indent=4,
+                  separators=(', ', ': '))
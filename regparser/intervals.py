@@ -0,0 +1,64 @@
+"""Much of the parsing filters matches (of terms, citations, paragraph
+markers) by whether they overlap some other set of matches. Testing each
+match against every excluded (start, end) pair is quadratic; long
+appendices and definition sections have hundreds of each. An IntervalSet
+answers the same questions with a binary search.
+
+All intervals are closed: (3, 5) includes both 3 and 5, so it overlaps
+(5, 7)."""
+from bisect import bisect_left, bisect_right
+
+
+class IntervalSet(object):
+    """A set of closed intervals, stored as their union: sorted, disjoint
+    intervals. That's sufficient to answer whether a point or interval
+    touches any of them"""
+    def __init__(self, intervals=()):
+        self._starts, self._ends = [], []
+        for start, end in sorted(intervals):
+            if self._ends and start <= self._ends[-1]:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    def __len__(self):
+        """Number of disjoint intervals"""
+        return len(self._starts)
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends))
+
+    def add(self, start, end):
+        #   Merge with any intervals this touches
+        lo = bisect_left(self._ends, start)
+        hi = bisect_right(self._starts, end)
+        if lo < hi:
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+
+    def covers(self, point):
+        """Is the point within any of the intervals?"""
+        idx = bisect_right(self._starts, point) - 1
+        return idx >= 0 and self._ends[idx] >= point
+
+    def overlaps(self, start, end):
+        """Does the interval share any point with any of the intervals?"""
+        idx = bisect_right(self._starts, end) - 1
+        return idx >= 0 and self._ends[idx] >= start
+
+
+def properly_contained(intervals):
+    """The (distinct) intervals which fall within some other, larger
+    interval of those provided"""
+    contained = set()
+    furthest = None
+    #   Sorted so that any interval which might contain another precedes it
+    for start, end in sorted(set(intervals), key=lambda i: (i[0], -i[1])):
+        if furthest is not None and furthest >= end:
+            contained.add((start, end))
+        else:
+            furthest = end
+    return contained
@@ -1,6 +1,7 @@
 #vim: set encoding=utf-8
 from collections import defaultdict
 from regparser.grammar import external_citations as grammar
+from regparser.grammar.utils import scan
 import string
 import urllib
 
@@ -39,7 +40,7 @@ class ExternalCitationParser(Layer):
 
         cm = defaultdict(list)
         citation_strings = {}
-        for citation, start, end in parser.scanString(text):
+        for citation, start, end in scan(parser, text):
             index = "-".join(citation)
             cm[index].append([start, end])
             citation_strings[index] = citation.asList()
@@ -54,6 +55,11 @@ class ExternalCitationParser(Layer):
 
         return [build_layer_element(k, offsets) for k, offsets in cm.items()]
 
+    def cache_context(self, node):
+        """Citations don't depend on the label, though references to "the
+        Act" are replaced with the Act's citation"""
+        return self.act_citation
+
     def process(self, node):
         citations_list = self.parse(node.text, parts=node.label)
         if citations_list:
@@ -1,5 +1,7 @@
 import re
 
+from lxml import etree
+
 from regparser.layer.layer import Layer
 from regparser.tree import struct
 from regparser.tree.priority_stack import PriorityStack
@@ -104,18 +106,30 @@ class Formatting(Layer):
                            + r"```")
     subscript_re = re.compile(r"([a-zA-Z0-9]+)_\{(\w+)\}")
 
+    @staticmethod
+    def tables(node):
+        """The GPOTABLEs within the node's source XML, if any"""
+        if node.source_xml is None:
+            return []
+        if node.source_xml.tag == 'GPOTABLE':
+            tables = [node.source_xml]
+        else:
+            tables = []
+        tables.extend(node.source_xml.iterdescendants('GPOTABLE'))
+        return tables
+
+    def cache_context(self, node):
+        """Tables are derived from the source XML rather than the label.
+        Only nodes with tables need their XML serialized"""
+        return [etree.tostring(table, with_tail=False)
+                for table in Formatting.tables(node)]
+
     def process(self, node):
         layer_el = []
-        if node.source_xml is not None:
-            if node.source_xml.tag == 'GPOTABLE':
-                tables = [node.source_xml]
-            else:
-                tables = []
-            tables.extend(node.source_xml.xpath('.//GPOTABLE'))
-            for table in tables:
-                layer_el.append({'text': table_xml_to_plaintext(table),
-                                 'locations': [0],
-                                 'table_data': table_xml_to_data(table)})
+        for table in Formatting.tables(node):
+            layer_el.append({'text': table_xml_to_plaintext(table),
+                             'locations': [0],
+                             'table_data': table_xml_to_data(table)})
         for match in Formatting.fenced_re.finditer(node.text):
             layer_el.append({
                 'text': node.text[match.start():match.end()],
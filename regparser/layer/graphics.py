@@ -21,6 +21,10 @@ class Graphics(Layer):
         if response.status_code == requests.codes.ok:
             return thumb_url
 
+    def cache_context(self, node):
+        """Only the text matters"""
+        return None
+
     def process(self, node):
         """If this node has a marker for an image in it, note where to get
         that image."""
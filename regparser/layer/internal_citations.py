@@ -6,7 +6,7 @@ import string
 
 from regparser.citations import internal_citations, Label
 from regparser.layer.layer import Layer
-from regparser.tree.struct import Node, walk
+from regparser.tree.struct import Node
 
 
 class InternalCitationParser(Layer):
@@ -15,15 +15,23 @@ class InternalCitationParser(Layer):
         self.known_citations = set()
         self.verify_citations = True
 
-    def pre_process(self):
+    def pre_process_node(self, node):
         """As a preprocessing step, run through the entire tree, collecting
         all labels."""
-        def per_node(node):
-            self.known_citations.add(tuple(node.label))
-        walk(self.tree, per_node)
+        self.known_citations.add(tuple(node.label))
 
     def process(self, node):
-        citations_list = self.parse(node.text, label=Label.from_node(node))
+        return self.complete(node, self.process_cacheable(node))
+
+    def process_cacheable(self, node):
+        """Every citation in the text, whether or not the cited paragraph
+        exists. Whether it does depends on the rest of the tree, so that's
+        checked in `complete`"""
+        return internal_citations(node.text, Label.from_node(node),
+                                  require_marker=True)
+
+    def complete(self, node, citations):
+        citations_list = self.to_layer(node.text, citations)
         if citations_list:
             return citations_list
 
@@ -43,9 +51,14 @@ class InternalCitationParser(Layer):
         """ Parse the provided text, pulling out all the internal
         (self-referential) citations. """
 
+        citations = internal_citations(text, label, require_marker=True)
+        return self.to_layer(text, citations)
+
+    def to_layer(self, text, citations):
+        """Convert citations into layer elements, verifying them first (if
+        requested)"""
         to_layer = lambda pc: {'offsets': [(pc.start, pc.end)],
                                'citation': pc.label.to_list()}
-        citations = internal_citations(text, label, require_marker=True)
         if self.verify_citations:
             citations = self.remove_missing_citations(citations, text)
         all_citations = list(map(to_layer, citations))
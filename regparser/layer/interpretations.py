@@ -14,24 +14,29 @@ class Interpretations(Layer):
         Layer.__init__(self, *args, **kwargs)
         self.lookup_table = defaultdict(list)
 
-    def pre_process(self):
+    def pre_process_node(self, node):
         """Create a lookup table for each interpretation"""
-        def per_node(node):
-            if (node.node_type != struct.Node.INTERP
-                    or node.label[-1] != struct.Node.INTERP_MARK):
-                return
-
-            #   Always add a connection based on the interp's label
-            self.lookup_table[tuple(node.label[:-1])].append(node)
-
-            #   Also add connections based on the title
-            for label in text_to_labels(node.title or '',
-                                        Label.from_node(node),
-                                        warn=False):
-                label = tuple(label[:-1])   # Remove Interp marker
-                if node not in self.lookup_table[label]:
-                    self.lookup_table[label].append(node)
-        struct.walk(self.tree, per_node)
+        if (node.node_type != struct.Node.INTERP
+                or node.label[-1] != struct.Node.INTERP_MARK):
+            return
+
+        #   Always add a connection based on the interp's label
+        self.lookup_table[tuple(node.label[:-1])].append(node)
+
+        #   Also add connections based on the title
+        for label in text_to_labels(node.title or '',
+                                    Label.from_node(node),
+                                    warn=False):
+            label = tuple(label[:-1])   # Remove Interp marker
+            if node not in self.lookup_table[label]:
+                self.lookup_table[label].append(node)
+
+    def cache_context(self, node):
+        """Which interpretations are associated with this label (and
+        whether they are empty) is determined during pre_process"""
+        return [node.label] + [
+            (n.label_id(), self.empty_interpretation(n))
+            for n in self.lookup_table.get(tuple(node.label), [])]
 
     def process(self, node):
         """Is there an interpretation associated with this node? If yes,
@@ -1,3 +1,11 @@
+import hashlib
+import json
+import time
+
+from regparser import instrumentation
+from regparser.tree import struct
+
+
 class Layer():
     def __init__(self, tree, cfr_title=None, version=None, notices=None,
                  act_citation=None):
@@ -10,10 +18,31 @@ class Layer():
         self.cfr_title = cfr_title
         self.version = version
         self.layer = {}
+        #   The layer's LayerCache (if any), set while the layer is built
+        self.cache = None
 
     """ An interface definition for a layer. """
     def pre_process(self):
-        """ Take the whole tree and do any pre-processing """
+        """ Take the whole tree and do any pre-processing. Layers implement
+        this via start_pre_process, pre_process_node and finish_pre_process
+        so that build_layers can pre-process several layers in a single
+        traversal of the tree """
+        self.start_pre_process()
+        if _overrides(self, 'pre_process_node'):
+            for node in struct.pre_order(self.tree):
+                self.pre_process_node(node)
+        self.finish_pre_process()
+
+    def start_pre_process(self):
+        """ Called before any node is pre-processed """
+        pass
+
+    def pre_process_node(self, node):
+        """ Pre-process a single node. Nodes are visited in pre-order """
+        pass
+
+    def finish_pre_process(self):
+        """ Called after every node has been pre-processed """
         pass
 
     def process(self, node):
@@ -23,18 +52,194 @@ class Layer():
 
         return NotImplemented
 
+    def cache_context(self, node):
+        """Anything process() reads beyond the node's text, tagged_text and
+        node_type. By default, that's the node's label; layers which don't
+        depend on the label (or depend on only part of it) override this so
+        that their results can be reused for paragraphs which have been
+        moved or renumbered"""
+        return node.label
+
+    def cache_key(self, node):
+        """A digest of everything process() reads. Nodes with the same key,
+        in any version of any regulation, have the same layer content"""
+        return hashlib.sha1(json.dumps(
+            [node.text, getattr(node, 'tagged_text', None), node.node_type,
+             self.cache_context(node)])).hexdigest()
+
+    def process_cacheable(self, node):
+        """The part of process() which depends only on what's included in
+        the cache_key; by default, all of it"""
+        return self.process(node)
+
+    def complete(self, node, cacheable):
+        """Finish processing a node, given the (possibly cached) result of
+        process_cacheable. Layers which depend on something that can't be
+        cheaply included in the cache_key (e.g. every label in the tree)
+        account for it here"""
+        return cacheable
+
     def builder(self, node, cache=None):
-        if cache:
-            layer_element = cache.fetch_or_process(self, node)
+        """Process this node and everything beneath it, adding the results
+        to the layer. build_layers processes every layer in one shared
+        traversal instead; layers which override this method have it
+        called (on the whole tree) in place of that traversal"""
+        for descendant in struct.pre_order(node):
+            layer_element = _process(None, None, self, cache, descendant)
+            if layer_element:
+                self.layer[descendant.label_id()] = layer_element
+
+    def build(self, cache=None):
+        return build_layers(self.tree, [self], [cache])[0]
+
+
+def _overrides(layer, method_name):
+    """Does this layer implement its own version of the method?"""
+    return (getattr(layer.__class__, method_name).im_func
+            is not getattr(Layer, method_name).im_func)
+
+
+def build_layers(tree, layers, caches=None, streams=None):
+    """Build several layers of the same tree. Rather than each layer
+    walking the tree (once to pre-process it, again to process it), all of
+    the layers' pre-processing shares one traversal, as does all of their
+    processing. Returns each layer's content.
+
+    Alternatively, if a stream (see api_writer.ObjectStream) is provided for
+    each layer, nodes are processed in label order and each layer's
+    entries are added to its stream as they're produced; the layers'
+    content is never collected in memory and nothing is returned"""
+    if caches is None:
+        caches = [None] * len(layers)
+    for layer, cache in zip(layers, caches):
+        layer.cache = cache
+    timer = _LayerTimer(layers) if instrumentation.enabled() else None
+
+    with instrumentation.timed('layers'):
+        #   Layers which override pre_process itself (rather than its
+        #   steps) must walk the tree on their own
+        shared = []
+        for idx, layer in enumerate(layers):
+            if timer:
+                timer.start()
+            if _overrides(layer, 'pre_process'):
+                layer.pre_process()
+            else:
+                layer.start_pre_process()
+                shared.append((idx, layer))
+            if timer:
+                timer.stop(idx, 'pre_process')
+
+        pre_processing = [(idx, layer) for idx, layer in shared
+                          if _overrides(layer, 'pre_process_node')]
+        if pre_processing:
+            for node in struct.pre_order(tree):
+                for idx, layer in pre_processing:
+                    if timer:
+                        timer.start()
+                    layer.pre_process_node(node)
+                    if timer:
+                        timer.stop(idx, 'pre_process')
+
+        for idx, layer in shared:
+            if timer:
+                timer.start()
+            layer.finish_pre_process()
+            if timer:
+                timer.stop(idx, 'pre_process')
+
+        #   Layers which override builder walk the tree on their own
+        processing = []
+        for idx, (layer, cache) in enumerate(zip(layers, caches)):
+            if _overrides(layer, 'builder'):
+                if timer:
+                    timer.start()
+                layer.builder(tree, cache)
+                if timer:
+                    timer.stop(idx, 'build')
+            else:
+                processing.append((idx, (layer, cache)))
+
+        if streams is None:
+            for node in struct.pre_order(tree):
+                label_id = node.label_id()
+                for idx, (layer, cache) in processing:
+                    layer_element = _process(timer, idx, layer, cache, node)
+                    if layer_element:
+                        layer.layer[label_id] = layer_element
         else:
-            layer_element = self.process(node)
-        if layer_element:
-            self.layer[node.label_id()] = layer_element
+            #   Entries added during pre-processing (e.g. the terms layer's
+            #   "referenced") or by a layer's own builder are merged in; last
+            #   first, for popping
+            pending = [sorted(layer.layer.items(), reverse=True)
+                       for layer in layers]
+            for label_id, nodes in _in_label_order(tree):
+                for idx, (layer, cache) in processing:
+                    #   As when collecting, the last non-empty entry wins
+                    layer_element = None
+                    for node in nodes:
+                        layer_element = (_process(timer, idx, layer, cache,
+                                                  node)
+                                         or layer_element)
+                    while pending[idx] and pending[idx][-1][0] < label_id:
+                        streams[idx].add(*pending[idx].pop())
+                    if pending[idx] and pending[idx][-1][0] == label_id:
+                        #   Always consumed, so that it's never written
+                        #   twice; as when collecting, processing wins
+                        pending_element = pending[idx].pop()[1]
+                        layer_element = layer_element or pending_element
+                    if layer_element:
+                        streams[idx].add(label_id, layer_element)
+            for stream, remaining in zip(streams, pending):
+                while remaining:
+                    stream.add(*remaining.pop())
 
-        for c in node.children:
-            self.builder(c, cache)
+    if timer:
+        timer.record()
+    if streams is None:
+        return [layer.layer for layer in layers]
 
-    def build(self, cache=None):
-        self.pre_process()
-        self.builder(self.tree, cache)
-        return self.layer
+
+def _process(timer, idx, layer, cache, node):
+    if timer:
+        timer.start()
+    if cache:
+        layer_element = cache.fetch_or_process(layer, node)
+    else:
+        layer_element = layer.process(node)
+    if timer:
+        timer.stop(idx, 'build')
+    return layer_element
+
+
+def _in_label_order(tree):
+    """Pairs of label id and the node(s) with that label (in pre-order),
+    sorted by label id"""
+    by_label = {}
+    for node in struct.pre_order(tree):
+        by_label.setdefault(node.label_id(), []).append(node)
+    return sorted(by_label.iteritems())
+
+
+class _LayerTimer(object):
+    """As layers share traversals, each call into a layer is timed
+    separately and the totals recorded per layer"""
+    def __init__(self, layers):
+        self.names = [layer.__class__.__name__ for layer in layers]
+        self.totals = [{'pre_process': [0.0, 0.0], 'build': [0.0, 0.0]}
+                       for _ in layers]
+        self.started = None
+
+    def start(self):
+        self.started = time.time(), time.clock()
+
+    def stop(self, idx, stage):
+        totals = self.totals[idx][stage]
+        totals[0] += time.time() - self.started[0]
+        totals[1] += time.clock() - self.started[1]
+
+    def record(self):
+        for name, totals in zip(self.names, self.totals):
+            for stage in ('pre_process', 'build'):
+                wall, cpu = totals[stage]
+                instrumentation.record('layer.' + stage, wall, cpu, name)
@@ -5,6 +5,19 @@ import settings
 
 
 class Meta(Layer):
+    def effective_date(self):
+        """The effective date of this version, if known"""
+        last_notice = filter(lambda n: n['document_number'] == self.version,
+                             self.notices)
+        if last_notice and 'effective_on' in last_notice[0]:
+            return last_notice[0]['effective_on']
+
+    def cache_context(self, node):
+        """Only the root has meta information; beyond its title, that
+        depends on the CFR title and the effective date"""
+        if len(node.label) == 1:
+            return [self.cfr_title, node.title, self.effective_date()]
+
     def process(self, node):
         """If this is the root element, add some 'meta' information about
         this regulation, including its cfr title, effective date, and any
@@ -26,8 +39,7 @@ class Meta(Layer):
             if match:
                 layer['reg_letter'] = match.group(1)
 
-        last_notice = filter(lambda n: n['document_number'] == self.version,
-                             self.notices)
-        if last_notice and 'effective_on' in last_notice[0]:
-            layer['effective_date'] = last_notice[0]['effective_on']
+        effective_date = self.effective_date()
+        if effective_date:
+            layer['effective_date'] = effective_date
         return [dict(layer.items() + settings.META.items())]
@@ -2,7 +2,7 @@ import string
 
 from regparser.layer.key_terms import KeyTerms
 from regparser.layer.layer import Layer
-from regparser.tree.struct import Node
+from regparser.layer.paragraph_markers import marker_of
 
 
 class ModelFormText(Layer):
@@ -32,18 +32,21 @@ class ModelFormText(Layer):
                 return True
         return False
 
-    def pre_process(self):
-        #mark the nodes that are part of a model forms section
-
-        def per_node(node):
-            if self.is_appendix(node):
-                if self.is_model_form(node):
-                    self.model_forms_sections.append(node.label_id())
-                    self.model_forms_nodes[node.label_id()] = True
-                elif self.is_model_form_child(node):
-                    self.model_forms_nodes[node.label_id()] = True
-
-        struct.walk(self.tree, per_node)
+    def pre_process_node(self, node):
+        """Mark the nodes that are part of a model forms section. Parents
+        are visited before their children"""
+        if self.is_appendix(node):
+            if self.is_model_form(node):
+                self.model_forms_sections.append(node.label_id())
+                self.model_forms_nodes[node.label_id()] = True
+            elif self.is_model_form_child(node):
+                self.model_forms_nodes[node.label_id()] = True
+
+    def cache_context(self, node):
+        """Whether the node is part of a model forms section is determined
+        during pre_process. Of the label, only the marker (which is removed
+        from the text) matters"""
+        return [node.label_id() in self.model_forms_nodes, marker_of(node)]
 
     def process(self, node):
         label = node.label_id()
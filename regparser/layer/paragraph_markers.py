@@ -17,6 +17,10 @@ def marker_of(node):
 
 
 class ParagraphMarkers(Layer):
+    def cache_context(self, node):
+        """Of the label, only the marker matters"""
+        return marker_of(node)
+
     def process(self, node):
         """Look for any leading paragraph markers."""
         marker = marker_of(node)
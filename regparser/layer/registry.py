@@ -0,0 +1,98 @@
+"""Every layer we know how to build, in the order they are written. Each
+layer declares what it needs, so that a build can include only the layers
+requested (plus whatever they depend on) without importing the rest."""
+
+#   Cost classes, used to schedule the slowest layers first
+CHEAP, MODERATE, EXPENSIVE = 0, 1, 2
+
+
+class LayerSpec(object):
+    """Describes a single layer:
+    * ident: its name in the API (e.g. "terms")
+    * path: the dotted path of its class, imported when first needed
+    * cacheable: whether its results can be stored in a LayerCache
+    * depends_on: the idents of other layers which must be built with it
+    * notices: whether its content depends on the notices
+    * cost: one of CHEAP, MODERATE or EXPENSIVE
+    * persistent: whether its content can be kept in the build cache
+      between runs; not so for layers which depend on something other than
+      their inputs (e.g. a remote server) that may change"""
+    def __init__(self, ident, path, cacheable=True, depends_on=(),
+                 notices=False, cost=CHEAP, persistent=True):
+        self.ident = ident
+        self.path = path
+        self.cacheable = cacheable
+        self.depends_on = tuple(depends_on)
+        self.notices = notices
+        self.cost = cost
+        self.persistent = persistent
+        self._layer_class = None
+
+    def load(self):
+        """The layer's class, importing its module if need be"""
+        if self._layer_class is None:
+            module, name = self.path.rsplit('.', 1)
+            #   Note: we would use importlib, but it's not available to 2.6
+            module = __import__(module, fromlist=[name])
+            self._layer_class = getattr(module, name)
+        return self._layer_class
+
+    def __repr__(self):
+        return 'LayerSpec(%r)' % self.ident
+
+
+LAYERS = (
+    LayerSpec('external-citations',
+              'regparser.layer.external_citations.ExternalCitationParser',
+              cost=MODERATE),
+    LayerSpec('meta', 'regparser.layer.meta.Meta', notices=True),
+    LayerSpec('analyses',
+              'regparser.layer.section_by_section.SectionBySection',
+              notices=True),
+    LayerSpec('internal-citations',
+              'regparser.layer.internal_citations.InternalCitationParser',
+              cost=EXPENSIVE),
+    LayerSpec('toc',
+              'regparser.layer.table_of_contents.TableOfContentsLayer'),
+    LayerSpec('interpretations',
+              'regparser.layer.interpretations.Interpretations',
+              cost=MODERATE),
+    LayerSpec('terms', 'regparser.layer.terms.Terms', cost=EXPENSIVE),
+    LayerSpec('paragraph-markers',
+              'regparser.layer.paragraph_markers.ParagraphMarkers'),
+    LayerSpec('keyterms', 'regparser.layer.key_terms.KeyTerms'),
+    LayerSpec('formatting', 'regparser.layer.formatting.Formatting',
+              cost=MODERATE),
+    #   Checks each image's thumbnail over HTTP; thumbnails may be added
+    #   later, so results aren't kept between runs
+    LayerSpec('graphics', 'regparser.layer.graphics.Graphics',
+              cost=EXPENSIVE, persistent=False))
+
+
+def select(include=None, exclude=None, layers=LAYERS):
+    """The layers to build, in registry order: those included (all, if
+    None), less those excluded, plus anything the remainder depends on.
+    Unknown idents raise a ValueError"""
+    by_ident = dict((spec.ident, spec) for spec in layers)
+    for ident in list(include or []) + list(exclude or []):
+        if ident not in by_ident:
+            raise ValueError("Unknown layer: %s. Expected one of: %s"
+                             % (ident, ', '.join(sorted(by_ident))))
+
+    if include is None:
+        include = by_ident.keys()
+    selected = set(include) - set(exclude or [])
+    to_visit = list(selected)
+    while to_visit:
+        for ident in by_ident[to_visit.pop()].depends_on:
+            if ident not in selected:
+                selected.add(ident)
+                to_visit.append(ident)
+    return [spec for spec in layers if spec.ident in selected]
+
+
+def parse_idents(text):
+    """Layer idents from a comma-separated command line argument"""
+    if text is None:
+        return None
+    return [ident.strip() for ident in text.split(',') if ident.strip()]
@@ -1,7 +1,22 @@
+import hashlib
+import json
+
 from layer import Layer
 
 
 class SectionBySection(Layer):
+    def start_pre_process(self):
+        """Fingerprint the notices, as each node's analyses depend on all
+        of them"""
+        self.notices_key = hashlib.sha1(json.dumps(
+            [(n.get('document_number'), n.get('publication_date'),
+              n.get('fr_volume'), n.get('section_by_section'))
+             for n in self.notices],
+            sort_keys=True)).hexdigest()
+
+    def cache_context(self, node):
+        return [node.label, self.notices_key]
+
     def process(self, node):
         """Determine which (if any) section-by-section analyses would apply
         to this node."""
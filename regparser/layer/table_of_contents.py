@@ -18,6 +18,16 @@ class TableOfContentsLayer(Layer):
                 return False
         return True
 
+    def cache_context(self, node):
+        """The table of contents is built from the labels and titles of the
+        node's children (or, for empty parts, grandchildren)"""
+        context = []
+        for c in node.children:
+            context.append([c.label, c.title, c.node_type])
+            if c.node_type == Node.EMPTYPART:
+                context.extend([s.label, s.title] for s in c.children)
+        return context
+
     def process(self, node):
         """ Create a table of contents for this node, if it's eligible. We
         ignore subparts. """
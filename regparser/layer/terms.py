@@ -1,6 +1,9 @@
 # vim: set fileencoding=utf-8
 from collections import defaultdict
+import hashlib
 from itertools import chain
+import json
+import logging
 import re
 
 from inflection import pluralize
@@ -9,7 +12,10 @@ from regparser import utils
 from regparser.citations import internal_citations, Label
 from regparser.grammar import terms as grammar
 from regparser.grammar.external_citations import uscode_exp as uscode
+from regparser.grammar.utils import scan
+from regparser.intervals import IntervalSet
 from regparser.layer.layer import Layer
+from regparser.term_matcher import TermMatcher
 from regparser.tree import struct
 from regparser.tree.priority_stack import PriorityStack
 import settings
@@ -33,14 +39,54 @@ class Ref(object):
             repr(self.term), repr(self.label), repr(self.position))
 
 
+#   tuple(phrases) -> TermMatcher, for IGNORE_DEFINITIONS_IN
+_ignore_matchers = {}
+
+
+def ignored_offsets(phrases, text):
+    """Where each of these phrases (which should be ignored) appears in the
+    text, phrase by phrase"""
+    phrases = tuple(phrases)
+    if not phrases:
+        return []
+    if phrases not in _ignore_matchers:
+        _ignore_matchers[phrases] = TermMatcher(phrases)
+    found = _ignore_matchers[phrases].find(text)
+    return [offsets for phrase in phrases
+            for offsets in found.get(phrase, [])]
+
+
 class ParentStack(PriorityStack):
     """Used to keep track of the parents while processing nodes to find
     terms. This is needed as the definition may need to find its scope in
-    parents."""
+    parents. As each parent is consulted for every one of its descendants,
+    what's computed from it is stored alongside it in the stack"""
+    def __init__(self):
+        PriorityStack.__init__(self)
+        #   id(node) -> (node, {name -> value}). Holding the node ensures
+        #   its id isn't reused while it's here
+        self._computed = {}
+
+    def pop(self):
+        level = PriorityStack.pop(self)
+        for _, node in level:
+            self._computed.pop(id(node), None)
+        return level
+
     def unwind(self):
         """No collapsing needs to happen."""
         self.pop()
 
+    def memoized(self, node, name, compute):
+        """compute(node), computed only once while the node's in the
+        stack"""
+        if id(node) not in self._computed:
+            self._computed[id(node)] = (node, {})
+        values = self._computed[id(node)][1]
+        if name not in values:
+            values[name] = compute(node)
+        return values[name]
+
 
 class Terms(Layer):
     #   Regexes used in determining scope
@@ -48,6 +94,11 @@ class Terms(Layer):
     sect_re, par_re = re.compile(r"\bsection\b"), re.compile(r"\bparagraph\b")
     #   Regex to confirm scope indicator
     scope_re = re.compile(r".*purposes of( this)?\s*$", re.DOTALL)
+    #   Regexes indicating that a node (or its children) define terms
+    the_term_re = re.compile('the term .* (means|refers to)')
+    quoted_term_re = re.compile(u'“[^”]+” (means|refers to)')
+    #   Terms found via scope_term_type_parser must look like this
+    plain_term_re = re.compile("^[a-z ]+$")
 
     def __init__(self, *args, **kwargs):
         Layer.__init__(self, *args, **kwargs)
@@ -56,24 +107,35 @@ class Terms(Layer):
         self.scoped_terms = defaultdict(list)
         #   subpart -> list[section]
         self.subpart_map = defaultdict(list)
+        #   term -> its plural
+        self.plurals = {}
+        #   frozenset(terms) -> TermMatcher
+        self.matchers = {}
+        #   label_id -> positions of the definitions within that node. Built
+        #   from scoped_terms once pre-processing is complete; until then,
+        #   scoped_terms may still change, so is searched directly
+        self.definition_positions = None
 
     def add_subparts(self):
-        """Document the relationship between sections and subparts"""
-
-        current_subpart = [None]    # Need a reference for the closure
-
-        def per_node(node):
+        """Document the relationship between sections and subparts.
+        There's no need to look within sections or interpretations, which
+        won't contain other sections"""
+
+        current_subpart = None
+        to_visit = [self.tree]
+        while to_visit:
+            node = to_visit.pop()
             if node.node_type == struct.Node.SUBPART:
-                current_subpart[0] = node.label[2]
+                current_subpart = node.label[2]
             elif node.node_type == struct.Node.EMPTYPART:
-                current_subpart[0] = None
+                current_subpart = None
             if (node.node_type in (struct.Node.REGTEXT, struct.Node.APPENDIX)
                     and len(node.label) == 2):
                 #Subparts
                 section = node.label[-1]
-                self.subpart_map[current_subpart[0]].append(section)
-
-        struct.walk(self.tree, per_node)
+                self.subpart_map[current_subpart].append(section)
+            elif node.node_type != struct.Node.INTERP:
+                to_visit.extend(reversed(node.children))
 
     def scope_of_text(self, text, label_struct, verify_prefix=True):
         """Given specific text, try to determine the definition scope it
@@ -110,41 +172,96 @@ class Terms(Layer):
 
     def determine_scope(self, stack):
         for node in stack.lineage():
-            scopes = self.scope_of_text(node.text, Label.from_node(node))
+            scopes = stack.memoized(
+                node, 'scope',
+                lambda n: self.scope_of_text(n.text, Label.from_node(n)))
             if scopes:
                 return [tuple(s) for s in scopes]
 
         #   Couldn't determine scope; default to the entire reg
         return [tuple(node.label[:1])]
 
-    def pre_process(self):
+    def start_pre_process(self):
         """Step through every node in the tree, finding definitions. Add
         these definition to self.scoped_terms. Also keep track of which
         subpart we are in. Finally, document all defined terms. """
         self.add_subparts()
-        stack = ParentStack()
-
-        def per_node(node):
-            if len(node.label) > 1 and node.node_type == struct.Node.REGTEXT:
-                #   Add one for the subpart level
-                stack.add(len(node.label) + 1, node)
-            elif node.node_type in (struct.Node.SUBPART,
-                                    struct.Node.EMPTYPART):
-                #   Subparts all on the same level
-                stack.add(2, node)
-            else:
-                stack.add(len(node.label), node)
-
-            if node.node_type in (struct.Node.REGTEXT, struct.Node.SUBPART,
-                                  struct.Node.EMPTYPART):
-                included, excluded = self.node_definitions(node, stack)
-                if included:
-                    for scope in self.determine_scope(stack):
-                        self.scoped_terms[scope].extend(included)
-                self.scoped_terms['EXCLUDED'].extend(excluded)
-
-        struct.walk(self.tree, per_node)
-
+        self.stack = ParentStack()
+        self.definition_positions = None
+        if self.cache is not None:
+            self.subparts_key = hashlib.sha1(json.dumps(
+                sorted(self.subpart_map.items()))).hexdigest()
+
+    def pre_process_node(self, node):
+        stack = self.stack
+        if len(node.label) > 1 and node.node_type == struct.Node.REGTEXT:
+            #   Add one for the subpart level
+            stack.add(len(node.label) + 1, node)
+        elif node.node_type in (struct.Node.SUBPART, struct.Node.EMPTYPART):
+            #   Subparts all on the same level
+            stack.add(2, node)
+        else:
+            stack.add(len(node.label), node)
+
+        if node.node_type in (struct.Node.REGTEXT, struct.Node.SUBPART,
+                              struct.Node.EMPTYPART):
+            candidates, scopes = self.scan_definitions(node, stack)
+            included, excluded = self.classify_definitions(node, candidates)
+            if included:
+                for scope in scopes:
+                    self.scoped_terms[scope].extend(included)
+            self.scoped_terms['EXCLUDED'].extend(excluded)
+
+    def scan_definitions(self, node, stack):
+        """The candidate definitions in this node (see
+        definition_candidates) and, if any might be included, their scope.
+        Both depend only on the node and its lineage, so when a cache is
+        available, they're carried over from previous versions for nodes
+        which (along with their lineage) haven't changed"""
+        def scan():
+            candidates = self.definition_candidates(node, stack)
+            scopes = None
+            if any(not always for _, _, always, _ in candidates):
+                scopes = self.determine_scope(stack)
+            return candidates, scopes
+
+        if self.cache is None:
+            return scan()
+
+        result = self.cache.fetch_or_compute(
+            self.definitions_key(node, stack), scan)
+        if settings.VERIFY_DEFINITIONS:
+            rescanned = scan()
+            if rescanned != result:
+                logging.warning("Definitions carried over for %s differ: "
+                                "%s != %s", node.label_id(), result,
+                                rescanned)
+                result = rescanned
+        return result
+
+    def definitions_key(self, node, stack):
+        """A digest of everything scan_definitions reads: the node, each
+        node in its lineage and, if any mention a subpart, which sections
+        are in which subpart"""
+        def lineage_key(n, parent_key, parent_subpart):
+            return (hashlib.sha1(json.dumps(
+                [n.text, getattr(n, 'tagged_text', None), n.title, n.label,
+                 n.node_type, parent_key])).hexdigest(),
+                parent_subpart or 'subpart' in n.text.lower())
+
+        key, subpart = None, False
+        #   Each node's digest includes its parent's, so is computed once
+        for parent in reversed(stack.lineage()):
+            key, subpart = stack.memoized(
+                parent, 'key',
+                lambda n, k=key, s=subpart: lineage_key(n, k, s))
+        if subpart:
+            key = hashlib.sha1(key + self.subparts_key).hexdigest()
+        return 'definitions:' + key
+
+    def finish_pre_process(self):
+        del self.stack
+        self.index_definitions()
         referenced = self.layer['referenced']
         for scope in self.scoped_terms:
             for ref in self.scoped_terms[scope]:
@@ -175,39 +292,74 @@ class Terms(Layer):
         would replace previous (correct) definitions."""
         applicable_terms = self.applicable_terms(node.label)
         if term in applicable_terms:
-            regex = 'the term .?' + re.escape(term) + '.? does not include'
-            return bool(re.search(regex, node.text.lower()))
+            return Terms.excludes(term, node.text)
         return False
 
+    @staticmethod
+    def excludes(term, text):
+        """Does this text exclude something from the term's definition?"""
+        regex = 'the term .?' + re.escape(term) + '.? does not include'
+        return bool(re.search(regex, text.lower()))
+
     def has_parent_definitions_indicator(self, stack):
         """With smart quotes, we catch some false positives, phrases in quotes
         that are not terms. This extra test lets us know that a parent of the
         node looks like it would contain definitions."""
         for node in stack.lineage():
-            if ('Definition' in node.text
-                    or 'Definition' in (node.title or '')
-                    or re.search('the term .* (means|refers to)',
-                                 node.text.lower())
-                    or re.search(u'“[^”]+” (means|refers to)',
-                                 node.text.lower())):
+            if stack.memoized(node, 'indicator',
+                              Terms.definitions_indicator):
                 return True
         return False
 
+    @staticmethod
+    def definitions_indicator(node):
+        """Does this node look like it contains definitions?"""
+        if 'Definition' in node.text or 'Definition' in (node.title or ''):
+            return True
+        text = node.text.lower()
+        return bool(Terms.the_term_re.search(text)
+                    or Terms.quoted_term_re.search(text))
+
     def node_definitions(self, node, stack=None):
-        """Find defined terms in this node's text. 'Act' is a special case,
-        as it is also defined as an external citation."""
+        """Find defined terms in this node's text, split into those
+        included and excluded"""
+        return self.classify_definitions(
+            node, self.definition_candidates(node, stack))
+
+    def classify_definitions(self, node, candidates):
+        """Split candidate definitions into those included and excluded.
+        Whether some are exclusions depends on the terms defined so far"""
         included_defs = []
         excluded_defs = []
+        label_id = node.label_id()
+        for term, pos, always_excluded, excludes_defined in candidates:
+            if always_excluded or (
+                    excludes_defined
+                    and term in self.applicable_terms(node.label)):
+                excluded_defs.append(Ref(term, label_id, pos))
+            else:
+                included_defs.append(Ref(term, label_id, pos))
+        return included_defs, excluded_defs
+
+    def definition_candidates(self, node, stack=None):
+        """Find terms which look to be defined in this node's text, as
+        (term, position, always excluded, excluded if already defined)
+        tuples. 'Act' is a special case, as it is also defined as an
+        external citation. Others are exclusions if they've already been
+        defined (see is_exclusion)"""
+        candidates = []
+        #   Positions found so far, for pos_start_excluding
+        found = IntervalSet()
 
         def add_match(n, term, pos):
-            if ((term == 'act' and list(uscode.scanString(n.text)))
-                    or self.is_exclusion(term, n)):
-                excluded_defs.append(Ref(term, n.label_id(), pos))
-            else:
-                included_defs.append(Ref(term, n.label_id(), pos))
+            candidates.append(
+                (term, pos, bool(term == 'act'
+                                 and list(scan(uscode, n.text))),
+                 Terms.excludes(term, n.text)))
+            found.add(*pos)
 
         if stack and self.has_parent_definitions_indicator(stack):
-            for match, _, _ in grammar.smart_quotes.scanString(node.text):
+            for match, _, _ in scan(grammar.smart_quotes, node.text):
                 term = match.term.tokens[0].lower().strip(',.;')
                 #   Don't use pos_end because we are stripping some chars
                 pos_start = match.term.pos[0]
@@ -215,25 +367,23 @@ class Terms(Layer):
                           term,
                           (pos_start, pos_start + len(term)))
 
-        for match, _, _ in grammar.scope_term_type_parser.scanString(
-                node.text):
+        for match, _, _ in scan(grammar.scope_term_type_parser, node.text):
             # Check that both scope and term look valid
             if (self.scope_of_text(match.scope, Label.from_node(node),
                                    verify_prefix=False)
-                    and re.match("^[a-z ]+$", match.term.tokens[0])):
+                    and Terms.plain_term_re.match(match.term.tokens[0])):
                 term = match.term.tokens[0].strip()
                 pos_start = node.text.index(term, match.term.pos[0])
                 add_match(node, term, (pos_start, pos_start + len(term)))
 
         if hasattr(node, 'tagged_text'):
-            for match, _, _ in grammar.xml_term_parser.scanString(
-                    node.tagged_text):
+            for match, _, _ in scan(grammar.xml_term_parser,
+                                    node.tagged_text):
                 """Position in match reflects XML tags, so its dropped in
                 preference of new values based on node.text."""
                 for match in chain([match.head], match.tail):
                     pos_start = self.pos_start_excluding(
-                        match.term.tokens[0], node.text,
-                        included_defs + excluded_defs)
+                        match.term.tokens[0], node.text, found)
                     term = node.tagged_text[
                         match.term.pos[0]:match.term.pos[1]].lower()
                     match_len = len(term)
@@ -241,17 +391,16 @@ class Terms(Layer):
                               term,
                               (pos_start, pos_start + match_len))
 
-        return included_defs, excluded_defs
+        return candidates
 
     def pos_start_excluding(self, needle, haystack, exclusions):
         """Search for the first instance of `needle` in the `haystack`
-        excluding any overlaps from `exclusions`. Implicitly returns None if
-        it can't be found"""
+        excluding any overlaps from `exclusions` (an IntervalSet).
+        Implicitly returns None if it can't be found"""
         start = 0
         while start >= 0:
             start = haystack.find(needle, start)
-            if not any(r.position[0] <= start and r.position[1] >= start
-                       for r in exclusions):
+            if not exclusions.covers(start):
                 return start
             start += 1
 
@@ -265,6 +414,16 @@ class Terms(Layer):
                 return [[reg, sect] for sect in self.subpart_map[subpart]]
         return []
 
+    def cache_context(self, node):
+        """The result depends on the definitions which apply to this node
+        and those made within it; when a notice adds or removes a
+        definition, only nodes within its scope will be reprocessed"""
+        applicable_terms = sorted(
+            (term, ref.label, ref.position)
+            for term, ref in self.applicable_terms(node.label).iteritems())
+        defined_here = sorted(self.definitions_within(node.label_id()))
+        return [node.label, applicable_terms, defined_here]
+
     def process(self, node):
         """Determine which (if any) definitions would apply to this node,
         then find if any of those terms appear in this node"""
@@ -276,9 +435,8 @@ class Terms(Layer):
             (term, ref) for term, ref in applicable_terms.iteritems()
             if ref.label != node.label_id()]
 
-        exclusions = self.excluded_offsets(node.label_id(), node.text)
-        exclusions = self.per_regulation_ignores(
-            exclusions, node.label, node.text)
+        exclusions = self.excluded_offsets(node.label_id(), node.text,
+                                           cfr_part=node.label[0])
 
         matches = self.calculate_offsets(node.text, term_list, exclusions)
         for term, ref, offsets in matches:
@@ -288,27 +446,33 @@ class Terms(Layer):
                 })
         return layer_el
 
-    def per_regulation_ignores(self, exclusions, label, text):
-        cfr_part = label[0]
-        if settings.IGNORE_DEFINITIONS_IN.get(cfr_part):
-            for ignore_term in settings.IGNORE_DEFINITIONS_IN[cfr_part]:
-                exclusions.extend(
-                    (match.start(), match.end()) for match in
-                    re.finditer(r'\b' + re.escape(ignore_term) + r'\b', text))
-        return exclusions
-
-    def excluded_offsets(self, label, text):
+    def index_definitions(self):
+        """Index the positions of definitions by the label of the node
+        which contains them"""
+        self.definition_positions = defaultdict(list)
+        for reflist in self.scoped_terms.values():
+            for ref in reflist:
+                self.definition_positions[ref.label].append(ref.position)
+
+    def definitions_within(self, label):
+        """The positions of the definitions made within the node with this
+        label"""
+        if self.definition_positions is None:
+            return [ref.position for reflist in self.scoped_terms.values()
+                    for ref in reflist if ref.label == label]
+        return list(self.definition_positions.get(label, []))
+
+    def excluded_offsets(self, label, text, cfr_part=None):
         """We explicitly exclude certain chunks of text (for example, words
         we are defining shouldn't have links appear within the defined
-        term.) More will be added in the future"""
-        exclusions = []
-        for reflist in self.scoped_terms.values():
-            exclusions.extend(
-                ref.position for ref in reflist if ref.label == label)
-        for ignore_term in settings.IGNORE_DEFINITIONS_IN['ALL']:
-            exclusions.extend(
-                (match.start(), match.end()) for match in
-                re.finditer(r'\b' + re.escape(ignore_term) + r'\b', text))
+        term.) More will be added in the future. If the CFR part is
+        provided, phrases ignored in that part are also excluded"""
+        exclusions = self.definitions_within(label)
+        phrases = settings.IGNORE_DEFINITIONS_IN['ALL']
+        if cfr_part is not None:
+            phrases = (list(phrases)
+                       + settings.IGNORE_DEFINITIONS_IN.get(cfr_part, []))
+        exclusions.extend(ignored_offsets(phrases, text))
         return exclusions
 
     def calculate_offsets(self, text, applicable_terms, exclusions=[]):
@@ -316,33 +480,36 @@ class Terms(Layer):
         larger (i.e. containing) terms."""
 
         # don't modify the original
-        exclusions = list(exclusions)
+        exclusions = IntervalSet(exclusions)
 
         # add plurals to applicable terms
-        pluralized = [(pluralize(t[0]), t[1]) for t in applicable_terms]
+        for term, _ in applicable_terms:
+            if term not in self.plurals:
+                self.plurals[term] = pluralize(term)
+        pluralized = [(self.plurals[t[0]], t[1]) for t in applicable_terms]
         applicable_terms += pluralized
 
         #   longer terms first
         applicable_terms.sort(key=lambda x: len(x[0]), reverse=True)
 
+        #   Many nodes share the same definitions, so they share a matcher
+        terms = frozenset(term for term, _ in applicable_terms)
+        if terms not in self.matchers:
+            self.matchers[terms] = TermMatcher(terms)
+        occurrences = self.matchers[terms].find(text.lower())
+
         matches = []
         for term, ref in applicable_terms:
-            re_term = ur'\b' + re.escape(term) + ur'\b'
-            offsets = [
-                (m.start(), m.end())
-                for m in re.finditer(re_term, text.lower())]
             safe_offsets = []
-            for start, end in offsets:
-                #   Start is contained in an existing def
-                if any(start >= e[0] and start <= e[1] for e in exclusions):
-                    continue
-                #   End is contained in an existing def
-                if any(end >= e[0] and end <= e[1] for e in exclusions):
+            for start, end in occurrences.get(term, []):
+                #   Start or end is contained in an existing def
+                if exclusions.covers(start) or exclusions.covers(end):
                     continue
                 safe_offsets.append((start, end))
             if not safe_offsets:
                 continue
 
-            exclusions.extend(safe_offsets)
+            for start, end in safe_offsets:
+                exclusions.add(start, end)
             matches.append((term, ref, safe_offsets))
         return matches
@@ -0,0 +1,135 @@
+"""Building every version of a regulation holds each compiled tree, the
+layer caches and every parsed notice in memory. This module reports, after
+each version, how much memory the build is using and where it's going, so
+that we can size workers and check memory-reduction work.
+
+If tracemalloc is available, the largest allocation sites are included;
+otherwise we fall back to summarizing live objects by type. tracemalloc
+can't be imported on Python 2, so there the fallback always runs, and the
+report is only approximate: every size is a sum of sys.getsizeof, which
+omits allocator overhead and memory held outside of Python objects."""
+import gc
+import json
+import resource
+import sys
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from regparser.tree import struct
+
+
+#   Linux reports ru_maxrss in kilobytes; OS X in bytes
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def peak_rss(who=resource.RUSAGE_SELF):
+    """Peak resident set size, in bytes"""
+    return resource.getrusage(who).ru_maxrss * RSS_UNIT
+
+
+def node_count(tree):
+    count = [0]
+
+    def per_node(node):
+        count[0] += 1
+    struct.walk(tree, per_node)
+    return count[0]
+
+
+def approximate_size(obj, seen=None):
+    """Approximate number of bytes held by this object and everything it
+    (transitively) refers to. Objects in `seen` (by id) aren't counted
+    again, so a single set can be shared to avoid double counting"""
+    if seen is None:
+        seen = set()
+    total = 0
+    to_visit = [obj]
+    while to_visit:
+        obj = to_visit.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            to_visit.extend(obj.iterkeys())
+            to_visit.extend(obj.itervalues())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            to_visit.extend(obj)
+        elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+            to_visit.append(obj.__dict__)
+    return total
+
+
+def top_types(limit):
+    """Fallback for top_allocations: live objects summarized by type"""
+    by_type = {}
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        count, size = by_type.get(name, (0, 0))
+        by_type[name] = (count + 1, size + sys.getsizeof(obj))
+    ordered = sorted(by_type.items(), key=lambda pair: -pair[1][1])
+    return [{'type': name, 'count': count, 'size': size}
+            for name, (count, size) in ordered[:limit]]
+
+
+def top_allocations(limit):
+    """The allocation sites holding the most memory"""
+    snapshot = tracemalloc.take_snapshot()
+    return [{'site': '%s:%s' % (stat.traceback[0].filename,
+                                stat.traceback[0].lineno),
+             'count': stat.count, 'size': stat.size}
+            for stat in snapshot.statistics('lineno')[:limit]]
+
+
+class MemoryReport(object):
+    """Collects memory usage after each version of a build. Objects are
+    counted once per report: each tree's bytes are those it doesn't share
+    with the trees (or notices) already sized. This relies on the build
+    holding onto every tree and notice, so that their ids aren't reused"""
+    def __init__(self, top=10):
+        self.top = top
+        self.versions = []
+        self._tree_bytes = {}
+        self._notices_bytes = None
+        #   ids of the objects held by the trees and notices sized so far
+        self._seen = set()
+        if tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def record(self, version, trees, layer_cache, notices):
+        """`trees` maps each version built so far to its tree; `notices`
+        are all of the parsed notices"""
+        if self._notices_bytes is None:
+            self._notices_bytes = approximate_size(notices, self._seen)
+        #   Only size new trees; structure they share with those already
+        #   sized isn't counted again
+        for tree_version, tree in trees.iteritems():
+            if tree_version not in self._tree_bytes:
+                self._tree_bytes[tree_version] = approximate_size(
+                    tree, self._seen)
+
+        entry = {
+            'version': version,
+            'peak_rss': peak_rss(),
+            'peak_rss_children': peak_rss(resource.RUSAGE_CHILDREN),
+            'nodes': node_count(trees[version]),
+            'tree_bytes': self._tree_bytes[version],
+            'all_trees_bytes': sum(self._tree_bytes[v] for v in trees),
+            #   The caches change between versions, so are sized afresh
+            'layer_cache_bytes': approximate_size(layer_cache.caches(),
+                                                  set(self._seen)),
+            'notices_bytes': self._notices_bytes}
+        if tracemalloc:
+            entry['top_allocations'] = top_allocations(self.top)
+        else:
+            entry['top_types'] = top_types(self.top)
+        self.versions.append(entry)
+        return entry
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump({'versions': self.versions}, f, sort_keys=True,
+                      indent=4, separators=(', ', ': '))
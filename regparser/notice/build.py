@@ -1,10 +1,13 @@
 from copy import deepcopy
+import hashlib
 import os
 from urlparse import urlparse
 
 from lxml import etree
 import requests
 
+from regparser import instrumentation
+from regparser.build_cache import BuildCache, input_key
 from regparser.notice.address import fetch_addresses
 from regparser.notice.build_appendix import parse_appendix_changes
 from regparser.notice.build_interp import parse_interp_changes
@@ -23,6 +26,12 @@ import settings
 
 def build_notice(cfr_title, cfr_part, fr_notice, do_process_xml=True):
     """Given JSON from the federal register, create our notice structure"""
+    with instrumentation.timed('notice.build_notice',
+                               fr_notice['document_number']):
+        return _build_notice(cfr_title, cfr_part, fr_notice, do_process_xml)
+
+
+def _build_notice(cfr_title, cfr_part, fr_notice, do_process_xml):
     notice = {'cfr_title': cfr_title, 'cfr_part': cfr_part}
     #   Copy over most fields
     for field in ['abstract', 'action', 'agency_names', 'comments_close_on',
@@ -53,11 +62,75 @@ def build_notice(cfr_title, cfr_part, fr_notice, do_process_xml=True):
         if len(local_notices) > 0:
             return process_local_notices(local_notices, notice)
         else:
-            notice_str = requests.get(fr_notice['full_text_xml_url']).content
+            notice_str = fetch_notice_xml(fr_notice['full_text_xml_url'])
             return [process_notice(notice, notice_str)]
     return [notice]
 
 
+#   url -> notice XML, downloaded ahead of time (e.g. by a batch build
+#   covering several parts) so that it needn't be re-fetched for each
+_prefetched_xml = {}
+
+
+def fetch_notice_xml(url):
+    """Download the XML associated with a notice, unless it's already been
+    fetched"""
+    if url not in _prefetched_xml:
+        with instrumentation.timed('notice.fetch', url):
+            return requests.get(url).content
+    return _prefetched_xml[url]
+
+
+def prefetch_notice_xml(url):
+    """Download and keep the XML associated with a notice. Local versions
+    of the XML, if present, take precedence, so those aren't fetched"""
+    if url not in _prefetched_xml and not _check_local_version_list(url):
+        _prefetched_xml[url] = requests.get(url).content
+    return url
+
+
+#   digest of a notice's XML -> ParsedNotice, for notices which modify
+#   several of the parts in a batch build; see share_notice_xml
+_parsed_xml = {}
+
+
+def _xml_digest(notice_str):
+    return hashlib.sha1(notice_str).hexdigest()
+
+
+def share_notice_xml(url):
+    """Parse a prefetched notice's XML (the work which doesn't depend on the
+    CFR part; see ParsedNotice) once, so that it needn't be repeated for
+    each of the parts the notice modifies"""
+    notice_str = _prefetched_xml.get(url)
+    if notice_str is not None:
+        digest = _xml_digest(notice_str)
+        if digest not in _parsed_xml:
+            parsed = ParsedNotice(
+                preprocess_notice_xml(etree.fromstring(notice_str)))
+            parsed.shared = True
+            _parsed_xml[digest] = parsed
+    return url
+
+
+def parse_notice_xml(notice_str):
+    """The ParsedNotice of this XML; shared, if it's been parsed already
+    (see share_notice_xml)"""
+    parsed = _parsed_xml.get(_xml_digest(notice_str))
+    if parsed is None:
+        parsed = ParsedNotice(
+            preprocess_notice_xml(etree.fromstring(notice_str)))
+    return parsed
+
+
+def clear_prefetched_xml():
+    """Forget the XML kept by prefetch_notice_xml and share_notice_xml, e.g.
+    once the batch build which needed it has finished, so that it's
+    neither held onto nor reused by a later build"""
+    _prefetched_xml.clear()
+    _parsed_xml.clear()
+
+
 def split_doc_num(doc_num, effective_date):
     """ If we have a split notice, we construct a document number
     based on the original document number and the effective date. """
@@ -97,10 +170,19 @@ def set_document_numbers(notices):
 
 
 def process_notice(partial_notice, notice_str):
-    notice_xml = etree.fromstring(notice_str)
+    """Parse the notice's XML. As this is expensive, results are kept in the
+    build cache (if configured)"""
+    cache = BuildCache()
+    if not cache.enabled():
+        return _process_notice(partial_notice, notice_str)
+    return cache.fetch_or_build(
+        'notice', input_key(partial_notice, notice_str),
+        lambda: _process_notice(partial_notice, notice_str))
+
+
+def _process_notice(partial_notice, notice_str):
     notice = dict(partial_notice)
-    notice_xml = preprocess_notice_xml(notice_xml)
-    process_xml(notice, notice_xml)
+    process_parsed(notice, parse_notice_xml(notice_str))
     return notice
 
 
@@ -321,32 +403,78 @@ def process_amendments(notice, notice_xml):
         notice['changes'] = notice_changes.changes
 
 
-def process_sxs(notice, notice_xml):
-    """ Find and build SXS from the notice_xml. """
-    sxs = find_section_by_section(notice_xml)
+def process_sxs(notice, notice_xml, sxs=None):
+    """ Find and build SXS from the notice_xml. The section-by-section
+    analysis's XML may be provided if it's already been found. """
+    if sxs is None:
+        sxs = find_section_by_section(notice_xml)
     sxs = build_section_by_section(sxs, notice['cfr_part'],
                                    notice['meta']['start_page'])
     notice['section_by_section'] = sxs
 
 
+class ParsedNotice(object):
+    """The results of processing a notice's XML which don't depend on the
+    CFR part, so can be shared by every part the notice modifies: the
+    contact, addresses, dates and the section-by-section analysis's XML.
+    The XML itself is kept for process_amendments and add_footnotes. If
+    shared, those work on a copy; otherwise, the XML is theirs to modify"""
+    def __init__(self, notice_xml):
+        self.xml = notice_xml
+        self.shared = False
+        self.fields = {}
+
+        xml_chunk = notice_xml.xpath('//FURINF/P')
+        if xml_chunk:
+            self.fields['contact'] = xml_chunk[0].text
+
+        addresses = fetch_addresses(notice_xml)
+        if addresses:
+            self.fields['addresses'] = addresses
+
+        self.sxs = find_section_by_section(notice_xml)
+        self._dates = None
+        self._dates_fetched = False
+
+    def dates(self):
+        """The dates found in the XML. Only needed by notices which lack an
+        effective date, so they're fetched when first asked for"""
+        if not self._dates_fetched:
+            self._dates = fetch_dates(self.xml)
+            self._dates_fetched = True
+        return self._dates
+
+
 def process_xml(notice, notice_xml):
     """Pull out relevant fields from the xml and add them to the notice"""
+    return process_parsed(notice, ParsedNotice(notice_xml), notice_xml)
 
-    xml_chunk = notice_xml.xpath('//FURINF/P')
-    if xml_chunk:
-        notice['contact'] = xml_chunk[0].text
 
-    addresses = fetch_addresses(notice_xml)
-    if addresses:
-        notice['addresses'] = addresses
+def process_parsed(notice, parsed, notice_xml=None):
+    """Add the fields of a ParsedNotice to the notice, along with those
+    which depend on the notice's CFR part. Amendments and footnotes are
+    processed in notice_xml, which is modified; by default, that's the
+    parsed XML (or a copy of it, if the parsed notice is shared)"""
+    if parsed.shared:
+        notice.update(deepcopy(parsed.fields))
+    else:
+        notice.update(parsed.fields)
 
     if not notice.get('effective_on'):
-        dates = fetch_dates(notice_xml)
+        dates = parsed.dates()
         if dates and 'effective' in dates:
             notice['effective_on'] = dates['effective'][0]
 
-    process_sxs(notice, notice_xml)
-    process_amendments(notice, notice_xml)
+    if notice_xml is None:
+        notice_xml = parsed.xml
+        if parsed.shared:
+            notice_xml = deepcopy(notice_xml)
+    with instrumentation.timed('notice.process_sxs',
+                               notice.get('document_number')):
+        process_sxs(notice, notice_xml, parsed.sxs)
+    with instrumentation.timed('notice.process_amendments',
+                               notice.get('document_number')):
+        process_amendments(notice, notice_xml)
     add_footnotes(notice, notice_xml)
 
     return notice
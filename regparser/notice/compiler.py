@@ -7,7 +7,7 @@ import copy
 import itertools
 import logging
 
-from regparser.tree.struct import Node, find
+from regparser.tree.struct import Node, find, invalidate_hashes
 from regparser.tree.xml_parser import interpretations
 from regparser.tree.xml_parser import tree_utils
 from regparser.utils import roman_nums
@@ -140,6 +140,13 @@ class RegulationTree(object):
     def __init__(self, previous_tree):
         self.tree = copy.deepcopy(previous_tree)
         self._kept__by_parent = defaultdict(list)
+        #   Nodes whose fields or children we've changed; their cached
+        #   fingerprints will need to be cleared
+        self.modified_nodes = []
+
+    def mark_modified(self, *nodes):
+        """Note that these nodes have been altered"""
+        self.modified_nodes.extend(nodes)
 
     def keep(self, labels):
         """The 'KEEP' verb tells us that a node should not be removed
@@ -159,6 +166,7 @@ class RegulationTree(object):
     def add_to_root(self, node):
         """ Add a child to the root of the tree. """
         self.tree.children.append(node)
+        self.mark_modified(self.tree)
 
         for c in self.tree.children:
             c.sortable = make_root_sortable(c.label, c.node_type)
@@ -210,6 +218,7 @@ class RegulationTree(object):
         parent = self.get_parent(node)
         other_children = [c for c in parent.children if c.label != node.label]
         parent.children = other_children
+        self.mark_modified(parent)
 
     def delete(self, label_id):
         """ Delete the node with label_id from the tree. """
@@ -238,6 +247,7 @@ class RegulationTree(object):
 
         origin = overwrite_marker(origin, destination[-1])
         origin.label = destination
+        self.mark_modified(origin)
         self.add_node(origin)
 
     def get_section_parent(self, node):
@@ -270,6 +280,7 @@ class RegulationTree(object):
             parent.children = self.add_child(parent.children, node,
                                              getattr(parent, 'child_labels',
                                                      []))
+        self.mark_modified(parent)
 
         # Finally, we see if this node is the parent of any 'kept' children.
         # If so, add them back
@@ -279,6 +290,7 @@ class RegulationTree(object):
                 node.children = self.add_child(node.children, kept,
                                                getattr(node, 'child_labels',
                                                        []))
+            self.mark_modified(node)
 
     def create_empty_node(self, node_label):
         """ In rare cases, we need to flush out the tree by adding
@@ -294,6 +306,7 @@ class RegulationTree(object):
         parent = self.get_parent(node)
         parent.children = self.add_child(parent.children, node,
                                          getattr(parent, 'child_labels', []))
+        self.mark_modified(parent)
         return parent
 
     def contains(self, label):
@@ -317,6 +330,7 @@ class RegulationTree(object):
             existing.text = node.text
             if hasattr(node, 'tagged_text'):
                 existing.tagged_text = node.tagged_text
+            self.mark_modified(existing)
         # Unfortunately, the same nodes (particularly headers) might be
         # added by multiple notices...
         elif (existing and existing.text == node.text
@@ -345,24 +359,28 @@ class RegulationTree(object):
                 parent.children = self.add_child(
                     parent.children, node, getattr(parent, 'child_labels',
                                                    []))
+                self.mark_modified(parent)
 
     def add_section(self, node, subpart_label):
         """ Add a new section to a subpart. """
 
         subpart = find(self.tree, '-'.join(subpart_label))
         subpart.children = self.add_child(subpart.children, node)
+        self.mark_modified(subpart)
 
     def replace_node_text(self, label, change):
         """ Replace just a node's text. """
 
         node = find(self.tree, label)
         node.text = change['node']['text']
+        self.mark_modified(node)
 
     def replace_node_title(self, label, change):
         """ Replace just a node's title. """
 
         node = find(self.tree, label)
         node.title = change['node']['title']
+        self.mark_modified(node)
 
     def replace_node_heading(self, label, change):
         """ A node's heading is it's keyterm. We handle this here, but not
@@ -373,6 +391,7 @@ class RegulationTree(object):
         if hasattr(node, 'tagged_text') and 'tagged_text' in change['node']:
             node.tagged_text = replace_first_sentence(
                 node.tagged_text, change['node']['tagged_text'])
+        self.mark_modified(node)
 
     def get_subparts(self):
         """ Get all the subparts and empty parts in the tree.  """
@@ -419,6 +438,7 @@ class RegulationTree(object):
                               if c.label_id() != label]
             subpart_with_node.children = other_children
             destination.children = self.add_child(destination.children, node)
+            self.mark_modified(subpart_with_node, destination)
 
 
 def dict_to_node(node_dict):
@@ -537,4 +557,6 @@ def compile_regulation(previous_tree, notice_changes):
     for label, change in next_pass:
         logging.warning('Conflicting Change: %s:%s', label, change['action'])
         one_change(reg, label, change)
+
+    invalidate_hashes(reg.tree, reg.modified_nodes)
     return reg.tree
@@ -6,6 +6,7 @@ from copy import copy
 from lxml import etree
 
 from regparser.grammar import amdpar, tokens
+from regparser.grammar.utils import scan
 from regparser.tree.struct import Node
 from regparser.tree.xml_parser.reg_text import build_from_section
 from regparser.tree.xml_parser.tree_utils import get_node_text
@@ -215,7 +216,7 @@ def parse_amdpar(par, initial_context):
     for e in filter(lambda e: e.text, par.xpath('./E')):
         e.text = e.text.replace(' and ', ' ')
     text = get_node_text(par, add_spaces=True)
-    tokenized = [t[0] for t, _, _ in amdpar.token_patterns.scanString(text)]
+    tokenized = [t[0] for t, _, _ in scan(amdpar.token_patterns, text)]
 
     tokenized = compress_context_in_tokenlists(tokenized)
     tokenized = resolve_confused_context(tokenized, initial_context)
@@ -688,5 +689,5 @@ def new_subpart_added(amendment, reg_part):
 
     new_subpart = amendment.action == 'POST'
     label = amendment.original_label
-    m = [t for t, _, _ in amdpar.subpart_label.scanString(label)]
+    m = [t for t, _, _ in scan(amdpar.subpart_label, label)]
     return (len(m) > 0 and m[0].part == reg_part and new_subpart)
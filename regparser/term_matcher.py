@@ -0,0 +1,88 @@
+"""Finding where each of many terms appears in a text by running a regular
+expression per term means a pass over the text (and, as Python's regex
+cache is small, often a compilation) per term. A TermMatcher finds every
+occurrence of all of its terms in a single pass. It's an Aho-Corasick
+automaton: a trie of the terms in which each node also links to the node
+for the longest proper suffix of its prefix, so that the scan never needs
+to back up."""
+import string
+
+
+#   Occurrences are bounded as r'\b' would bound them (without re.UNICODE)
+WORD_CHARS = frozenset(string.ascii_letters + string.digits + '_')
+
+
+def _is_word(text, idx):
+    return 0 <= idx < len(text) and text[idx] in WORD_CHARS
+
+
+class TermMatcher(object):
+    """Finds the occurrences of a fixed set of terms"""
+    def __init__(self, terms):
+        self.terms = sorted(set(terms))
+        #   Per trie node: transitions (char -> node), the node to fall back
+        #   to when there's no transition, and the terms which end here
+        self._goto, self._fail, self._out = [{}], [0], [[]]
+        for term in self.terms:
+            if term:
+                self._add(term)
+        self._link()
+
+    def _add(self, term):
+        state = 0
+        for char in term:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._out[state].append(term)
+
+    def _link(self):
+        """Set each node's fallback, breadth first, so that every shorter
+        prefix has been linked first. A node's terms include those of its
+        fallback"""
+        queue = self._goto[0].values()
+        idx = 0
+        while idx < len(queue):
+            state = queue[idx]
+            idx += 1
+            for char, child in self._goto[state].iteritems():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                if char in self._goto[fallback]:
+                    fallback = self._goto[fallback][char]
+                self._fail[child] = fallback
+                self._out[child] = self._out[child] + self._out[fallback]
+
+    def find(self, text):
+        """Map each term to the (start, end) of its occurrences in the text,
+        as re.finditer(r'\\bterm\\b', text) would find them: only those
+        bounded by word boundaries, and, for each term, without overlapping
+        (preferring the leftmost)"""
+        found = {}
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for idx, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for term in out[state]:
+                end = idx + 1
+                start = end - len(term)
+                if (_is_word(text, start - 1) == (term[0] in WORD_CHARS)
+                        or _is_word(text, end) == (term[-1] in WORD_CHARS)):
+                    continue
+                offsets = found.setdefault(term, [])
+                if not offsets or offsets[-1][1] <= start:
+                    offsets.append((start, end))
+        if '' in self.terms:
+            #   Like r'\b\b', the empty term occurs at every word boundary
+            offsets = [(idx, idx) for idx in range(len(text) + 1)
+                       if _is_word(text, idx - 1) != _is_word(text, idx)]
+            if offsets:
+                found[''] = offsets
+        return found
@@ -3,6 +3,7 @@ import re
 import string
 import sys
 
+from regparser.intervals import IntervalSet
 from regparser.tree import struct
 from regparser.search import segments
 from regparser.utils import roman_nums
@@ -83,9 +84,10 @@ class ParagraphParser():
             return None
         match_starts = [(m.start(), m.end()) for m in re.finditer(
             self.p_regex % p_levels[p_level][paragraph], text)]
-        match_starts = [
-            (start, end) for start, end in match_starts
-            if all([end < es or start > ee for es, ee in exclude])]
+        if match_starts and exclude:
+            excluded = IntervalSet(exclude)
+            match_starts = [(start, end) for start, end in match_starts
+                            if not excluded.overlaps(start, end)]
 
         if len(match_starts) == 0:
             return None
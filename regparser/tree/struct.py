@@ -1,5 +1,9 @@
+import copy
+import hashlib
 from json import JSONEncoder
 
+from lxml import etree
+
 
 class Node(object):
     APPENDIX = u'appendix'
@@ -10,6 +14,9 @@ class Node(object):
 
     INTERP_MARK = 'Interp'
 
+    #   Lazily computed fingerprints; not part of the node's content
+    HASH_FIELDS = ('_content_hash', '_subtree_hash')
+
     def __init__(
         self, text='', children=[], label=[], title=None,
             node_type=REGTEXT, source_xml=None):
@@ -36,6 +43,62 @@ class Node(object):
     def label_id(self):
         return '-'.join(self.label)
 
+    def content_hash(self):
+        """A stable digest of this node's own text, title, label and
+        node_type (i.e. ignoring its children). Computed lazily; see
+        invalidate_hashes"""
+        if getattr(self, '_content_hash', None) is None:
+            digest = hashlib.sha1()
+            for field in (self.text, self.title or u'', u'-'.join(self.label),
+                          self.node_type):
+                digest.update(unicode(field).encode('utf-8'))
+                digest.update('\x00')
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    def subtree_hash(self):
+        """A digest of this node's content combined with that of all of its
+        descendants (i.e. a Merkle hash). Two subtrees with the same hash
+        are identical. Computed lazily; see invalidate_hashes"""
+        if getattr(self, '_subtree_hash', None) is None:
+            #   Reversed pre-order visits every node after its descendants
+            #   and, unlike recursion, won't hit the recursion limit
+            for node in reversed(list(pre_order(self))):
+                if getattr(node, '_subtree_hash', None) is None:
+                    digest = hashlib.sha1(node.content_hash())
+                    for child in node.children:
+                        digest.update(child._subtree_hash)
+                    node._subtree_hash = digest.hexdigest()
+        return self._subtree_hash
+
+    def __getstate__(self):
+        """lxml elements don't survive pickling (they come back as invalid
+        proxies), so the source XML is pickled as a string"""
+        state = dict(self.__dict__)
+        if state.get('source_xml') is not None:
+            state['source_xml'] = etree.tostring(state['source_xml'],
+                                                 with_tail=False)
+        return state
+
+    def __setstate__(self, state):
+        if state.get('source_xml') is not None:
+            state['source_xml'] = etree.fromstring(state['source_xml'])
+        self.__dict__.update(state)
+
+    def __deepcopy__(self, memo):
+        """Copy as if there were no __getstate__; lxml copies elements
+        itself, without serializing them"""
+        copied = self.__class__.__new__(self.__class__)
+        memo[id(self)] = copied
+        copied.__dict__.update(copy.deepcopy(self.__dict__, memo))
+        return copied
+
+    def invalidate_hash(self):
+        """Forget this node's fingerprints. As the subtree hash of every
+        ancestor is also affected, prefer invalidate_hashes"""
+        for field in Node.HASH_FIELDS:
+            self.__dict__.pop(field, None)
+
 
 class NodeEncoder(JSONEncoder):
     """Custom JSON encoder to handle Node objects"""
@@ -44,7 +107,8 @@ class NodeEncoder(JSONEncoder):
             fields = dict(obj.__dict__)
             if obj.title is None:
                 del fields['title']
-            for field in ('tagged_text', 'source_xml', 'child_labels'):
+            for field in (('tagged_text', 'source_xml', 'child_labels')
+                          + Node.HASH_FIELDS):
                 if field in fields:
                     del fields[field]
             return fields
@@ -64,20 +128,53 @@ def node_decode_hook(d):
         return d
 
 
+def pre_order(node):
+    """Generate every node in the tree, parents before their children.
+    Iterative, so deep trees won't hit the recursion limit. Children are
+    looked up after their parent has been generated"""
+    to_visit = [node]
+    while to_visit:
+        node = to_visit.pop()
+        yield node
+        to_visit.extend(reversed(node.children))
+
+
 def walk(node, fn):
     """Perform fn for every node in the tree. Pre-order traversal. fn must
     be a function that accepts a root node."""
-    result = fn(node)
-
-    if result is not None:
-        results = [result]
-    else:
-        results = []
-    for child in node.children:
-        results += walk(child, fn)
+    results = []
+    for descendant in pre_order(node):
+        result = fn(descendant)
+        if result is not None:
+            results.append(result)
     return results
 
 
+def invalidate_hashes(root, modified):
+    """Nodes cache their fingerprints. After modifying nodes within the
+    tree, clear the cached fingerprints of those nodes and all of their
+    ancestors."""
+    modified = set(id(node) for node in modified)
+    if not modified:
+        return
+
+    #   Iterative post-order traversal; a node is dirty if it or any of its
+    #   descendants was modified
+    dirty = set()
+    stack = [(root, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children)
+        elif id(node) in modified:
+            dirty.add(id(node))
+            node.invalidate_hash()
+        elif any(id(child) in dirty for child in node.children):
+            dirty.add(id(node))
+            node.__dict__.pop('_subtree_hash', None)
+
+
 def find(root, label):
     """Search through the tree to find the node with this label."""
     def check(node):
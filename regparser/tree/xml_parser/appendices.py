@@ -9,7 +9,8 @@ from pyparsing import LineStart, Optional, Suppress
 from regparser.citations import internal_citations
 from regparser.grammar import appendix as grammar
 from regparser.grammar.interpretation_headers import parser as headers
-from regparser.grammar.utils import Marker
+from regparser.grammar.utils import Marker, scan
+from regparser.intervals import IntervalSet
 from regparser.layer.formatting import table_xml_to_plaintext
 from regparser.tree.paragraph import p_levels
 from regparser.tree.struct import Node, walk
@@ -192,10 +193,11 @@ class AppendixProcessor(object):
             marker_positions.extend(text.index('(', m.start())
                                     for m in marker.finditer(text))
         #   Remove any citations
-        citations = internal_citations(text, require_marker=True)
+        citations = IntervalSet(
+            (cit.start, cit.end)
+            for cit in internal_citations(text, require_marker=True))
         marker_positions = [pos for pos in marker_positions
-                            if not any(cit.start <= pos and cit.end >= pos
-                                       for cit in citations)]
+                            if not citations.covers(pos)]
         texts = []
         #   Drop Zeros, add the end
         break_points = [p for p in marker_positions if p] + [len(text)]
@@ -390,10 +392,7 @@ def title_label_pair(text, appendix_letter):
 
 
 def initial_marker(text):
-    parser = (grammar.paren_upper | grammar.paren_lower | grammar.paren_digit
-              | grammar.period_upper | grammar.period_digit
-              | grammar.period_lower)
-    for match, start, end in parser.scanString(text):
+    for match, start, end in scan(grammar.marker, text):
         if start != 0:
             continue
         marker = (match.paren_upper or match.paren_lower or match.paren_digit
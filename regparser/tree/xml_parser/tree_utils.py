@@ -7,6 +7,7 @@ from pyparsing import Literal, Optional, Regex, Suppress
 
 from regparser.citations import remove_citation_overlaps
 from regparser.grammar.unified import any_depth_p
+from regparser.grammar.utils import scan
 from regparser.tree.paragraph import p_levels
 from regparser.tree.priority_stack import PriorityStack
 
@@ -86,7 +87,7 @@ def get_paragraph_markers(text):
     """ From a body of text that contains paragraph markers, extract the
     initial markers. """
 
-    for citation, start, end in any_depth_p.scanString(text):
+    for citation, start, end in scan(any_depth_p, text):
         if start == 0:
             markers = [citation.p1, citation.p2, citation.p3, citation.p4,
                        citation.p5, citation.p6]
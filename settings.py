@@ -64,6 +64,33 @@ DEFAULT_IMAGE_URL = (
 # ImageId -> New URL (without placeholder)
 IMAGE_OVERRIDES = {}
 
+# Number of processes used to build a version's layers. 1 (the default)
+# builds each layer serially, within the main process
+LAYER_WORKERS = 1
+
+# Number of parts built concurrently by build_batch.py
+BATCH_WORKERS = 1
+
+# Directory in which to store intermediate results (parsed notices,
+# compiled trees, layers, diffs) between runs. Empty (the default) disables
+# this cache
+BUILD_CACHE_DIR = ''
+
+# Directory in which build_from.py records a checkpoint after each version
+# is written, so that a failed build can be resumed (via --resume). Empty
+# disables checkpoints
+CHECKPOINT_DIR = ''
+
+# Memory budget, in bytes, for each layer's cache of results, keyed by layer
+# name ('ALL' applies to any layer not listed). Beyond it, the least
+# recently used results are evicted. 0 means no limit
+LAYER_CACHE_BYTES = {'ALL': 0}
+
+# The definitions found in each paragraph are carried over from previous
+# versions. If True, every paragraph is re-scanned anyway and any difference
+# is logged, to verify that nothing was carried over which shouldn't have been
+VERIFY_DEFINITIONS = False
+
 # list of strings: phrases which shouldn't be broken by definition links
 IGNORE_DEFINITIONS_IN = {'ALL':[]}
 
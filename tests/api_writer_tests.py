@@ -1,3 +1,4 @@
+#vim: set encoding=utf-8
 import json
 import os
 import shutil
@@ -66,6 +67,24 @@ class FSWriteContentTest(TestCase):
         wrote = json.loads(open(settings.OUTPUT_DIR + '/replace/it').read())
         self.assertEqual(wrote, ['action', [['label']], 'destination'])
 
+    def test_stream(self):
+        """Streaming an object should produce exactly the same file as
+        writing it"""
+        for obj in ({}, {'a': []}, {'a': {}},
+                    {u'1005-1': [{'text': u'§ 1005.1', 'offsets': [[0, 3]]}],
+                     u'1005-2': {'nested': {'deeper': [1, 2, {}]}},
+                     u'1005-3': Node("Content", label=['1005', '3'])}):
+            FSWriteContent("write/it").write(obj)
+            stream = FSWriteContent("stream/it").stream()
+            for key in sorted(obj):
+                stream.add(key, obj[key])
+            stream.close()
+
+            written = open(settings.OUTPUT_DIR + 'write/it').read()
+            streamed = open(settings.OUTPUT_DIR + 'stream/it').read()
+            self.assertEqual(written, streamed)
+
+
 class APIWriteContentTest(TestCase):
 
     def setUp(self):
@@ -0,0 +1,81 @@
+# vim: set encoding=utf-8
+from unittest import TestCase
+
+from benchmarks import run, synthetic
+from regparser.layer.terms import Terms
+from regparser.notice.build import process_notice
+from regparser.notice.compiler import compile_regulation
+from regparser.tree.struct import walk
+from regparser.tree.xml_parser import reg_text
+
+
+class SyntheticTests(TestCase):
+    def test_regulation_xml(self):
+        tree = reg_text.build_tree(synthetic.regulation_xml(
+            sections=3, depth=2, children=2, definitions=2, appendices=2))
+        self.assertEqual(['1000'], tree.label)
+        empty_part, app_a, app_b, interp = tree.children
+        self.assertEqual(['1000', 'A'], app_a.label)
+        self.assertEqual(['1000', 'B'], app_b.label)
+        self.assertEqual(['1000', 'Interp'], interp.label)
+        self.assertEqual(['1000-2-Interp', '1000-3-Interp', '1000-4-Interp'],
+                         [c.label_id() for c in interp.children])
+
+        definitions, section = empty_part.children[:2]
+        self.assertEqual(4, len(empty_part.children))
+        self.assertEqual(['1000-1-a', '1000-1-b'],
+                         [c.label_id() for c in definitions.children])
+        labels = []
+        walk(section, lambda n: labels.append(n.label_id()))
+        self.assertEqual(['1000-2', '1000-2-a', '1000-2-a-1', '1000-2-a-2',
+                          '1000-2-b', '1000-2-b-1', '1000-2-b-2'], labels)
+
+        terms = Terms(tree)
+        terms.pre_process()
+        self.assertEqual(set(['widget 0:1000-1-a', 'widget 1:1000-1-b']),
+                         set(terms.layer['referenced'].keys()))
+
+    def test_deterministic(self):
+        self.assertEqual(synthetic.regulation_xml(sections=4, seed=1),
+                         synthetic.regulation_xml(sections=4, seed=1))
+        self.assertNotEqual(synthetic.regulation_xml(sections=4, seed=1),
+                            synthetic.regulation_xml(sections=4, seed=2))
+
+    def test_notice_xml(self):
+        tree = reg_text.build_tree(synthetic.regulation_xml(
+            sections=4, depth=1, interpretations=False, appendices=0))
+        notice = process_notice(
+            synthetic.partial_notice(version=2),
+            synthetic.notice_xml(sections=4, amendments=2).encode('utf-8'))
+        self.assertEqual('2000-00002', notice['document_number'])
+        self.assertEqual(2, len(notice['changes']))
+
+        new_tree = compile_regulation(tree, notice['changes'])
+        for label in notice['changes']:
+            section = [s for s in new_tree.children[0].children
+                       if s.label_id() == label[:-2]][0]
+            self.assertEqual(
+                notice['changes'][label][0]['node']['text'].strip(),
+                section.children[0].text.strip())
+
+
+class RunTests(TestCase):
+    def test_growth(self):
+        self.assertAlmostEqual(1.0, run.growth([10, 20, 40], [1, 2, 4]))
+        self.assertAlmostEqual(2.0, run.growth([10, 20, 40], [1, 4, 16]))
+        self.assertEqual(None, run.growth([10], [1]))
+
+    def test_summarize_compare(self):
+        results = {'stages': {
+            'parse': {'times': [1.0, 2.0], 'growth': 1.0},
+            'diff': {'times': [1.0, 4.0], 'growth': 2.0}}}
+        summary = run.summarize(results)
+        self.assertEqual(2, len(summary))
+        self.assertTrue(summary[0].startswith('diff'))
+        self.assertTrue('SUPERLINEAR' in summary[0])
+        self.assertFalse('SUPERLINEAR' in summary[1])
+
+        baseline = {'stages': {'parse': {'times': [1.0, 1.0]}}}
+        comparison = run.compare(results, baseline)
+        self.assertEqual(1, len(comparison))
+        self.assertTrue('x2.00' in comparison[0])
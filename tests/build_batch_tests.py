@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+
+import build_batch
+from regparser import federalregister
+from regparser.notice import build as notice_build
+
+
+class BuildBatchTests(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_read_parts(self):
+        parts_path = os.path.join(self.path, 'parts.txt')
+        with open(parts_path, 'w') as f:
+            f.write("# title part regulation.xml notice_doc_# act\n"
+                    "12 1005 reg1005.xml 2011-31725 15 1693\n"
+                    "\n"
+                    "12  1026\treg1026.xml 2011-31715 15 1601  # TILA\n")
+        self.assertEqual(
+            [(12, '1005', 'reg1005.xml', '2011-31725', ['15', '1693']),
+             (12, '1026', 'reg1026.xml', '2011-31715', ['15', '1601'])],
+            build_batch.read_parts(parts_path))
+
+        with open(parts_path, 'w') as f:
+            f.write("12 1005 reg1005.xml 2011-31725 15\n")
+        self.assertRaises(ValueError, build_batch.read_parts, parts_path)
+
+    @patch('build_batch.build')
+    def test_build_part(self, build):
+        job = ((12, '1005', 'reg.xml', 'aaaa', ['15', '1693']), True, False)
+        build.return_value = True
+        self.assertEqual((12, '1005', None), build_batch._build_part(job))
+        args, kwargs = build.call_args
+        self.assertEqual(('reg.xml', 12, 'aaaa', ['15', '1693'], True), args)
+        self.assertEqual('1005', kwargs['cfr_part'])
+        self.assertEqual(1, kwargs['workers'])
+        self.assertFalse(kwargs['resume'])
+
+        build.return_value = False
+        self.assertEqual((12, '1005', 'Could not find notice_doc_#, aaaa'),
+                         build_batch._build_part(job))
+
+        #   Errors are reported, not raised
+        build.side_effect = ValueError("reg.xml is part 1026, not 1005")
+        title, part, error = build_batch._build_part(job)
+        self.assertEqual((12, '1005'), (title, part))
+        self.assertTrue("reg.xml is part 1026, not 1005" in error)
+
+    @patch('build_batch.federalregister.prefetch')
+    @patch('build_batch.build')
+    @patch('build_batch.Pool')
+    def test_build_batch(self, pool, build, prefetch):
+        """Every part is built; failures are returned"""
+        prefetch.return_value = 3
+        pool.return_value.imap_unordered.side_effect = map
+        build.side_effect = lambda reg_path, *args, **kwargs: (
+            reg_path != 'missing.xml')
+        parts = [(12, '1005', 'reg.xml', 'aaaa', ['15', '1693']),
+                 (12, '1026', 'missing.xml', 'bbbb', ['15', '1601'])]
+        self.assertEqual(
+            [(12, '1026', 'Could not find notice_doc_#, bbbb')],
+            build_batch.build_batch(parts, workers=4, generate_diffs=False))
+        self.assertEqual([(12, '1005'), (12, '1026')],
+                         prefetch.call_args[0][0])
+        self.assertEqual(2, pool.call_args[0][0])
+        self.assertEqual(2, build.call_count)
+        self.assertFalse(build.call_args[0][4])
+
+    @patch('build_batch.federalregister.prefetch')
+    @patch('build_batch.build')
+    @patch('build_batch.Pool')
+    def test_build_batch_clears_prefetched(self, pool, build, prefetch):
+        """Notices fetched for a batch aren't kept once it's complete, even
+        if it fails"""
+        def fill_caches(cfr_parts, only_final, workers):
+            federalregister._prefetched_json[(12, '1111', True)] = []
+            notice_build._prefetched_xml['http://example.com/a.xml'] = 'a'
+            notice_build._parsed_xml['digest'] = 'parsed'
+            return 1
+        prefetch.side_effect = fill_caches
+        pool.return_value.imap_unordered.side_effect = map
+        build.return_value = True
+
+        parts = [(12, '1111', 'reg.xml', 'aaaa', ['15', '1693'])]
+        self.assertEqual([], build_batch.build_batch(parts))
+        self.assertEqual({}, federalregister._prefetched_json)
+        self.assertEqual({}, notice_build._prefetched_xml)
+        self.assertEqual({}, notice_build._parsed_xml)
+
+        pool.return_value.imap_unordered.side_effect = ValueError
+        self.assertRaises(ValueError, build_batch.build_batch, parts)
+        self.assertEqual({}, federalregister._prefetched_json)
+        self.assertEqual({}, notice_build._prefetched_xml)
+        self.assertEqual({}, notice_build._parsed_xml)
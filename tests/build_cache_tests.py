@@ -0,0 +1,122 @@
+# vim: set encoding=utf-8
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+
+from regparser.build_cache import BuildCache, input_key
+from regparser.builder import Builder
+from regparser.layer import registry
+from regparser.layer.layer import build_layers
+from regparser.tree.struct import Node
+
+
+class BuildCacheTests(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_input_key(self):
+        tree = Node('Text', label=['1111', '1'])
+        self.assertEqual(input_key(tree, 'a'), input_key(tree, 'a'))
+        self.assertNotEqual(input_key(tree, 'a'), input_key(tree, 'b'))
+        self.assertNotEqual(input_key(tree, 'a'),
+                            input_key(Node('Other', label=['1111', '1']),
+                                      'a'))
+        #   Values are delimited, so moving characters between them matters
+        self.assertNotEqual(input_key('ab', 'c'), input_key('a', 'bc'))
+        self.assertEqual(input_key(u'abc'), input_key('abc'))
+
+    def test_input_key_parser_version(self):
+        key = input_key('a')
+        with patch('regparser.build_cache._parser_version', ['other']):
+            self.assertNotEqual(key, input_key('a'))
+
+    def test_get_set(self):
+        cache = BuildCache(self.path)
+        self.assertTrue(cache.enabled())
+        self.assertEqual(None, cache.get('tree', 'abcd'))
+        self.assertEqual('default', cache.get('tree', 'abcd', 'default'))
+        self.assertFalse(cache.contains('tree', 'abcd'))
+
+        tree = Node('Text', label=['1111', '1'])
+        cache.set('tree', 'abcd', tree)
+        self.assertTrue(cache.contains('tree', 'abcd'))
+        self.assertFalse(cache.contains('layer', 'abcd'))
+        self.assertEqual(tree, cache.get('tree', 'abcd'))
+        self.assertEqual(['abcd'], os.listdir(os.path.join(self.path,
+                                                           'tree')))
+
+    def test_get_corrupt(self):
+        cache = BuildCache(self.path)
+        cache.set('tree', 'abcd', 'value')
+        with open(cache._file_path('tree', 'abcd'), 'wb') as f:
+            f.write('garbage')
+        self.assertEqual(None, cache.get('tree', 'abcd'))
+
+    def test_disabled(self):
+        cache = BuildCache('')
+        self.assertFalse(cache.enabled())
+        cache.set('tree', 'abcd', 'value')
+        self.assertEqual(None, cache.get('tree', 'abcd'))
+        self.assertFalse(cache.contains('tree', 'abcd'))
+
+    def test_fetch_or_build(self):
+        cache = BuildCache(self.path)
+        calls = []
+
+        def build():
+            calls.append(1)
+            return None     # None is a legitimate value
+
+        self.assertEqual(None, cache.fetch_or_build('tree', 'abcd', build))
+        self.assertEqual(None, cache.fetch_or_build('tree', 'abcd', build))
+        self.assertEqual(1, len(calls))
+
+    def test_cached_tree_layers(self):
+        """Trees read back from the cache can still be used to build every
+        layer, including those which read the source XML"""
+        reg_xml = u"""
+            <CFRGRANULE>
+                <PART>
+                    <EAR>Pt. 1111</EAR>
+                    <HD SOURCE="HED">PART 1111—A REGULATION</HD>
+                    <SECTION>
+                        <SECTNO>§ 1111.1</SECTNO>
+                        <SUBJECT>General.</SUBJECT>
+                        <P>(a) Some content, see paragraph (b)</P>
+                        <P>(b) Other content</P>
+                    </SECTION>
+                    <APPENDIX>
+                        <EAR>Pt. 1111, App. A</EAR>
+                        <HD SOURCE="HED">Appendix A to Part 1111—Tables</HD>
+                        <GPOTABLE COLS="2">
+                            <BOXHD>
+                                <CHED H="1">One</CHED>
+                                <CHED H="1">Two</CHED>
+                            </BOXHD>
+                            <ROW><ENT>1</ENT><ENT>2</ENT></ROW>
+                        </GPOTABLE>
+                    </APPENDIX>
+                </PART>
+            </CFRGRANULE>""".strip()
+        key = input_key(reg_xml)
+        built = BuildCache(self.path).fetch_or_build(
+            'tree', key, lambda: Builder.reg_tree(reg_xml))
+        with patch.object(Builder, 'reg_tree') as reg_tree:
+            cached = BuildCache(self.path).fetch_or_build(
+                'tree', key, lambda: Builder.reg_tree(reg_xml))
+            self.assertFalse(reg_tree.called)
+
+        def layers(tree):
+            return build_layers(tree, [spec.load()(tree, 12, '2000-00001')
+                                       for spec in registry.LAYERS])
+        expected = layers(built)
+        self.assertEqual(expected, layers(cached))
+        formatting = [spec.ident for spec in registry.LAYERS].index(
+            'formatting')
+        self.assertEqual(['1111-A-p1'], expected[formatting].keys())
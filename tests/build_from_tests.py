@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+
+import build_from
+from regparser.layer import registry
+from regparser.tree.struct import Node
+import settings
+
+
+class BuildFromTests(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.original_checkpoint_dir = settings.CHECKPOINT_DIR
+        settings.CHECKPOINT_DIR = os.path.join(self.path, 'checkpoints')
+        self.reg_path = os.path.join(self.path, 'reg.txt')
+        with open(self.reg_path, 'w') as f:
+            f.write('Regulation text')
+
+    def tearDown(self):
+        settings.CHECKPOINT_DIR = self.original_checkpoint_dir
+        shutil.rmtree(self.path)
+
+    def mock_builder(self, builder_class, fail_on=None):
+        """Configure a mocked Builder which "compiles" versions bbbb and
+        cccc, raising an exception when writing the layers of `fail_on`.
+        Calls from any previous build are forgotten"""
+        builder_class.reset_mock()
+        builder_class.reg_tree.return_value = Node(label=['1111'])
+        builder = builder_class.return_value
+        builder.notices = [{'document_number': 'aaaa'},
+                           {'document_number': 'bbbb'},
+                           {'document_number': 'cccc'}]
+
+        def revision_generator(reg_tree, tree_key, completed):
+            for version in ('bbbb', 'cccc'):
+                if version not in completed:
+                    yield ({'document_number': version}, reg_tree,
+                           Node(version, label=['1111']), [])
+
+        def gen_and_write_layers(reg_tree, *args, **kwargs):
+            if reg_tree.text == fail_on:
+                raise ValueError("Malformed notice")
+
+        builder.revision_generator.side_effect = revision_generator
+        builder.gen_and_write_layers.side_effect = gen_and_write_layers
+        return builder
+
+    def written_versions(self, builder):
+        return [call[0][0].text
+                for call in builder.write_regulation.call_args_list]
+
+    def layer_versions(self, builder):
+        return [call[0][0].text
+                for call in builder.gen_and_write_layers.call_args_list]
+
+    @patch('build_from.diff_versions')
+    @patch('build_from.Builder')
+    def test_resume(self, builder_class, diff_versions):
+        """A resumed build continues after the last completed version"""
+        diff_versions.return_value = []
+        builder = self.mock_builder(builder_class, fail_on='cccc')
+        self.assertRaises(ValueError, build_from.build, self.reg_path, 12,
+                          'aaaa', ['15', '1693'])
+        self.assertEqual(['', 'bbbb', 'cccc'], self.written_versions(builder))
+
+        builder = self.mock_builder(builder_class)
+        self.assertTrue(build_from.build(self.reg_path, 12, 'aaaa',
+                                         ['15', '1693'], resume=True))
+        self.assertEqual(['cccc'], self.written_versions(builder))
+        self.assertEqual(['cccc'], self.layer_versions(builder))
+        self.assertFalse(builder.write_notices.called)
+        versions = diff_versions.call_args[0][0]
+        self.assertEqual(['aaaa', 'bbbb', 'cccc'], sorted(versions))
+        #   Cleared once complete
+        self.assertEqual([], os.listdir(settings.CHECKPOINT_DIR))
+
+    @patch('build_from.diff_versions')
+    @patch('build_from.Builder')
+    def test_resume_selected_layers(self, builder_class, diff_versions):
+        """A checkpoint written while building only some layers isn't used
+        to skip versions of a full build"""
+        diff_versions.return_value = []
+        builder = self.mock_builder(builder_class, fail_on='cccc')
+        self.assertRaises(ValueError, build_from.build, self.reg_path, 12,
+                          'aaaa', ['15', '1693'],
+                          layers=registry.select(['terms']))
+        self.assertEqual([], self.written_versions(builder))
+
+        builder = self.mock_builder(builder_class)
+        self.assertTrue(build_from.build(self.reg_path, 12, 'aaaa',
+                                         ['15', '1693'], resume=True))
+        self.assertEqual(['', 'bbbb', 'cccc'], self.written_versions(builder))
+        self.assertEqual(['', 'bbbb', 'cccc'], self.layer_versions(builder))
+        self.assertTrue(builder.write_notices.called)
+
+    @patch('build_from.Builder')
+    def test_part_mismatch(self, builder_class):
+        """The regulation must be the part it's listed as"""
+        self.mock_builder(builder_class)
+        self.assertRaises(ValueError, build_from.build, self.reg_path, 12,
+                          'aaaa', ['15', '1693'], cfr_part='2222')
+        self.assertFalse(builder_class.called)
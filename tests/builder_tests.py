@@ -1,9 +1,21 @@
+#vim: set encoding=utf-8
+import json
+import pickle
+import shutil
+import tempfile
 from unittest import TestCase
 
 from mock import Mock, patch
 
-from regparser.builder import Builder, LayerCacheAggregator
+from regparser.build_cache import BuildCache
+from regparser import api_writer, builder, instrumentation
+from regparser.builder import Builder, LayerCache, LayerCacheAggregator
+from regparser.layer.external_citations import ExternalCitationParser
+from regparser.layer import registry
+from regparser.layer.internal_citations import InternalCitationParser
+from regparser.layer.paragraph_markers import ParagraphMarkers
 from regparser.tree.struct import Node
+import settings
 
 
 class BuilderTests(TestCase):
@@ -39,6 +51,95 @@ class BuilderTests(TestCase):
         self.assertTrue(bbbb in notice_lists[1])
         self.assertTrue(cccc in notice_lists[1])
 
+    @patch('regparser.builder.compile_regulation')
+    @patch.object(Builder, 'merge_changes')
+    @patch.object(Builder, '__init__')
+    def test_revision_generator_completed(self, init, merge_changes,
+                                          compile_regulation):
+        """Versions which have already been built (e.g. before a build was
+        interrupted) should be skipped"""
+        init.return_value = None
+        b = Builder()   # Don't need parameters as init's been mocked out
+        bbbb = {'document_number': 'bbbb', 'effective_on': '2012-12-12',
+                'publication_date': '2011-11-12', 'changes': []}
+        cccc = {'document_number': 'cccc', 'effective_on': '2013-01-01',
+                'publication_date': '2012-01-01', 'changes': []}
+        b.notices = [bbbb, cccc]
+        b.eff_notices = {'2012-12-12': [bbbb], '2013-01-01': [cccc]}
+        b.doc_number = 'aaaa'
+        tree = Node(label=['1111'])
+        revisions = list(b.revision_generator(tree, completed=['aaaa',
+                                                               'bbbb']))
+        self.assertEqual(1, len(revisions))
+        notice, old_tree, _, _ = revisions[0]
+        self.assertEqual(cccc, notice)
+        self.assertTrue(old_tree is tree)
+        self.assertEqual(1, compile_regulation.call_count)
+
+    @patch('regparser.builder.compile_regulation')
+    @patch.object(Builder, 'merge_changes')
+    @patch.object(Builder, '__init__')
+    def test_revision_generator_tree_key(self, init, merge_changes,
+                                         compile_regulation):
+        """Each notice's changes are only merged once, even when they're
+        also needed for the build cache's key"""
+        init.return_value = None
+        b = Builder()   # Don't need parameters as init's been mocked out
+        bbbb = {'document_number': 'bbbb', 'effective_on': '2012-12-12',
+                'publication_date': '2011-11-12', 'changes': []}
+        b.notices = [bbbb]
+        b.eff_notices = {'2012-12-12': [bbbb]}
+        b.doc_number = 'aaaa'
+        b.build_cache = BuildCache('')
+        merge_changes.return_value = {}
+        list(b.revision_generator(Node(label=['1111']), tree_key='key'))
+        self.assertEqual(1, merge_changes.call_count)
+
+    @patch.object(Builder, 'merge_changes')
+    @patch.object(Builder, '__init__')
+    def test_pipelined_revisions(self, init, merge_changes):
+        """The pipelined version should yield the same versions as the
+        serial revision generator"""
+        init.return_value = None
+        merge_changes.return_value = {}
+        b = Builder()   # Don't need parameters as init's been mocked out
+        aaaa = {'document_number': 'aaaa', 'effective_on': '2012-12-12',
+                'publication_date': '2011-11-11', 'changes': []}
+        bbbb = {'document_number': 'bbbb', 'effective_on': '2012-12-12',
+                'publication_date': '2011-11-12', 'changes': []}
+        cccc = {'document_number': 'cccc', 'effective_on': '2013-01-01',
+                'publication_date': '2012-01-01', 'changes': []}
+        b.notices = [aaaa, bbbb, cccc]
+        b.eff_notices = {'2012-12-12': [aaaa, bbbb], '2013-01-01': [cccc]}
+        b.doc_number = 'aaaa'
+        tree = Node(label=['1111'],
+                    children=[Node('Text', label=['1111', '1'])])
+
+        serial = list(b.revision_generator(tree))
+        pipelined = list(b.pipelined_revisions(tree, depth=1))
+        self.assertEqual(len(serial), len(pipelined))
+        for lhs, rhs in zip(serial, pipelined):
+            self.assertEqual(lhs[0], rhs[0])
+            self.assertEqual(lhs[2], rhs[2])
+            self.assertEqual(lhs[3], rhs[3])
+        self.assertTrue(pipelined[0][1] is tree)
+        self.assertTrue(pipelined[1][1] is pipelined[0][2])
+
+    @patch.object(Builder, 'merge_changes')
+    @patch.object(Builder, '__init__')
+    def test_pipelined_revisions_error(self, init, merge_changes):
+        """Errors while compiling should surface in the consumer"""
+        init.return_value = None
+        merge_changes.side_effect = ValueError("Bad notice")
+        b = Builder()   # Don't need parameters as init's been mocked out
+        bbbb = {'document_number': 'bbbb', 'effective_on': '2012-12-12',
+                'publication_date': '2011-11-12', 'changes': []}
+        b.notices = [bbbb]
+        b.eff_notices = {'2012-12-12': [bbbb]}
+        b.doc_number = 'aaaa'
+        revisions = b.pipelined_revisions(Node(label=['1111']))
+        self.assertRaises(RuntimeError, list, revisions)
+
     @patch.object(Builder, '__init__')
     def test_layer_cache(self, init):
         """Integration test for layer caching"""
@@ -55,40 +156,268 @@ class BuilderTests(TestCase):
         b.gen_and_write_layers(tree, [], cache, [])
         arg = write.call_args_list[3][0][0]
         self.assertEqual(['1234-1-a'], arg.keys())
-        cache.replace_using(tree)
 
+        #   Results are keyed by content, so changed text is always
+        #   reprocessed
         write.reset_mock()
         tree.children[0].children[1].text = "References paragraph (a)"
         b.gen_and_write_layers(tree, [], cache, [])
         arg = write.call_args_list[3][0][0]
-        self.assertEqual(['1234-1-a'], arg.keys())
+        self.assertEqual(['1234-1-a', '1234-1-b'], list(sorted(arg.keys())))
 
         write.reset_mock()
         tree.children[0].children[0].text = "Contains no references"
         b.gen_and_write_layers(tree, [], cache, [])
         arg = write.call_args_list[3][0][0]
-        self.assertEqual(['1234-1-a'], arg.keys())
+        self.assertEqual(['1234-1-b'], arg.keys())
 
+        #   ... while unchanged text isn't
         write.reset_mock()
-        notice = {'document_number': '111-222'}
-        cache.invalidate_by_notice(notice)
-        b.gen_and_write_layers(tree, [], cache, [])
+        with patch.object(InternalCitationParser, 'process') as process:
+            b.gen_and_write_layers(tree, [], cache, [])
+            self.assertFalse(process.called)
         arg = write.call_args_list[3][0][0]
-        self.assertEqual(['1234-1-a'], arg.keys())
+        self.assertEqual(['1234-1-b'], arg.keys())
+
+    @patch.object(Builder, '__init__')
+    def test_layer_cache_deleted_citation(self, init):
+        """Citations to paragraphs which have since been deleted should be
+        removed, even if the citing paragraph hasn't changed"""
+        init.return_value = None
+        b = Builder()   # Don't need parameters as init's been mocked out
+        b.cfr_title, b.cfr_part, b.doc_number = 15, '1234', '111-222'
+        b.writer = Mock()
+        write = b.writer.layer.return_value.write
+        cache = LayerCacheAggregator()
+        tree = Node(label=['1234'], children=[
+            Node(label=['1234', '1'], children=[
+                Node("(a) See paragraph (b)", label=['1234', '1', 'a']),
+                Node("(b) This is b", label=['1234', '1', 'b'])])])
+        b.gen_and_write_layers(tree, [], cache, [])
+        self.assertEqual(['1234-1-a'], write.call_args_list[3][0][0].keys())
 
         write.reset_mock()
-        notice['changes'] = {'1234-1-b': 'some change'}
-        cache.invalidate_by_notice(notice)
+        del tree.children[0].children[1]
         b.gen_and_write_layers(tree, [], cache, [])
-        arg = write.call_args_list[3][0][0]
-        self.assertEqual(['1234-1-a', '1234-1-b'], list(sorted(arg.keys())))
+        self.assertEqual({}, write.call_args_list[3][0][0])
+
+    @patch.object(Builder, '__init__')
+    def test_layer_cache_toc(self, init):
+        """The table of contents should be rebuilt when a child's title
+        changes"""
+        init.return_value = None
+        b = Builder()   # Don't need parameters as init's been mocked out
+        b.cfr_title, b.cfr_part, b.doc_number = 15, '1234', '111-222'
+        b.writer = Mock()
+        write = b.writer.layer.return_value.write
+        cache = LayerCacheAggregator()
+        tree = Node(label=['1234'], children=[
+            Node(label=['1234', '1'], title='Section 1')])
+        b.gen_and_write_layers(tree, [], cache, [])
+        self.assertEqual('Section 1',
+                         write.call_args_list[4][0][0]['1234'][0]['title'])
 
         write.reset_mock()
-        notice['changes'] = {'1234-Subpart-A': 'some change'}
-        cache.invalidate_by_notice(notice)
+        tree.children[0].title = 'Renamed'
         b.gen_and_write_layers(tree, [], cache, [])
-        arg = write.call_args_list[3][0][0]
-        self.assertEqual(['1234-1-b'], list(sorted(arg.keys())))
+        self.assertEqual('Renamed',
+                         write.call_args_list[4][0][0]['1234'][0]['title'])
+
+    @patch.object(Builder, '__init__')
+    def test_layer_cache_moved(self, init):
+        """Layers which don't depend on the label reuse results for
+        paragraphs which have moved, across versions and regulations"""
+        init.return_value = None
+        b = Builder()   # Don't need parameters as init's been mocked out
+        b.cfr_title, b.cfr_part, b.doc_number = 15, '1234', '111-222'
+        b.writer = Mock()
+        caches = {}
+        tree = Node(label=['1234'], children=[
+            Node(label=['1234', '1'], children=[
+                Node("(a) 12 CFR 1005.2", label=['1234', '1', 'a'])]),
+            Node(label=['1234', '2'])])
+        b.gen_and_write_layers(tree, [], LayerCacheAggregator(caches), [])
+
+        moved = Node(label=['1234'], children=[
+            Node(label=['1234', '1']),
+            Node(label=['1234', '2'], children=[
+                Node("(a) 12 CFR 1005.2", label=['1234', '2', 'a'])])])
+        b.writer.reset_mock()
+        with patch.object(ExternalCitationParser, 'parse') as parse:
+            with patch.object(ParagraphMarkers, 'process') as process:
+                b.gen_and_write_layers(moved, [],
+                                       LayerCacheAggregator(caches), [])
+                self.assertFalse(parse.called)
+                self.assertFalse(process.called)
+        written = dict((call[0][0], write_call[0][0])
+                       for call, write_call in zip(
+                           b.writer.layer.call_args_list,
+                           b.writer.layer.return_value.write.call_args_list))
+        self.assertEqual(['1234-2-a'], written['external-citations'].keys())
+        self.assertEqual({'1234-2-a': [{'text': '(a)', 'locations': [0]}]},
+                         written['paragraph-markers'])
+
+    @patch.object(Builder, '__init__')
+    def test_gen_and_write_layers_workers(self, init):
+        """Building layers in a process pool should write the same layers,
+        in the same order, as building them serially"""
+        init.return_value = None
+        b = Builder()   # Don't need parameters as init's been mocked out
+        b.cfr_title, b.cfr_part, b.doc_number = 15, '1234', '111-222'
+        b.writer = Mock()
+        tree = Node(label=["1234"], title="Part 1234 - Regulation Z",
+                    children=[
+                        Node(label=["1234", "1"], title="Section 1",
+                             children=[
+                                 Node("(a) See paragraph (b)",
+                                      label=["1234", "1", "a"]),
+                                 Node("(b) This is b",
+                                      label=["1234", "1", "b"])])])
+
+        serial_cache = LayerCacheAggregator()
+        b.gen_and_write_layers(tree, [], serial_cache, [], workers=1)
+        serial = [(args, call[0][0])
+                  for args, call in zip(b.writer.layer.call_args_list,
+                                        b.writer.layer.return_value.write
+                                        .call_args_list)]
+
+        b.writer.reset_mock()
+        parallel_cache = LayerCacheAggregator()
+        b.gen_and_write_layers(tree, [], parallel_cache, [], workers=3)
+        parallel = [(args, call[0][0])
+                    for args, call in zip(b.writer.layer.call_args_list,
+                                          b.writer.layer.return_value.write
+                                          .call_args_list)]
+        self.assertEqual(11, len(parallel))
+        self.assertEqual(serial, parallel)
+
+        #   The results added by the workers are kept
+        cache = parallel_cache.cache_for('internal-citations')
+        layer = InternalCitationParser(tree)
+        key = layer.cache_key(tree.children[0].children[0])
+        self.assertTrue(key in cache._cache)
+        self.assertTrue(key in cache.unsaved())
+
+    def test_build_layer(self):
+        """Workers are given each layer's cache once and only send back
+        the results they add"""
+        tree = Node(label=['1234'], children=[
+            Node("(a) One", label=['1234', '1', 'a']),
+            Node("(b) Two", label=['1234', '1', 'b'])])
+        cache = LayerCache()
+        layer = ParagraphMarkers(tree)
+        for node in (tree, tree.children[0]):
+            cache.fetch_or_process(layer, node)
+        cache.unsaved()
+        with patch.object(builder, '_layer_args'):
+            with patch.object(builder, '_layer_caches'):
+                builder._init_layer_worker(
+                    (tree, 15, '111-222', [], None),
+                    {'paragraph-markers': pickle.loads(pickle.dumps(cache))})
+                ident, content, added, _ = builder._build_layer(
+                    ('paragraph-markers', ParagraphMarkers))
+        self.assertEqual('paragraph-markers', ident)
+        self.assertEqual(['1234-1-a', '1234-1-b'], sorted(content.keys()))
+        self.assertEqual([layer.cache_key(tree.children[1])], added.keys())
+        self.assertEqual({}, cache.unsaved())
+
+    @patch.object(Builder, '__init__')
+    def test_gen_and_write_layers_selected(self, init):
+        """Only the requested layers should be built and written"""
+        init.return_value = None
+        b = Builder()   # Don't need parameters as init's been mocked out
+        b.cfr_title, b.cfr_part, b.doc_number = 15, '1234', '111-222'
+        b.writer = Mock()
+        tree = Node("(a) See paragraph (b)", label=["1234", "1", "a"])
+        cache = LayerCacheAggregator()
+        for workers in (1, 2):
+            b.writer.reset_mock()
+            b.gen_and_write_layers(
+                tree, [], cache, [], workers=workers,
+                layers=registry.select(['paragraph-markers', 'toc']))
+            self.assertEqual(
+                [('toc', '1234', '111-222'),
+                 ('paragraph-markers', '1234', '111-222')],
+                [call[0] for call in b.writer.layer.call_args_list])
+        self.assertEqual(['paragraph-markers', 'toc'],
+                         sorted(cache.caches().keys()))
+
+    @patch.object(Builder, '__init__')
+    def test_gen_and_write_layers_stream(self, init):
+        """Streaming layers should write exactly the same files as writing
+        them whole"""
+        init.return_value = None
+        b = Builder()   # Don't need parameters as init's been mocked out
+        b.cfr_title, b.cfr_part, b.doc_number = 15, '1234', '111-222'
+        b.writer = api_writer.Client()
+        tree = Node(label=["1234"], title="Part 1234 - Regulation Z",
+                    children=[
+                        Node(label=["1234", "1"], title="Section 1",
+                             children=[
+                                 Node(u"(a) “Widget” means a gadget",
+                                      label=["1234", "1", "a"]),
+                                 Node("(b) A widget. See paragraph (a)",
+                                      label=["1234", "1", "b"])]),
+                        Node("Empty", label=["1234", "2"])])
+
+        original_output = settings.OUTPUT_DIR
+        written_dir, streamed_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        try:
+            settings.OUTPUT_DIR = written_dir + '/'
+            b.gen_and_write_layers(tree, [], LayerCacheAggregator(), [])
+            settings.OUTPUT_DIR = streamed_dir + '/'
+            b.gen_and_write_layers(tree, [], LayerCacheAggregator(), [],
+                                   stream=True)
+
+            for spec in registry.LAYERS:
+                path = '/layer/%s/1234/111-222' % spec.ident
+                written = open(written_dir + path).read()
+                self.assertEqual(written, open(streamed_dir + path).read())
+            terms = json.loads(open(streamed_dir + '/layer/terms/1234/111-222'
+                                    ).read())
+            self.assertTrue('referenced' in terms)
+            self.assertTrue('1234-1-b' in terms)
+        finally:
+            settings.OUTPUT_DIR = original_output
+            shutil.rmtree(written_dir)
+            shutil.rmtree(streamed_dir)
+
+    @patch.object(Builder, '__init__')
+    def test_gen_and_write_layers_build_cache(self, init):
+        """Layers should be stored in the build cache and, when found
+        there, written without being rebuilt"""
+        init.return_value = None
+        b = Builder()   # Don't need parameters as init's been mocked out
+        b.cfr_title, b.cfr_part, b.doc_number = 15, '1234', '111-222'
+        b.writer = Mock()
+        b.build_cache = BuildCache(tempfile.mkdtemp())
+        tree = Node(label=["1234"], children=[
+            Node("(a) See paragraph (b)", label=["1234", "1", "a"])])
+        try:
+            b.gen_and_write_layers(tree, [], LayerCacheAggregator(), [],
+                                   tree_key='key')
+            written = [call[0][0] for call in
+                       b.writer.layer.return_value.write.call_args_list]
+
+            b.writer.reset_mock()
+            load = registry.LayerSpec.load
+            loaded = []
+
+            def only_graphics(spec):
+                """Graphics aren't kept between runs, so are rebuilt"""
+                loaded.append(spec.ident)
+                if spec.ident == 'graphics':
+                    return load(spec)
+                return Mock(side_effect=AssertionError)
+            with patch.object(registry.LayerSpec, 'load', only_graphics):
+                b.gen_and_write_layers(tree, [], LayerCacheAggregator(), [],
+                                       tree_key='key')
+            self.assertEqual(['graphics'], loaded)
+            self.assertEqual(written, [
+                call[0][0] for call in
+                b.writer.layer.return_value.write.call_args_list])
+        finally:
+            shutil.rmtree(b.build_cache.path)
 
 
 class LayerCacheAggregatorTests(TestCase):
@@ -102,3 +431,134 @@ class LayerCacheAggregatorTests(TestCase):
 
         cache.invalidate(['123-2', '123-1-Interp'])
         self.assertEqual(cache._known_labels, set(['123']))
+
+    def test_invalidate_siblings(self):
+        """Labels which merely share a prefix (e.g. 123-1 and 123-10) are
+        unrelated"""
+        cache = LayerCacheAggregator()
+        cache.replace_using(Node(label=['123'], children=[
+            Node(label=['123', '1'], children=[Node(label=['123', '1', 'a'])]),
+            Node(label=['123', '10'])]))
+        cache.invalidate(['123-1'])
+        self.assertFalse(cache.is_known('123-1'))
+        self.assertFalse(cache.is_known('123-1-a'))
+        self.assertTrue(cache.is_known('123-10'))
+        self.assertTrue(cache.is_known('123'))
+
+        cache.invalidate(['123-Subpart-A'])
+        self.assertEqual(0, len(cache._known_labels))
+
+    def test_replace_using(self):
+        tree = Node(label=['123'], children=[
+            Node("One", label=['123', '1'], children=[
+                Node("A", label=['123', '1', 'a'])]),
+            Node("Two", label=['123', '2'])])
+        cache = LayerCacheAggregator()
+        cache.replace_using(tree)
+        self.assertEqual(set(['123', '123-1', '123-1-a', '123-2']),
+                         set(cache._known_labels))
+
+        #   Paragraph 123-1-a moves to 123-2; 123-1 is deleted
+        new_tree = Node(label=['123'], children=[
+            Node("Two", label=['123', '2'], children=[
+                Node("A", label=['123', '1', 'a'])]),
+            Node("Three", label=['123', '3'])])
+        cache.replace_using(new_tree)
+        self.assertEqual(set(['123', '123-1-a', '123-2', '123-3']),
+                         set(cache._known_labels))
+
+        #   Invalidated labels are re-added by the next tree
+        cache.invalidate(['123-1-a'])
+        self.assertFalse(cache.is_known('123-1-a'))
+        cache.replace_using(new_tree)
+        self.assertEqual(set(['123', '123-1-a', '123-2', '123-3']),
+                         set(cache._known_labels))
+
+        #   A different tree starts afresh
+        cache.replace_using(Node(label=['456']))
+        self.assertEqual(set(['456']), set(cache._known_labels))
+
+    def test_checkpoint(self):
+        cache = LayerCacheAggregator()
+        cache.cache_for('graphics').update({'123-1': ['value']})
+
+        restored = LayerCacheAggregator.from_checkpoint(
+            [cache.checkpoint_delta()])
+        self.assertEqual({'123-1': ['value']},
+                         restored.cache_for('graphics')._cache)
+        self.assertEqual(['graphics'], restored.caches().keys())
+
+    def test_cache_for_budget(self):
+        with patch.object(settings, 'LAYER_CACHE_BYTES',
+                          {'ALL': 100, 'terms': 2000}):
+            cache = LayerCacheAggregator()
+            self.assertEqual(2000, cache.cache_for('terms').max_bytes)
+            self.assertEqual(100, cache.cache_for('graphics').max_bytes)
+            self.assertEqual('graphics', cache.cache_for('graphics').name)
+
+
+class LayerCacheTests(TestCase):
+    def setUp(self):
+        self.layer = Mock()
+        self.layer.cache_key.side_effect = lambda node: node.text
+        self.layer.process_cacheable.side_effect = lambda node: [node.text]
+        self.layer.complete.side_effect = lambda node, value: value
+
+    def fetch(self, cache, *texts):
+        for text in texts:
+            cache.fetch_or_process(self.layer, Node(text))
+
+    def test_fetch_or_process(self):
+        cache = LayerCache()
+        self.fetch(cache, 'a', 'b', 'a')
+        self.assertEqual(2, self.layer.process_cacheable.call_count)
+        self.assertEqual((1, 2, 0),
+                         (cache.hits, cache.misses, cache.evictions))
+        self.assertEqual(3, self.layer.complete.call_count)
+
+    def test_eviction(self):
+        """The least recently used entries should be evicted once over
+        budget"""
+        cache = LayerCache('layer', 3 * builder.approximate_size([u'a']) + 3)
+        self.fetch(cache, 'a', 'b', 'c', 'a', 'd')
+        self.assertEqual(set(['a', 'c', 'd']), set(cache._cache))
+        self.assertEqual(1, cache.evictions)
+
+        self.fetch(cache, 'e', 'f')
+        self.assertEqual(set(['d', 'e', 'f']), set(cache._cache))
+        self.assertEqual(3, cache.evictions)
+        self.assertEqual(3 * (1 + builder.approximate_size([u'a'])),
+                         cache.size)
+
+    def test_unsaved(self):
+        """Only entries added (and not since evicted) are unsaved"""
+        cache = LayerCache('layer', 2 * builder.approximate_size([u'a']) + 2)
+        self.fetch(cache, 'a', 'b')
+        self.assertEqual({'a': ['a'], 'b': ['b']}, cache.unsaved())
+        self.fetch(cache, 'b', 'c', 'd', 'e')
+        self.assertEqual({'d': ['d'], 'e': ['e']}, cache.unsaved())
+        self.assertEqual({}, cache.unsaved())
+
+    def test_pickle(self):
+        """The order of use should survive being sent to another process"""
+        cache = LayerCache('layer', 3 * builder.approximate_size([u'a']) + 3)
+        self.fetch(cache, 'a', 'b', 'c', 'a')
+        cache = pickle.loads(pickle.dumps(cache))
+        self.fetch(cache, 'd')
+        self.assertEqual(set(['a', 'c', 'd']), set(cache._cache))
+
+    def test_record_stats(self):
+        cache = LayerCache('layer', 2 * builder.approximate_size([u'a']) + 2)
+        self.fetch(cache, 'a', 'a', 'b', 'c')
+        instrumentation.reset()
+        try:
+            cache.record_stats()
+            stages = instrumentation.report()['stages']
+            self.assertEqual(1, stages['layer_cache.hits']['count'])
+            self.assertEqual(3, stages['layer_cache.misses']['count'])
+            self.assertEqual(
+                1, stages['layer_cache.evictions']['items']['layer']['count'])
+            self.assertEqual((0, 0, 0),
+                             (cache.hits, cache.misses, cache.evictions))
+        finally:
+            instrumentation.reset()
@@ -0,0 +1,151 @@
+# vim: set encoding=utf-8
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from regparser.builder import LayerCacheAggregator
+from regparser.checkpoint import Checkpoint
+from regparser.layer import registry
+from regparser.layer.layer import build_layers
+from regparser.tree.struct import Node
+from regparser.tree.xml_parser import reg_text
+
+
+class CheckpointTests(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_save_load(self):
+        checkpoint = Checkpoint('1111', 'aaaa', self.path)
+        self.assertFalse(checkpoint.load())
+
+        checkpoint.mark_written(('notices',))
+        tree_a = Node('A', label=['1111'])
+        tree_b = Node('B', label=['1111'])
+        layer_cache = LayerCacheAggregator()
+        layer_cache.cache_for('graphics').update({'1111': ['value']})
+        checkpoint.save_version('aaaa', tree_a, layer_cache, 'key-a')
+        layer_cache.cache_for('graphics').update({'2222': ['other']})
+        checkpoint.save_version('bbbb', tree_b, layer_cache, 'key-b')
+
+        resumed = Checkpoint('1111', 'aaaa', self.path)
+        self.assertTrue(resumed.load())
+        self.assertEqual(['aaaa', 'bbbb'], resumed.versions)
+        self.assertEqual({'aaaa': 'key-a', 'bbbb': 'key-b'}, resumed.keys)
+        self.assertEqual(tree_a, resumed.tree('aaaa'))
+        self.assertEqual(tree_b, resumed.tree('bbbb'))
+        self.assertTrue(resumed.is_written(('notices',)))
+        self.assertTrue(resumed.is_written(('layers', 'bbbb')))
+        self.assertFalse(resumed.is_written(('layers', 'cccc')))
+
+        restored = LayerCacheAggregator.from_checkpoint(
+            resumed.cache_deltas())
+        self.assertEqual({'1111': ['value'], '2222': ['other']},
+                         restored.cache_for('graphics')._cache)
+
+        #   Separate builds don't share checkpoints
+        self.assertFalse(Checkpoint('1111', 'bbbb', self.path).load())
+        self.assertFalse(Checkpoint('2222', 'aaaa', self.path).load())
+
+    def test_save_deltas(self):
+        """Each version only writes the cached results which are new since
+        the last"""
+        checkpoint = Checkpoint('1111', 'aaaa', self.path)
+        layer_cache = LayerCacheAggregator()
+        layer_cache.cache_for('graphics').update({'1111': ['value']})
+        checkpoint.save_version('aaaa', Node(label=['1111']), layer_cache)
+        layer_cache.cache_for('graphics').update({'2222': ['other']})
+        checkpoint.save_version('bbbb', Node(label=['1111']), layer_cache)
+        checkpoint.save_version('cccc', Node(label=['1111']), layer_cache)
+
+        resumed = Checkpoint('1111', 'aaaa', self.path)
+        resumed.load()
+        self.assertEqual([{'graphics': {'1111': ['value']}},
+                          {'graphics': {'2222': ['other']}},
+                          {'graphics': {}}], list(resumed.cache_deltas()))
+
+        #   Restored results needn't be saved again
+        restored = LayerCacheAggregator.from_checkpoint(
+            resumed.cache_deltas())
+        self.assertEqual({'graphics': {}}, restored.checkpoint_delta())
+
+    def test_inputs_changed(self):
+        """A checkpoint built from other inputs is discarded"""
+        checkpoint = Checkpoint('1111', 'aaaa', self.path, 'inputs-a')
+        checkpoint.save_version('aaaa', Node(label=['1111']),
+                                LayerCacheAggregator())
+        self.assertTrue(
+            Checkpoint('1111', 'aaaa', self.path, 'inputs-a').load())
+        self.assertFalse(
+            Checkpoint('1111', 'aaaa', self.path, 'inputs-b').load())
+        self.assertEqual([], os.listdir(self.path))
+
+    def test_resume_xml_tree(self):
+        """Trees restored from a checkpoint can still be used to build
+        every layer, including those which read the source XML"""
+        tree = reg_text.build_tree(u"""
+            <CFRGRANULE>
+                <PART>
+                    <EAR>Pt. 1111</EAR>
+                    <HD SOURCE="HED">PART 1111—A REGULATION</HD>
+                    <SECTION>
+                        <SECTNO>§ 1111.1</SECTNO>
+                        <SUBJECT>General.</SUBJECT>
+                        <P>(a) Some content, see paragraph (b)</P>
+                        <P>(b) Other content</P>
+                    </SECTION>
+                    <APPENDIX>
+                        <EAR>Pt. 1111, App. A</EAR>
+                        <HD SOURCE="HED">Appendix A to Part 1111—Tables</HD>
+                        <GPOTABLE COLS="2">
+                            <BOXHD>
+                                <CHED H="1">One</CHED>
+                                <CHED H="1">Two</CHED>
+                            </BOXHD>
+                            <ROW><ENT>1</ENT><ENT>2</ENT></ROW>
+                        </GPOTABLE>
+                    </APPENDIX>
+                </PART>
+            </CFRGRANULE>""")
+
+        def layers(tree, layer_cache):
+            return build_layers(
+                tree, [spec.load()(tree, 12, 'aaaa')
+                       for spec in registry.LAYERS],
+                [layer_cache.cache_for(spec.ident) if spec.cacheable
+                 else None for spec in registry.LAYERS])
+
+        layer_cache = LayerCacheAggregator()
+        expected = layers(tree, layer_cache)
+        Checkpoint('1111', 'aaaa', self.path).save_version(
+            'aaaa', tree, layer_cache)
+
+        resumed = Checkpoint('1111', 'aaaa', self.path)
+        self.assertTrue(resumed.load())
+        restored = LayerCacheAggregator.from_checkpoint(
+            resumed.cache_deltas())
+        self.assertEqual(expected, layers(resumed.tree('aaaa'), restored))
+        self.assertEqual(expected, layers(resumed.tree('aaaa'),
+                                          LayerCacheAggregator()))
+
+    def test_clear(self):
+        checkpoint = Checkpoint('1111', 'aaaa', self.path)
+        checkpoint.save_version('aaaa', Node(label=['1111']),
+                                LayerCacheAggregator())
+        checkpoint.clear()
+        self.assertFalse(Checkpoint('1111', 'aaaa', self.path).load())
+        self.assertEqual([], os.listdir(self.path))
+
+    def test_disabled(self):
+        checkpoint = Checkpoint('1111', 'aaaa', '')
+        self.assertFalse(checkpoint.enabled())
+        checkpoint.save_version('aaaa', Node(label=['1111']),
+                                LayerCacheAggregator())
+        self.assertFalse(checkpoint.load())
+        #   Still tracked in memory
+        self.assertTrue(checkpoint.is_written(('regulation', 'aaaa')))
+        checkpoint.clear()
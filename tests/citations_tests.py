@@ -325,6 +325,24 @@ class CitationsTest(TestCase):
         citations = internal_citations(text, Label(part='100', section='4'))
         self.assertEqual(0, len(citations))
 
+    def test_citation_triggers(self):
+        text = u'See Comment 3(b)-1, §§ 1005.3 and .4 and appendix A-2'
+        triggers = citation_triggers(text)
+        self.assertEqual([4], triggers['comment'])
+        self.assertEqual([20, 21], triggers['section'])
+        self.assertEqual([12, 23, 24, 25, 26], triggers['digits'])
+        self.assertEqual([41], triggers['appendix'])
+        self.assertEqual([50], triggers['appendix_section'])
+        self.assertEqual([], triggers['paragraph'])
+
+    def test_internal_citations_tabs(self):
+        """As with scanString, positions are relative to the text once its
+        tabs have been expanded"""
+        citations = internal_citations(u'\tSee\tparagraph (b)(1)')
+        self.assertEqual(1, len(citations))
+        self.assertEqual(['b', '1'], citations[0].label.to_list())
+        self.assertEqual((25, 32), (citations[0].start, citations[0].end))
+
 
 class CitationsLabelTest(TestCase):
     def test_using_default_schema(self):
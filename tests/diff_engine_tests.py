@@ -0,0 +1,70 @@
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+
+from regparser.build_cache import BuildCache
+from regparser.diff import engine, treediff
+from regparser.tree.struct import Node
+
+
+class DiffEngineTests(TestCase):
+    def setUp(self):
+        self.versions = {
+            'v1': Node("Root", label=['1111'], children=[
+                Node("First version", label=['1111', '1'])]),
+            'v2': Node("Root", label=['1111'], children=[
+                Node("Second version", label=['1111', '1']),
+                Node("Added", label=['1111', '2'])]),
+            'v3': Node("Root changed", label=['1111'], children=[
+                Node("Added", label=['1111', '2'])])}
+
+    def expected(self):
+        """What the naive, all-pairs approach would generate"""
+        expected = {}
+        for lhs, lhs_tree in self.versions.items():
+            for rhs, rhs_tree in self.versions.items():
+                comparer = treediff.Compare(lhs_tree, rhs_tree)
+                comparer.compare()
+                expected[(lhs, rhs)] = comparer.changes
+        return expected
+
+    def test_version_pairs(self):
+        self.assertEqual([('v1', 'v2'), ('v1', 'v3'), ('v2', 'v3')],
+                         list(engine.version_pairs(self.versions)))
+
+    def test_diff_versions(self):
+        diffs = {}
+        for lhs, rhs, changes in engine.diff_versions(self.versions):
+            self.assertFalse((lhs, rhs) in diffs)
+            diffs[(lhs, rhs)] = changes
+        self.assertEqual(self.expected(), diffs)
+
+    def test_diff_versions_workers(self):
+        diffs = {}
+        for lhs, rhs, changes in engine.diff_versions(self.versions, 2):
+            self.assertFalse((lhs, rhs) in diffs)
+            diffs[(lhs, rhs)] = changes
+        self.assertEqual(self.expected(), diffs)
+
+    def test_diff_versions_single(self):
+        self.assertEqual(
+            [('v1', 'v1', {})],
+            list(engine.diff_versions({'v1': self.versions['v1']}, 4)))
+
+    def test_diff_versions_build_cache(self):
+        path = tempfile.mkdtemp()
+        keys = {'v1': 'k1', 'v2': 'k2', 'v3': 'k3'}
+        try:
+            with patch('regparser.diff.engine.BuildCache') as build_cache:
+                build_cache.return_value = BuildCache(path)
+                first = list(engine.diff_versions(self.versions, keys=keys))
+                with patch.object(engine, '_compare_pair') as compare_pair:
+                    second = list(engine.diff_versions(self.versions,
+                                                       keys=keys))
+                    self.assertFalse(compare_pair.called)
+            self.assertEqual(first, second)
+            self.assertEqual(9, len(second))
+        finally:
+            shutil.rmtree(path)
@@ -130,3 +130,66 @@ class TreeDiffTest(TestCase):
         self.assertEqual(comparer.changes['1111'],
             {'title': [[('delete', 0, 10), ('insert', 0, '')]],
              'op': 'modified'})
+
+    def test_symmetric_compare(self):
+        lhs = struct.Node("Root text", title="Some Title", label=['1111'],
+                          children=[
+                              struct.Node("I have a string to change",
+                                          label=['1111', '1']),
+                              struct.Node("Going away", label=['1111', '2'])])
+        rhs = struct.Node("Root text", title="Other Title", label=['1111'],
+                          children=[
+                              struct.Node("We have a string to change now",
+                                          label=['1111', '1']),
+                              struct.Node("New", label=['1111', '3'])])
+
+        comparer = treediff.SymmetricCompare(lhs, rhs)
+        comparer.compare()
+
+        forward = treediff.Compare(lhs, rhs)
+        forward.compare()
+        self.assertEqual(forward.changes, comparer.changes)
+
+        backward = treediff.Compare(rhs, lhs)
+        backward.compare()
+        self.assertEqual(backward.changes, comparer.reverse_changes)
+
+    def test_symmetric_compare_title_appears(self):
+        """Title changes are only included if the "older" node has a title;
+        that should hold in both directions"""
+        lhs = struct.Node("Text", title="Some Title", label=['1111'])
+        rhs = struct.Node("Text", title=None, label=['1111'])
+
+        comparer = treediff.SymmetricCompare(lhs, rhs)
+        comparer.compare()
+        self.assertEqual(comparer.changes['1111'],
+            {'title': [[('delete', 0, 10), ('insert', 0, '')]],
+             'op': 'modified'})
+        self.assertEqual(comparer.reverse_changes, {})
+
+    def test_reverse_word_opcodes(self):
+        old = treediff.deconstruct_text("I have a string to change")
+        new = treediff.deconstruct_text("We have a string")
+        opcodes = treediff.get_word_opcodes(old, new)
+        self.assertEqual(
+            [('replace', 0, 1, 0, 1), ('delete', 7, 11, 7, 7)], opcodes)
+        self.assertEqual(
+            [('replace', 0, 1, 0, 1), ('insert', 7, 7, 7, 11)],
+            treediff.reverse_word_opcodes(opcodes))
+
+    def test_compare_skips_identical_subtrees(self):
+        def tree(text):
+            return struct.Node("Root", label=['1111'], children=[
+                struct.Node(text, label=['1111', '1']),
+                struct.Node("Same", label=['1111', '2'], children=[
+                    struct.Node("Same child", label=['1111', '2', 'a'])])])
+        lhs, rhs = tree("Original"), tree("Changed")
+
+        visited = []
+        comparer = treediff.Compare(lhs, rhs)
+        original = comparer.deleted_and_modified
+        comparer.deleted_and_modified = lambda n: (
+            visited.append(n.label_id()), original(n))
+        comparer.compare()
+        self.assertEqual(['1111', '1111-1'], visited)
+        self.assertEqual(['1111-1'], comparer.changes.keys())
@@ -1,8 +1,11 @@
 from unittest import TestCase
 
-from mock import patch
+from mock import Mock, patch
 
+from regparser import federalregister
 from regparser.federalregister import *
+from regparser.notice import build as notice_build
+from regparser.notice.build import fetch_notice_xml, parse_notice_xml
 
 
 class FederalRegisterTest(TestCase):
@@ -22,3 +25,60 @@ class FederalRegisterTest(TestCase):
         self.assertTrue(1222 in params.values())
 
         self.assertEqual(['NOTICE!', 'NOTICE!'], notices)
+
+    @patch('regparser.notice.build.requests')
+    @patch('regparser.federalregister.requests')
+    def test_prefetch(self, fr_requests, notice_requests):
+        """Notices shared by multiple parts should only be fetched once"""
+        results = {
+            '1111': [{'full_text_xml_url': 'http://example.com/a.xml'},
+                     {'full_text_xml_url': 'http://example.com/b.xml'}],
+            '2222': [{'full_text_xml_url': 'http://example.com/b.xml'},
+                     {'full_text_xml_url': None}]}
+
+        def search(url, params):
+            response = Mock()
+            response.json.return_value = {
+                'results': results[params['conditions[cfr][part]']]}
+            return response
+        fr_requests.get.side_effect = search
+        notice_requests.get.side_effect = lambda url: Mock(
+            content='<ROOT><P>%s</P></ROOT>' % url)
+
+        with patch.dict('regparser.federalregister._prefetched_json'):
+            with patch.dict('regparser.notice.build._prefetched_xml'):
+                with patch.dict('regparser.notice.build._parsed_xml'):
+                    self.assertEqual(
+                        2, prefetch([(12, '1111'), (12, '2222')]))
+                    self.assertEqual(2, notice_requests.get.call_count)
+                    self.assertEqual(2, fr_requests.get.call_count)
+
+                    #   Subsequent lookups don't hit the network
+                    self.assertEqual(results['2222'],
+                                     fetch_notice_json(12, '2222'))
+                    b_xml = fetch_notice_xml('http://example.com/b.xml')
+                    self.assertEqual(
+                        '<ROOT><P>http://example.com/b.xml</P></ROOT>',
+                        b_xml)
+                    self.assertEqual(2, notice_requests.get.call_count)
+                    self.assertEqual(2, fr_requests.get.call_count)
+
+                    #   Only the notice modifying both parts is parsed
+                    a_xml = fetch_notice_xml('http://example.com/a.xml')
+                    self.assertTrue(parse_notice_xml(b_xml)
+                                    is parse_notice_xml(b_xml))
+                    self.assertFalse(parse_notice_xml(a_xml)
+                                     is parse_notice_xml(a_xml))
+
+    def test_clear_prefetched(self):
+        """Everything fetched ahead of time is forgotten"""
+        with patch.dict(federalregister._prefetched_json,
+                        {(12, '1111', True): []}):
+            with patch.dict(notice_build._prefetched_xml,
+                            {'http://example.com/a.xml': '<ROOT />'}):
+                with patch.dict(notice_build._parsed_xml,
+                                {'digest': 'parsed'}):
+                    clear_prefetched()
+                    self.assertEqual({}, federalregister._prefetched_json)
+                    self.assertEqual({}, notice_build._prefetched_xml)
+                    self.assertEqual({}, notice_build._parsed_xml)
@@ -0,0 +1,62 @@
+#vim: set encoding=utf-8
+from unittest import TestCase
+
+from pyparsing import Word
+
+from regparser import instrumentation
+from regparser.grammar import amdpar, delays, external_citations, terms
+from regparser.grammar.utils import CASELESS, Marker, scan, with_trigger
+
+
+class GrammarUtilsTests(TestCase):
+    def setUp(self):
+        instrumentation.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_scan(self):
+        grammar = with_trigger(Marker('exhibit') + Word('0123456789'),
+                               'exhibit', 'exhibit', CASELESS)
+        text = 'See Exhibit 3 and exhibit 4'
+        self.assertEqual(
+            [(['3'], 4, 13), (['4'], 18, 27)],
+            [(match.asList(), start, end)
+             for match, start, end in scan(grammar, text)])
+        self.assertEqual([], list(scan(grammar, 'See Chart 3')))
+
+    def test_scan_no_trigger(self):
+        grammar = Marker('exhibit') + Word('0123456789')
+        self.assertEqual(1, len(list(scan(grammar, 'See Exhibit 3'))))
+
+    def test_scan_counts(self):
+        grammar = with_trigger(Marker('exhibit'), 'exhibit', 'exhibit')
+        for text in ('exhibit', 'chart', 'chart'):
+            list(scan(grammar, text))
+        self.assertEqual({}, instrumentation.report()['stages'])
+
+        instrumentation.enable()
+        for text in ('exhibit', 'chart', 'chart'):
+            list(scan(grammar, text))
+        stages = instrumentation.report()['stages']
+        self.assertEqual(1, stages['grammar.scanned']['items']['exhibit'][
+            'count'])
+        self.assertEqual(2, stages['grammar.skipped']['items']['exhibit'][
+            'count'])
+
+    def test_triggers(self):
+        """Triggers should be present in text the grammars match, but
+        absent in plain text"""
+        plain = u'A paragraph (i.e. text) without much of interest'
+        for grammar, text in (
+                (external_citations.regtext_external_citation,
+                 u'See 12 CFR 1005.2'),
+                (terms.smart_quotes, u'“Act” means'),
+                (terms.scope_term_type_parser,
+                 u'For purposes of this part, Thing means'),
+                (delays.tokenizer, u'the effective date is delayed'),
+                (amdpar.subpart_label, u'1005-Subpart:A')):
+            self.assertTrue(list(grammar.scanString(text)))
+            self.assertTrue(grammar.trigger.search(text))
+            self.assertFalse(grammar.trigger.search(plain))
@@ -0,0 +1,112 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from regparser import instrumentation
+
+
+def _child_work(_):
+    with instrumentation.timed('child', 'item'):
+        pass
+    return instrumentation.collect()
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        instrumentation.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_timed_disabled(self):
+        with instrumentation.timed('stage'):
+            pass
+        self.assertEqual({}, instrumentation.report()['stages'])
+
+    def test_timed(self):
+        instrumentation.enable()
+        for item in ('a', 'b', 'a'):
+            with instrumentation.timed('stage', item):
+                with instrumentation.timed('nested'):
+                    pass
+        stages = instrumentation.report()['stages']
+        self.assertEqual(set(['stage', 'nested']), set(stages.keys()))
+        self.assertEqual(3, stages['stage']['count'])
+        self.assertEqual(2, stages['stage']['items']['a']['count'])
+        self.assertEqual(1, stages['stage']['items']['b']['count'])
+        self.assertEqual({}, stages['nested']['items'])
+        self.assertTrue(stages['stage']['wall'] >= stages['nested']['wall'])
+
+    def test_timed_exception(self):
+        instrumentation.enable()
+
+        def fail():
+            with instrumentation.timed('stage'):
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(
+            1, instrumentation.report()['stages']['stage']['count'])
+
+    def test_collect_merge(self):
+        instrumentation.enable()
+        with instrumentation.timed('stage', 'a'):
+            pass
+        collected = instrumentation.collect()
+        self.assertEqual({}, instrumentation.report()['stages'])
+        self.assertEqual(None, instrumentation.collect())
+
+        instrumentation.merge(collected)
+        instrumentation.merge(collected)
+        stage = instrumentation.report()['stages']['stage']
+        self.assertEqual(2, stage['count'])
+        self.assertEqual(2, stage['items']['a']['count'])
+
+    def test_other_processes(self):
+        """Results recorded in child processes are merged back"""
+        instrumentation.enable()
+        with instrumentation.timed('parent'):
+            pass
+        pool = multiprocessing.Pool(2)
+        try:
+            for collected in pool.map(_child_work, range(3)):
+                instrumentation.merge(collected)
+        finally:
+            pool.close()
+            pool.join()
+        stages = instrumentation.report()['stages']
+        self.assertEqual(1, stages['parent']['count'])
+        self.assertEqual(3, stages['child']['count'])
+        self.assertEqual(3, stages['child']['items']['item']['count'])
+
+    def test_write_report_profile(self):
+        instrumentation.enable(profile=True)
+        with instrumentation.timed('outer'):
+            sorted(range(10))
+            with instrumentation.timed('inner'):
+                sum(range(10))
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            report_path = os.path.join(tmp_dir, 'timing.json')
+            profile_dir = os.path.join(tmp_dir, 'profiles')
+            instrumentation.write_report(report_path, profile_dir)
+            with open(report_path) as f:
+                report = json.load(f)
+            self.assertEqual(set(['outer', 'inner']),
+                             set(report['stages'].keys()))
+            self.assertEqual(os.path.join(profile_dir, 'inner.prof'),
+                             report['stages']['inner']['profile'])
+            self.assertEqual(
+                sorted(['inner.prof', 'inner.txt', 'outer.prof',
+                        'outer.txt']),
+                sorted(os.listdir(profile_dir)))
+            #   Nested stages are profiled separately
+            with open(os.path.join(profile_dir, 'outer.txt')) as f:
+                outer = f.read()
+            self.assertTrue('sorted' in outer)
+            self.assertFalse('sum' in outer)
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,84 @@
+import random
+from unittest import TestCase
+
+from regparser.intervals import IntervalSet, properly_contained
+
+
+class IntervalSetTests(TestCase):
+    def test_init(self):
+        """Overlapping and touching intervals are merged"""
+        intervals = IntervalSet([(10, 12), (1, 3), (3, 5), (11, 15), (7, 7)])
+        self.assertEqual([(1, 5), (7, 7), (10, 15)], list(intervals))
+        self.assertEqual(3, len(intervals))
+
+    def test_add(self):
+        intervals = IntervalSet()
+        intervals.add(10, 12)
+        intervals.add(1, 3)
+        self.assertEqual([(1, 3), (10, 12)], list(intervals))
+        intervals.add(5, 6)
+        self.assertEqual([(1, 3), (5, 6), (10, 12)], list(intervals))
+        intervals.add(3, 10)
+        self.assertEqual([(1, 12)], list(intervals))
+        intervals.add(2, 4)
+        self.assertEqual([(1, 12)], list(intervals))
+
+    def test_covers(self):
+        intervals = IntervalSet([(3, 5), (8, 8)])
+        self.assertEqual([3, 4, 5, 8], [point for point in range(10)
+                                        if intervals.covers(point)])
+
+    def test_overlaps(self):
+        intervals = IntervalSet([(3, 5), (8, 8)])
+        self.assertTrue(intervals.overlaps(0, 3))
+        self.assertTrue(intervals.overlaps(5, 6))
+        self.assertTrue(intervals.overlaps(4, 4))
+        self.assertTrue(intervals.overlaps(0, 20))
+        self.assertTrue(intervals.overlaps(7, 9))
+        self.assertFalse(intervals.overlaps(0, 2))
+        self.assertFalse(intervals.overlaps(6, 7))
+        self.assertFalse(intervals.overlaps(9, 20))
+        self.assertFalse(IntervalSet().overlaps(0, 20))
+
+    def test_like_any(self):
+        """Answers should match those of testing each interval in turn"""
+        rand = random.Random(0)
+
+        def interval():
+            start = rand.randint(0, 40)
+            return (start, start + rand.randint(0, 6))
+
+        for _ in range(500):
+            added = [interval() for _ in range(rand.randint(0, 10))]
+            intervals = IntervalSet(added[:3])
+            for start, end in added[3:]:
+                intervals.add(start, end)
+            for point in range(50):
+                self.assertEqual(
+                    any(s <= point <= e for s, e in added),
+                    intervals.covers(point))
+            for start, end in [interval() for _ in range(20)]:
+                self.assertEqual(
+                    any(s <= end and start <= e for s, e in added),
+                    intervals.overlaps(start, end))
+
+
+class ProperlyContainedTests(TestCase):
+    def test_properly_contained(self):
+        intervals = [(0, 10), (2, 4), (0, 10), (0, 3), (8, 10), (9, 12),
+                     (12, 15)]
+        self.assertEqual(set([(2, 4), (0, 3), (8, 10)]),
+                         properly_contained(intervals))
+
+    def test_like_any(self):
+        rand = random.Random(0)
+        for _ in range(500):
+            intervals = []
+            for _ in range(rand.randint(0, 10)):
+                start = rand.randint(0, 20)
+                intervals.append((start, start + rand.randint(0, 6)))
+            expected = set(
+                (start, end) for start, end in intervals
+                if any(s <= start and end <= e and (s, e) != (start, end)
+                       for s, e in intervals))
+            self.assertEqual(expected, properly_contained(intervals))
@@ -101,6 +101,29 @@ class LayerFormattingTests(TestCase):
              ['21', '22', '23'],
              ['', '32', '33 More', '34']])
 
+    def test_cache_context(self):
+        """Only tables are serialized for the cache key"""
+        formatting_layer = formatting.Formatting(None)
+        plain = Node("Text", source_xml=etree.fromstring("<P>Text</P>"))
+        other = Node("Text", source_xml=etree.fromstring("<P>Other</P>"))
+        self.assertEqual(formatting_layer.cache_key(plain),
+                         formatting_layer.cache_key(other))
+        self.assertEqual([], formatting_layer.cache_context(plain))
+
+        table_xml = """
+            <GPOTABLE>
+                <BOXHD><CHED H="1">%s</CHED></BOXHD>
+                <ROW><ENT>1</ENT></ROW>
+            </GPOTABLE>"""
+        table = Node("Table", source_xml=etree.fromstring(table_xml % 'A'))
+        nested = Node("Table", source_xml=etree.fromstring(
+            "<P>Text" + (table_xml % 'A') + "</P>"))
+        changed = Node("Table", source_xml=etree.fromstring(table_xml % 'B'))
+        self.assertEqual(formatting_layer.cache_context(table),
+                         formatting_layer.cache_context(nested))
+        self.assertNotEqual(formatting_layer.cache_key(table),
+                            formatting_layer.cache_key(changed))
+
     def test_process_fenced(self):
         node = Node("Content content\n```abc def\nLine 1\nLine 2\n```")
         result = formatting.Formatting(None).process(node)
@@ -132,3 +132,19 @@ class LayerInterpretationTest(TestCase):
         self.assertEqual(interp.process(node),
                          [{'reference': '1111-G_H-Interp'},
                           {'reference': '1111-G-Interp'}])
+
+    def test_cache_key(self):
+        """The key should change when an interpretation is added, even if
+        the paragraph itself is unchanged"""
+        paragraph = Node("Text", label=['102', '11', 'a'])
+        root = Node(label=['102'], children=[paragraph])
+        interp = Interpretations(root)
+        interp.pre_process()
+        before = interp.cache_key(paragraph)
+
+        root.children.append(Node("Interp11a",
+                                  label=['102', '11', 'a', Node.INTERP_MARK],
+                                  node_type=Node.INTERP))
+        interp = Interpretations(root)
+        interp.pre_process()
+        self.assertNotEqual(before, interp.cache_key(paragraph))
@@ -1,7 +1,9 @@
 from unittest import TestCase
 
+from mock import call, Mock, patch
+
 from regparser.layer.layer import *
-from regparser.tree.struct import Node
+from regparser.tree.struct import Node, pre_order
 
 class ExampleLayer(Layer):
     pass
@@ -16,3 +18,126 @@ class LayerLayerTest(TestCase):
     def test_process(self):
         el = ExampleLayer(Node("other text"))
         self.assertEqual(NotImplemented, el.process(Node("oo")))
+
+    def test_cache_key(self):
+        el = ExampleLayer(Node("other text"))
+        key = el.cache_key(Node("text", label=['1', '2']))
+        self.assertEqual(key, el.cache_key(Node("text", label=['1', '2'])))
+        self.assertNotEqual(key, el.cache_key(Node("text", label=['1', '3'])))
+        self.assertNotEqual(key, el.cache_key(Node("txt", label=['1', '2'])))
+        tagged = Node("text", label=['1', '2'])
+        tagged.tagged_text = "<E T='03'>text</E>"
+        self.assertNotEqual(key, el.cache_key(tagged))
+
+
+class CountingLayer(Layer):
+    def __init__(self, *args, **kwargs):
+        Layer.__init__(self, *args, **kwargs)
+        self.pre_processed = []
+
+    def pre_process_node(self, node):
+        self.pre_processed.append(node.label_id())
+
+    def process(self, node):
+        return [len(self.pre_processed)]
+
+
+class BuildLayersTest(TestCase):
+    def test_build_layers(self):
+        """Every layer should see every node, pre-processing should finish
+        before processing begins and the tree should be traversed once
+        for each"""
+        tree = Node(label=['1'], children=[
+            Node(label=['1', '1'], children=[Node(label=['1', '1', 'a'])]),
+            Node(label=['1', '2'])])
+        layers = [CountingLayer(tree), CountingLayer(tree)]
+        with patch('regparser.layer.layer.struct.pre_order',
+                   wraps=pre_order) as traversals:
+            results = build_layers(tree, layers)
+            self.assertEqual(2, traversals.call_count)
+        for layer, result in zip(layers, results):
+            self.assertEqual(['1', '1-1', '1-1-a', '1-2'],
+                             layer.pre_processed)
+            self.assertEqual({'1': [4], '1-1': [4], '1-1-a': [4],
+                              '1-2': [4]}, result)
+
+    def test_build_layers_pre_process_override(self):
+        """Layers which override pre_process itself still have it called
+        (once), before any layer processes a node"""
+        class WholeTreeLayer(Layer):
+            def pre_process(self):
+                self.labels = [n.label_id() for n in pre_order(self.tree)]
+
+            def process(self, node):
+                return [len(self.labels)]
+
+        tree = Node(label=['1'], children=[Node(label=['1', '1'])])
+        layers = [WholeTreeLayer(tree), CountingLayer(tree)]
+        with patch.object(WholeTreeLayer, 'finish_pre_process') as finish:
+            results = build_layers(tree, layers)
+            self.assertFalse(finish.called)
+        self.assertEqual(['1', '1-1'], layers[0].labels)
+        self.assertEqual({'1': [2], '1-1': [2]}, results[0])
+        self.assertEqual({'1': [2], '1-1': [2]}, results[1])
+
+    def test_build_layers_deep(self):
+        """Deep trees shouldn't hit the recursion limit"""
+        root = node = Node(label=['1'])
+        for idx in range(5000):
+            node.children = [Node(label=['1', str(idx)])]
+            node = node.children[0]
+        layer = CountingLayer(root)
+        self.assertEqual(5001, len(layer.build()))
+
+    def test_builder(self):
+        """builder processes a node and everything beneath it"""
+        tree = Node(label=['1'], children=[
+            Node(label=['1', '1'], children=[Node(label=['1', '1', 'a'])]),
+            Node(label=['1', '2'])])
+        layer = CountingLayer(tree)
+        layer.builder(tree.children[0])
+        self.assertEqual({'1-1': [0], '1-1-a': [0]}, layer.layer)
+
+    def test_build_layers_builder_override(self):
+        """Layers which override builder have it called in place of the
+        shared traversal, whether or not the layers are streamed"""
+        class SelectiveLayer(CountingLayer):
+            def builder(self, node, cache=None):
+                self.layer[node.label_id()] = ['root only']
+
+        tree = Node(label=['1'], children=[Node(label=['1', '1'])])
+        layers = [SelectiveLayer(tree), CountingLayer(tree)]
+        results = build_layers(tree, layers)
+        self.assertEqual({'1': ['root only']}, results[0])
+        self.assertEqual({'1': [2], '1-1': [2]}, results[1])
+        self.assertEqual({'1': ['root only']},
+                         SelectiveLayer(tree).build())
+
+        streams = [Mock(), Mock()]
+        build_layers(tree, [SelectiveLayer(tree), CountingLayer(tree)],
+                     streams=streams)
+        self.assertEqual([call('1', ['root only'])],
+                         streams[0].add.call_args_list)
+        self.assertEqual([call('1', [2]), call('1-1', [2])],
+                         streams[1].add.call_args_list)
+
+    def test_build_layers_stream_pending(self):
+        """Entries added during pre-processing are streamed exactly as
+        they're collected, including for labels which are also processed"""
+        class PrePopulatedLayer(Layer):
+            def finish_pre_process(self):
+                self.layer['1'] = ['pre-processed']
+                self.layer['1-1'] = ['pre-processed']
+
+            def process(self, node):
+                if node.label_id() == '1':
+                    return ['processed']
+
+        tree = Node(label=['1'], children=[Node(label=['1', '1'])])
+        collected = build_layers(tree, [PrePopulatedLayer(tree)])[0]
+        stream = Mock()
+        build_layers(tree, [PrePopulatedLayer(tree)], streams=[stream])
+        streamed = [c[0] for c in stream.add.call_args_list]
+        self.assertEqual(sorted(collected.items()), streamed)
+        self.assertEqual({'1': ['processed'], '1-1': ['pre-processed']},
+                         collected)
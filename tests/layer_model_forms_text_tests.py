@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from regparser.builder import LayerCache
+from regparser.layer.model_forms_text import ModelFormText
+from regparser.tree.struct import Node, pre_order
+
+
+class ModelFormTextTests(TestCase):
+    def test_build(self):
+        """Paragraphs within a model forms section are marked, as the
+        sections are found while pre-processing"""
+        form = Node("Name of creditor here", label=['1000', 'A', '1', 'a'])
+        tree = Node(label=['1000'], children=[
+            Node("Some text", label=['1000', '1']),
+            Node(label=['1000', 'A'], title='Appendix A', children=[
+                Node(label=['1000', 'A', '1'], title='A-1 Model Forms',
+                     children=[form]),
+                Node("Other text", label=['1000', 'A', '2'],
+                     title='A-2 Other')])])
+        for node in pre_order(tree):
+            node.tagged_text = node.text
+        layer = ModelFormText(tree)
+        result = layer.build()
+        self.assertEqual(['1000-A-1-a'], result.keys())
+        self.assertEqual([{'start_word': 'Name', 'start_locations': [0],
+                           'end_word': 'here', 'end_locations': [0]}],
+                         result['1000-A-1-a'])
+        self.assertEqual(['1000-A-1'], layer.model_forms_sections)
+
+    def test_build_cached(self):
+        """The paragraph marker is removed from the text, so paragraphs
+        with the same text but different markers can't share results"""
+        tree = Node(label=['1000'], children=[
+            Node(label=['1000', 'A'], title='Appendix A', children=[
+                Node(label=['1000', 'A', '1'], title='A-1 Model Forms',
+                     children=[
+                         Node("(a) Pay (b) now",
+                              label=['1000', 'A', '1', 'a']),
+                         Node("(a) Pay (b) now",
+                              label=['1000', 'A', '1', 'b'])])])])
+        for node in pre_order(tree):
+            node.tagged_text = node.text
+        expected = ModelFormText(tree).build()
+        self.assertNotEqual(expected['1000-A-1-a'], expected['1000-A-1-b'])
+        self.assertEqual(expected,
+                         ModelFormText(tree).build(LayerCache()))
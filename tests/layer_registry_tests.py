@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+from regparser.layer import registry
+from regparser.layer.registry import LayerSpec
+from regparser.layer.terms import Terms
+
+
+class LayerRegistryTest(TestCase):
+    def setUp(self):
+        self.layers = (LayerSpec('a', 'a.A'),
+                       LayerSpec('b', 'b.B', depends_on=['a']),
+                       LayerSpec('c', 'c.C', depends_on=['b']),
+                       LayerSpec('d', 'd.D'))
+
+    def idents(self, specs):
+        return [spec.ident for spec in specs]
+
+    def test_select(self):
+        self.assertEqual(['a', 'b', 'c', 'd'], self.idents(
+            registry.select(layers=self.layers)))
+        self.assertEqual(['d'], self.idents(
+            registry.select(['d'], layers=self.layers)))
+        self.assertEqual(['a', 'b', 'd'], self.idents(
+            registry.select(exclude=['c'], layers=self.layers)))
+
+    def test_select_dependencies(self):
+        """Dependencies (and their dependencies) are included, in registry
+        order"""
+        self.assertEqual(['a', 'b', 'c', 'd'], self.idents(
+            registry.select(['d', 'c'], layers=self.layers)))
+        self.assertEqual(['a', 'b', 'c'], self.idents(
+            registry.select(exclude=['d', 'a'], layers=self.layers)))
+
+    def test_select_unknown(self):
+        self.assertRaises(ValueError, registry.select, ['e'],
+                          layers=self.layers)
+        self.assertRaises(ValueError, registry.select, None, ['e'],
+                          layers=self.layers)
+
+    def test_load(self):
+        spec = [s for s in registry.LAYERS if s.ident == 'terms'][0]
+        self.assertEqual(Terms, spec.load())
+
+    def test_registry(self):
+        """Every layer can be loaded and each depends only on known
+        layers"""
+        idents = self.idents(registry.LAYERS)
+        self.assertEqual(len(idents), len(set(idents)))
+        for spec in registry.LAYERS:
+            self.assertTrue(hasattr(spec.load(), 'build'))
+            for ident in spec.depends_on:
+                self.assertTrue(ident in idents)
+
+    def test_parse_idents(self):
+        self.assertEqual(None, registry.parse_idents(None))
+        self.assertEqual(['terms', 'graphics'],
+                         registry.parse_idents('terms, graphics,'))
@@ -144,3 +144,21 @@ class LayerSectionBySectionTest(TestCase):
              "publication_date": "2010-10-10",
              "fr_volume": 22,
              "fr_page": 7676}])
+
+    def test_cache_key(self):
+        """Analyses depend on every notice, so a new notice should change
+        each node's key"""
+        notice = {
+            "document_number": "111-22",
+            "fr_volume": 22,
+            'publication_date': '2008-08-08',
+            "section_by_section": []}
+        node = Node(label=['100', '22'])
+        s = SectionBySection(None, notices=[notice])
+        s.pre_process()
+        before = s.cache_key(node)
+
+        s = SectionBySection(None, notices=[notice, dict(
+            notice, document_number='111-23')])
+        s.pre_process()
+        self.assertNotEqual(before, s.cache_key(node))
@@ -1,4 +1,7 @@
 # vim: set fileencoding=utf-8
+from mock import patch
+
+from regparser.builder import LayerCache
 from regparser.layer.terms import ParentStack, Ref, Terms
 from regparser.tree.struct import Node
 import settings
@@ -63,6 +66,31 @@ class LayerTermTest(TestCase):
         stack.add(1, Node("(a) The term Bob refers to"))
         self.assertTrue(t.has_parent_definitions_indicator(stack))
 
+    def test_has_parent_definitions_indicator_memoized(self):
+        """Each node in the lineage is checked only once, however many
+        descendants it has"""
+        t = Terms(None)
+        stack = ParentStack()
+        stack.add(0, Node("Root"))
+        stack.add(1, Node("Section"))
+        with patch.object(Terms, 'definitions_indicator',
+                          wraps=Terms.definitions_indicator) as indicator:
+            for idx in range(5):
+                stack.add(2, Node("Paragraph %d" % idx))
+                self.assertFalse(t.has_parent_definitions_indicator(stack))
+            self.assertEqual(7, indicator.call_count)
+
+    def test_parent_stack_memoized(self):
+        """Values are forgotten once their node leaves the stack"""
+        stack = ParentStack()
+        node = Node("Text")
+        stack.add(0, node)
+        self.assertEqual(4, stack.memoized(node, 'length',
+                                           lambda n: len(n.text)))
+        self.assertEqual(4, stack.memoized(node, 'length', None))
+        stack.pop()
+        self.assertEqual(0, stack.memoized(node, 'length', lambda n: 0))
+
     def test_is_exclusion(self):
         t = Terms(None)
         n = Node('ex ex ex', label=['1111', '2'])
@@ -426,6 +454,54 @@ class LayerTermTest(TestCase):
         self.assertEqual(len(t.scoped_terms[('1212', '22')]), 1)
         self.assertEqual('1212-22-a', t.scoped_terms[('1212', '22')][0].label)
 
+    def definitions_tree(self, scope_text="For the purposes of this part"):
+        return Node(label=['88'], children=[
+            Node(scope_text, label=['88', '1'], children=[
+                Node(u"“Abc” means something", label=['88', '1', 'a']),
+                Node(u"“Def” means something", label=['88', '1', 'b'])]),
+            Node(u"“Ghi” means something", label=['88', '2'])])
+
+    def test_pre_process_cached(self):
+        """Definitions found in unchanged nodes (with unchanged lineage) are
+        carried over between versions via the cache"""
+        cache = LayerCache('terms')
+        t = Terms(self.definitions_tree())
+        t.build(cache)
+        expected = dict(t.scoped_terms)
+
+        t = Terms(self.definitions_tree())
+        with patch.object(Terms, 'definition_candidates') as candidates:
+            t.build(cache)
+            self.assertFalse(candidates.called)
+        self.assertEqual(expected, dict(t.scoped_terms))
+
+        #   The parent's text changed, so its children are re-scanned, too
+        t = Terms(self.definitions_tree("For the purposes of this section"))
+        with patch.object(Terms, 'definition_candidates',
+                          wraps=t.definition_candidates) as candidates:
+            t.build(cache)
+            self.assertEqual(3, candidates.call_count)
+        self.assertEqual(2, len(t.scoped_terms[('88', '1')]))
+
+    @patch('regparser.layer.terms.logging')
+    def test_pre_process_verify(self, logging):
+        """In verification mode, nodes are re-scanned, replacing (and
+        logging) any results which differ from those cached"""
+        cache = LayerCache('terms')
+        Terms(self.definitions_tree()).build(cache)
+        for key in cache._cache:
+            if key.startswith('definitions:'):
+                cache._cache[key] = ([], None)
+
+        settings.VERIFY_DEFINITIONS = True
+        try:
+            t = Terms(self.definitions_tree())
+            t.build(cache)
+        finally:
+            settings.VERIFY_DEFINITIONS = False
+        self.assertTrue(logging.warning.called)
+        self.assertEqual(3, len(t.scoped_terms[('88',)]))
+
     def test_excluded_offsets(self):
         t = Terms(None)
         t.scoped_terms['_'] = [
@@ -453,11 +529,36 @@ class LayerTermTest(TestCase):
 
         settings.IGNORE_DEFINITIONS_IN['ALL'] = ['bourgeois pig']
         settings.IGNORE_DEFINITIONS_IN['12'] = ['consumer price index']
-        exclusions = [(0, 4)]
-        excluded = t.per_regulation_ignores(
-            exclusions, ['12', '2'], 'There is a consumer price index')
-        self.assertEqual([(0, 4), (11, 31)], excluded)
-        
+        excluded = t.excluded_offsets(
+            '12-2', 'There is a consumer price index', cfr_part='12')
+        self.assertEqual([(11, 31)], excluded)
+
+    def test_excluded_offsets_cfr_part(self):
+        """Phrases ignored globally and within the part are found in the
+        same pass, even if they overlap"""
+        t = Terms(None)
+        settings.IGNORE_DEFINITIONS_IN['ALL'] = ['price index', 'pig']
+        settings.IGNORE_DEFINITIONS_IN['12'] = ['consumer price']
+        text = 'There is a consumer price index'
+        self.assertEqual([(20, 31)], t.excluded_offsets('12-2', text))
+        self.assertEqual([(20, 31), (11, 25)],
+                         t.excluded_offsets('12-2', text, cfr_part='12'))
+        self.assertEqual([(20, 31)],
+                         t.excluded_offsets('13-2', text, cfr_part='13'))
+
+    def test_definition_positions(self):
+        """Pre-processing indexes where definitions are, by label. Each
+        definition applies to both the regulation and its interpretations"""
+        t = Terms(Node(label=['88'], children=[
+            Node(u'For purposes of this part, “Abc” means something. '
+                 + u'“Def” means something else.', label=['88', '1'])]))
+        settings.IGNORE_DEFINITIONS_IN['ALL'] = ['else']
+        t.pre_process()
+        self.assertEqual({'88-1': [(28, 31), (51, 54)] * 2},
+                         dict(t.definition_positions))
+        self.assertEqual([(28, 31), (51, 54)] * 2 + [(72, 76)],
+                         t.excluded_offsets('88-1', t.tree.children[0].text))
+
     def test_excluded_offsets_blacklist_word_boundaries(self):
         t = Terms(None)
         t.scoped_terms['_'] = [Ref('act', '28-6-d', 'Def def def')]
@@ -548,6 +649,17 @@ class LayerTermTest(TestCase):
             [('act', 'a', [(29, 32)])],
             t.calculate_offsets(text, applicable_terms, [(1, 5)]))
 
+    def test_calculate_offsets_shared_matcher(self):
+        """Nodes with the same applicable terms should share a matcher"""
+        t = Terms(None)
+        t.calculate_offsets('a rock band', [('rock band', 'a')])
+        t.calculate_offsets('rock bands', [('rock band', 'b')])
+        self.assertEqual(1, len(t.matchers))
+        self.assertEqual(
+            [('band', 'c', [(0, 4)])],
+            t.calculate_offsets('band', [('band', 'c'), ('rock band', 'a')]))
+        self.assertEqual(2, len(t.matchers))
+
     def test_process(self):
         t = Terms(Node(children=[
             Node("ABC5", children=[Node("child")], label=['ref1']),
@@ -601,3 +713,35 @@ class LayerTermTest(TestCase):
         #   Term is defined in the first child
         self.assertEqual([], t.process(tree.children[0]))
         self.assertEqual(1, len(t.process(tree.children[1])))
+
+    def test_cache_key(self):
+        """Only nodes within the scope of a new definition should need to
+        be reprocessed"""
+        in_scope = Node("Has secret phrase", label=['AB', '2', 'a'])
+        out_of_scope = Node("Has secret phrase", label=['AB', '3', 'a'])
+        t = Terms(None)
+        t.scoped_terms = {('AB',): [Ref("phrase", "AB-1-a", (9, 15))]}
+        before = t.cache_key(in_scope), t.cache_key(out_of_scope)
+
+        t.scoped_terms[('AB', '2')] = [
+            Ref("secret phrase", "AB-2-b", (4, 17))]
+        self.assertNotEqual(before[0], t.cache_key(in_scope))
+        self.assertEqual(before[1], t.cache_key(out_of_scope))
+
+        #   As are nodes whose own definitions change, even if the
+        #   definitions which apply to them don't
+        applicable = t.cache_context(out_of_scope)[1]
+        t.scoped_terms['EXCLUDED'] = [Ref("secret", "AB-3-a", (4, 10))]
+        self.assertEqual(applicable, t.cache_context(out_of_scope)[1])
+        self.assertNotEqual(before[1], t.cache_key(out_of_scope))
+
+    @patch.object(Terms, 'excluded_offsets')
+    def test_cache_key_no_scan(self, excluded_offsets):
+        """The text is part of the key, so building the key needn't look
+        for ignored phrases within it"""
+        t = Terms(None)
+        t.scoped_terms = {('AB',): [Ref("phrase", "AB-1-a", (9, 15))]}
+        node = Node("Has secret phrase", label=['AB', '1', 'a'])
+        self.assertEqual([node.label, [('phrase', 'AB-1-a', (9, 15))],
+                          [(9, 15)]], t.cache_context(node))
+        self.assertFalse(excluded_offsets.called)
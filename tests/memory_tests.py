@@ -0,0 +1,77 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+
+from regparser import memory
+from regparser.builder import LayerCacheAggregator
+from regparser.tree.struct import Node
+
+
+class MemoryTests(TestCase):
+    def test_node_count(self):
+        tree = Node(label=['1'], children=[
+            Node(label=['1', 'a'], children=[Node(label=['1', 'a', '1'])]),
+            Node(label=['1', 'b'])])
+        self.assertEqual(4, memory.node_count(tree))
+
+    def test_approximate_size(self):
+        text = 'x' * 1000
+        tree = Node(text, label=['1'])
+        size = memory.approximate_size(tree)
+        self.assertTrue(size > sys.getsizeof(text))
+        #   Shared references are only counted once
+        self.assertTrue(memory.approximate_size([tree, tree]) < 2 * size)
+        seen = set()
+        memory.approximate_size(tree, seen)
+        self.assertEqual(0, memory.approximate_size(tree, seen))
+
+    def test_peak_rss(self):
+        self.assertTrue(memory.peak_rss() > 0)
+
+    def test_report(self):
+        report = memory.MemoryReport(top=3)
+        layer_cache = LayerCacheAggregator()
+        layer_cache.cache_for('graphics').update({'1': ['value']})
+        trees = {'v1': Node('First', label=['1'])}
+        first = report.record('v1', trees, layer_cache, [{'some': 'notice'}])
+        trees['v2'] = Node('Second', label=['1'],
+                           children=[Node('Child', label=['1', 'a'])])
+        second = report.record('v2', trees, layer_cache,
+                               [{'some': 'notice'}])
+
+        self.assertEqual(1, first['nodes'])
+        self.assertEqual(2, second['nodes'])
+        self.assertEqual(first['tree_bytes'] + second['tree_bytes'],
+                         second['all_trees_bytes'])
+        self.assertTrue(second['layer_cache_bytes'] > 0)
+        self.assertEqual(first['notices_bytes'], second['notices_bytes'])
+        allocations = second.get('top_allocations', second.get('top_types'))
+        self.assertEqual(3, len(allocations))
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'memory.json')
+            report.write(path)
+            with open(path) as f:
+                self.assertEqual(['v1', 'v2'], [v['version'] for v in
+                                                json.load(f)['versions']])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_report_shared_structure(self):
+        """Structure shared between versions' trees is only counted once,
+        for the first version which holds it"""
+        report = memory.MemoryReport(top=1)
+        child = Node('x' * 1000, label=['1', 'a'])
+        trees = {'v1': Node('First', label=['1'], children=[child])}
+        first = report.record('v1', trees, LayerCacheAggregator(), [])
+        trees['v2'] = Node('Second', label=['1'], children=[child])
+        second = report.record('v2', trees, LayerCacheAggregator(), [])
+
+        #   The shared child (and its text) only counts towards v1
+        self.assertTrue(second['tree_bytes'] < first['tree_bytes'] - 1000)
+        self.assertEqual(first['tree_bytes'] + second['tree_bytes'],
+                         second['all_trees_bytes'])
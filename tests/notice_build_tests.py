@@ -1,10 +1,12 @@
 #vim: set encoding=utf-8
+from copy import deepcopy
 import os
 import shutil
 import tempfile
 from unittest import TestCase
 
 from lxml import etree
+from mock import patch
 
 from regparser.notice import build, changes
 from regparser.notice.diff import DesignateAmendment, Amendment
@@ -158,6 +160,49 @@ class NoticeBuildTest(TestCase):
         # Uses the date found in the XML
         self.assertEqual('2002-01-01', notice['effective_on'])
 
+    def test_process_xml_dates_only_if_needed(self):
+        """As before notices could be shared, dates are only pulled from
+        the XML if the notice has no effective date"""
+        xml = etree.fromstring("""
+        <ROOT>
+            <DATES>
+                <P>Effective January 1, 2002</P>
+            </DATES>
+        </ROOT>""")
+        with patch.object(build, 'fetch_dates') as fetch_dates:
+            build.process_xml({'cfr_part': '902', 'meta': {'start_page': 10},
+                               'effective_on': '2002-02-02'}, xml)
+            self.assertFalse(fetch_dates.called)
+
+    def test_process_xml_order(self):
+        """The section-by-section analysis, then amendments, then footnotes
+        are processed, all within the same XML"""
+        xml = etree.fromstring("""
+        <ROOT>
+            <FTNT>
+                <P><SU>1</SU>A footnote</P>
+            </FTNT>
+        </ROOT>""")
+        calls = []
+
+        def record(name, fn):
+            def wrapped(notice, notice_xml, *args):
+                calls.append((name, notice_xml))
+                return fn(notice, notice_xml, *args)
+            return wrapped
+
+        with patch.object(build, 'process_sxs',
+                          record('sxs', build.process_sxs)):
+            with patch.object(build, 'process_amendments',
+                              record('amendments', build.process_amendments)):
+                with patch.object(build, 'add_footnotes',
+                                  record('footnotes', build.add_footnotes)):
+                    notice = build.process_xml(
+                        {'cfr_part': '902', 'meta': {'start_page': 10}}, xml)
+        self.assertEqual([('sxs', xml), ('amendments', xml),
+                          ('footnotes', xml)], calls)
+        self.assertEqual({'1': 'A footnote'}, notice['footnotes'])
+
     def test_add_footnotes(self):
         xml = """
         <ROOT>
@@ -571,6 +616,70 @@ class NoticeBuildTest(TestCase):
         self.assertEqual('PUT', change['action'])
         self.assertEqual('[text]', change.get('field'))
 
+    def test_process_notice_shared(self):
+        """A notice modifying several parts can be parsed once and shared;
+        the results for each part are unchanged"""
+        url = 'http://example.com/shared.xml'
+        notice_xml = u"""
+        <RULE>
+            <FURINF><P>Contact info</P></FURINF>
+            <SUPLINF>
+                <HD SOURCE="HED">Supplementary Info</HD>
+                <HD SOURCE="HD1">V. Section-by-Section Analysis</HD>
+                <HD SOURCE="HD2">1(b) Words</HD>
+                <P>Content<SU>1</SU></P>
+                <HD SOURCE="HD1">Section that follows</HD>
+                <P>Following Content</P>
+            </SUPLINF>
+            <REGTEXT PART="1111" TITLE="12">
+                <AMDPAR>
+                1. In § 1111.1, revise paragraph (b) to read as follows:
+                </AMDPAR>
+                <SECTION>
+                    <SECTNO>§ 1111.1</SECTNO>
+                    <SUBJECT>Purpose.</SUBJECT>
+                    <STARS/>
+                    <P>(b) This part carries out.</P>
+                </SECTION>
+            </REGTEXT>
+            <FTNT>
+                <P><SU>1</SU>A footnote</P>
+            </FTNT>
+        </RULE>""".encode('utf-8')
+        partials = [{'cfr_part': part, 'document_number': '2000-00001',
+                     'meta': {'start_page': 100}}
+                    for part in ('1111', '2222')]
+        expected = [build.process_notice(partial, notice_xml)
+                    for partial in partials]
+        self.assertEqual(['1111-1-b'], expected[0]['changes'].keys())
+        self.assertEqual({'1': 'A footnote'}, expected[0]['footnotes'])
+
+        with patch.dict(build._prefetched_xml, {url: notice_xml}):
+            with patch.dict(build._parsed_xml):
+                build.share_notice_xml(url)
+                with patch.object(build, 'preprocess_notice_xml') as pre:
+                    self.assertEqual(
+                        expected, [build.process_notice(partial, notice_xml)
+                                   for partial in partials])
+                    self.assertFalse(pre.called)
+
+    def test_process_notice_unshared(self):
+        """A notice which isn't shared is processed in its own XML, rather
+        than a copy"""
+        notice_xml = """
+        <RULE>
+            <FTNT>
+                <P><SU>1</SU>A footnote</P>
+            </FTNT>
+        </RULE>"""
+        partial = {'cfr_part': '1111', 'document_number': '2000-00001',
+                   'meta': {'start_page': 100}}
+        with patch.object(build, 'deepcopy', wraps=deepcopy) as copied:
+            notice = build.process_notice(partial, notice_xml)
+            #   Only by preprocess_notice_xml
+            self.assertEqual(1, copied.call_count)
+        self.assertEqual({'1': 'A footnote'}, notice['footnotes'])
+
     def test_local_version_list(self):
         url = 'http://example.com/some/url'
 
@@ -1,8 +1,9 @@
 #vim: set encoding=utf-8
+import copy
 from unittest import TestCase
 
 from regparser.notice import compiler
-from regparser.tree.struct import Node, find
+from regparser.tree.struct import Node, find, walk
 
 
 class CompilerTests(TestCase):
@@ -867,6 +868,37 @@ class CompilerTests(TestCase):
         self.assertEqual("aaa", s2a.text)
         self.assertEqual("n2a", s2b.text)
 
+    def test_compile_regulation_hashes(self):
+        """Fingerprints cached before compiling must not be stale after"""
+        def fresh_hash(tree):
+            tree = copy.deepcopy(tree)
+            walk(tree, lambda n: n.invalidate_hash())
+            return tree.subtree_hash()
+
+        prev_tree = self.tree_with_paragraphs()
+        prev_hash = prev_tree.subtree_hash()
+        changes = {
+            '205-1': [{'action': 'PUT', 'field': '[text]',
+                       'node': {'text': 'new n1', 'label': ['205', '1'],
+                                'node_type': Node.REGTEXT}}],
+            '205-2-a': [
+                {'action': 'MOVE', 'destination': ['205', '2', 'c']}],
+            '205-4-a': [{'action': 'POST', 'node': {
+                'text': 'aaa', 'label': ['205', '4', 'a'],
+                'node_type': Node.REGTEXT}}]}
+        new_tree = compiler.compile_regulation(prev_tree, changes)
+        self.assertEqual(prev_hash, prev_tree.subtree_hash())
+        self.assertNotEqual(prev_hash, new_tree.subtree_hash())
+        self.assertEqual(fresh_hash(new_tree), new_tree.subtree_hash())
+        s1, s2, s4 = new_tree.children
+        self.assertEqual(fresh_hash(s1), s1.subtree_hash())
+        self.assertEqual(fresh_hash(s2), s2.subtree_hash())
+        self.assertEqual(fresh_hash(s4), s4.subtree_hash())
+
+        #   Untouched subtrees retain their fingerprints
+        self.assertEqual(prev_tree.children[1].children[1].subtree_hash(),
+                         s2.children[0].subtree_hash())
+
     def test_is_reserved_node(self):
         n = Node('[Reserved]', label=['205', '4', 'a'])
         self.assertTrue(compiler.is_reserved_node(n))
@@ -0,0 +1,51 @@
+#vim: set encoding=utf-8
+import random
+import re
+from unittest import TestCase
+
+from regparser.term_matcher import TermMatcher
+
+
+class TermMatcherTests(TestCase):
+    def test_find(self):
+        matcher = TermMatcher(['rock band', 'band', 'bands', 'drum'])
+        text = 'a rock band; bands, a drum, the bandstand'
+        self.assertEqual({'rock band': [(2, 11)], 'band': [(7, 11)],
+                          'bands': [(13, 18)], 'drum': [(22, 26)]},
+                         matcher.find(text))
+
+    def test_find_suffixes(self):
+        """Terms which are suffixes of other terms (and of their prefixes)
+        should still be found"""
+        matcher = TermMatcher(['abcd', 'bc', 'c', 'bcd e'])
+        self.assertEqual({'c': [(2, 3)], 'bc': [(6, 8)]},
+                         matcher.find('a c a bc abc'))
+        self.assertEqual({'abcd': [(0, 4)]}, matcher.find('abcd bcd'))
+        self.assertEqual({'bcd e': [(1, 6)]}, matcher.find('-bcd e'))
+
+    def test_find_overlapping(self):
+        """A term's occurrences shouldn't overlap; as with re.finditer, the
+        leftmost is kept"""
+        matcher = TermMatcher(['a a'])
+        self.assertEqual({'a a': [(0, 3), (4, 7)]},
+                         matcher.find('a a a a a'))
+
+    def test_find_like_regex(self):
+        """Occurrences should be exactly those which a regex per term would
+        find, including for terms which start or end with non-word
+        characters (and the empty term)"""
+        rand = random.Random(0)
+        chars = u'ab -.(_1é'
+        for _ in range(2000):
+            terms = set(u''.join(rand.choice(chars)
+                                 for _ in range(rand.randint(0, 4)))
+                        for _ in range(rand.randint(1, 6)))
+            text = u''.join(rand.choice(chars)
+                            for _ in range(rand.randint(0, 30)))
+            expected = {}
+            for term in terms:
+                offsets = [(m.start(), m.end()) for m in re.finditer(
+                    ur'\b' + re.escape(term) + ur'\b', text)]
+                if offsets:
+                    expected[term] = offsets
+            self.assertEqual(expected, TermMatcher(terms).find(text))
@@ -1,10 +1,38 @@
+# vim: set encoding=utf-8
+import copy
+import cPickle as pickle
 import json
 from unittest import TestCase
 
+from regparser.layer.formatting import Formatting
 from regparser.tree.struct import *
+from regparser.tree.xml_parser import reg_text
 
 class DepthTreeTest(TestCase):
 
+    def test_pre_order_deep(self):
+        """Deep trees shouldn't hit the recursion limit"""
+        root = node = Node("0")
+        for idx in range(1, 5000):
+            node.children = [Node(str(idx))]
+            node = node.children[0]
+        self.assertEqual([str(idx) for idx in range(5000)],
+                         [n.text for n in pre_order(root)])
+
+    def test_subtree_hash_deep(self):
+        """Deep trees shouldn't hit the recursion limit; each node's hash
+        still covers its descendants"""
+        root = node = Node("0")
+        for idx in range(1, 5000):
+            node.children = [Node(str(idx))]
+            node = node.children[0]
+        original = root.subtree_hash()
+        self.assertEqual(original, root.subtree_hash())
+
+        node.text = "changed"
+        invalidate_hashes(root, [node])
+        self.assertNotEqual(original, root.subtree_hash())
+
     def test_walk(self):
         n1 = Node("1")
         n2 = Node("2")
@@ -127,3 +155,82 @@ class DepthTreeTest(TestCase):
                 Node(label=['1', 'b'], children=[1,2,3])
             ])
         ])
+
+    def test_content_hash(self):
+        n1 = Node("Some text", label=['1', 'a'], title="Title")
+        n2 = Node("Some text", label=['1', 'a'], title="Title")
+        self.assertEqual(n1.content_hash(), n2.content_hash())
+
+        for other in (Node("Other text", label=['1', 'a'], title="Title"),
+                      Node("Some text", label=['1', 'b'], title="Title"),
+                      Node("Some text", label=['1', 'a']),
+                      Node("Some text", label=['1', 'a'], title="Title",
+                           node_type=Node.INTERP)):
+            self.assertNotEqual(n1.content_hash(), other.content_hash())
+
+        #   Children don't affect the content hash, but do the subtree hash
+        n2.children = [Node("Child", label=['1', 'a', '1'])]
+        self.assertEqual(n1.content_hash(), n2.content_hash())
+        self.assertNotEqual(n1.subtree_hash(), n2.subtree_hash())
+
+    def test_hashes_not_encoded(self):
+        node = Node("Text", label=['1'],
+                    children=[Node("C", label=['1', 'a'])])
+        before = NodeEncoder(sort_keys=True).encode(node)
+        node.subtree_hash()
+        self.assertEqual(before, NodeEncoder(sort_keys=True).encode(node))
+
+    def test_invalidate_hashes(self):
+        n1a = Node("1a", label=['1', 'a'])
+        n1b = Node("1b", label=['1', 'b'])
+        n1 = Node("1", label=['1'], children=[n1a, n1b])
+        n2 = Node("2", label=['2'])
+        root = Node("root", label=['root'], children=[n1, n2])
+        original = root.subtree_hash()
+        n2_hash = n2.subtree_hash()
+
+        n1b.text = "Changed"
+        self.assertEqual(original, root.subtree_hash())   # stale
+        invalidate_hashes(root, [n1b])
+        self.assertNotEqual(original, root.subtree_hash())
+        self.assertEqual(n2_hash, n2.subtree_hash())
+        self.assertEqual(Node("Changed", label=['1', 'b']).content_hash(),
+                         n1b.content_hash())
+
+        n1b.text = "1b"
+        invalidate_hashes(root, [n1b])
+        self.assertEqual(original, root.subtree_hash())
+
+    def test_pickle_source_xml(self):
+        """Trees built from XML are pickled when passed between processes;
+        their source XML must survive, e.g. for the formatting layer"""
+        tree = reg_text.build_tree(u"""
+            <CFRGRANULE>
+                <PART>
+                    <EAR>Pt. 1111</EAR>
+                    <HD SOURCE="HED">PART 1111—A REGULATION</HD>
+                    <SECTION>
+                        <SECTNO>§ 1111.1</SECTNO>
+                        <SUBJECT>General.</SUBJECT>
+                        <P>(a) Some content</P>
+                    </SECTION>
+                    <APPENDIX>
+                        <EAR>Pt. 1111, App. A</EAR>
+                        <HD SOURCE="HED">Appendix A to Part 1111—Tables</HD>
+                        <GPOTABLE COLS="2">
+                            <BOXHD>
+                                <CHED H="1">One</CHED>
+                                <CHED H="1">Two</CHED>
+                            </BOXHD>
+                            <ROW><ENT>1</ENT><ENT>2</ENT></ROW>
+                        </GPOTABLE>
+                    </APPENDIX>
+                </PART>
+            </CFRGRANULE>""")
+        expected = Formatting(tree).build()
+        self.assertEqual(['1111-A-p1'], expected.keys())
+
+        unpickled = pickle.loads(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(tree, unpickled)
+        self.assertEqual(expected, Formatting(unpickled).build())
+        self.assertEqual(expected, Formatting(copy.deepcopy(tree)).build())